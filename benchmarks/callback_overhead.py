@@ -0,0 +1,117 @@
+# benchmarks/callback_overhead.py
+"""
+Per-step overhead of callback dispatch with 0, 1 and N callbacks.
+
+    python benchmarks/callback_overhead.py --steps 2000 --callbacks 8
+
+"json" callbacks write NDJSON through EventSink to a temporary file; the
+"legacy" rows format and print synchronously on the event loop, as the
+structured logger did before it used a sink. The "slow" rows write to a
+pipe that takes 1ms per write.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from riil.domain.step import Step  # noqa: E402
+from riil.domain.workflow import Workflow  # noqa: E402
+from riil.infrastructure.callbacks.sink import EventSink, close_sinks  # noqa: E402
+from riil.infrastructure.callbacks.structured import (
+    StructuredJSONCallback,
+)  # noqa: E402
+
+
+class NoopStep(Step):
+    # Every step writes the same key, so steps run one after another
+    output_key = "out"
+    input_keys = {"topic"}
+
+    async def run(self, inputs):
+        return {"output": "x", "output_key": self.output_key}
+
+
+class LegacyJSONCallback(StructuredJSONCallback):
+    """Serializes and prints on the event loop for every event."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    async def _emit(self, event, data):
+        record = {"timestamp": datetime.utcnow().isoformat(), "event": event, **data}
+        print(json.dumps(record), file=self.stream, flush=True)
+
+
+class SlowPipe:
+    """A consumer that takes 1ms per write, like a congested log shipper."""
+
+    def write(self, data):
+        time.sleep(0.001)
+
+    def flush(self):
+        pass
+
+
+async def measure(steps: int, callbacks) -> float:
+    wf = Workflow("bench", callbacks=callbacks)
+    for i in range(steps):
+        wf.add_step(NoopStep())
+    started = time.perf_counter()
+    await wf.run({"topic": "benchmarks"})
+    elapsed = time.perf_counter() - started
+    await close_sinks()
+    return elapsed / steps * 1e6
+
+
+async def main(steps: int, n: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+
+        def sinks(count):
+            return [
+                StructuredJSONCallback(
+                    EventSink(path=os.path.join(tmp, f"events-{i}.ndjson"))
+                )
+                for i in range(count)
+            ]
+
+        with open(os.path.join(tmp, "legacy.ndjson"), "w") as legacy:
+            rows = [
+                ("0 callbacks", await measure(steps, [])),
+                ("1 json", await measure(steps, sinks(1))),
+                (f"{n} json", await measure(steps, sinks(n))),
+                ("1 legacy", await measure(steps, [LegacyJSONCallback(legacy)])),
+                (
+                    f"{n} legacy",
+                    await measure(
+                        steps, [LegacyJSONCallback(legacy) for _ in range(n)]
+                    ),
+                ),
+                (
+                    "1 json, slow",
+                    await measure(
+                        steps, [StructuredJSONCallback(EventSink(stream=SlowPipe()))]
+                    ),
+                ),
+                (
+                    "1 legacy, slow",
+                    await measure(steps, [LegacyJSONCallback(SlowPipe())]),
+                ),
+            ]
+    print(f"{'callbacks':<14}{'us/step':>10}")
+    for label, micros in rows:
+        print(f"{label:<14}{micros:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--callbacks", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.steps, args.callbacks))
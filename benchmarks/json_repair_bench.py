@@ -0,0 +1,97 @@
+# benchmarks/json_repair_bench.py
+"""
+Correctness and throughput of JSON repair: the single-pass parser versus the
+previous regex implementation (kept below as `legacy_repair_json`).
+
+    python benchmarks/json_repair_bench.py [--repeat 2000]
+
+Correctness: a case passes when the repaired text parses to the expected
+value from json_repair_corpus.jsonl. Throughput: MB/s over the whole corpus,
+for the parser fed whole texts and fed in 8-character stream chunks.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from riil.infrastructure.utils.json_repair import (
+    JSONRepairParser,
+    repair_json,
+)  # noqa: E402
+
+CORPUS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "json_repair_corpus.jsonl"
+)
+
+
+def legacy_repair_json(text: str) -> str:
+    """The regex implementation this parser replaced."""
+    first = text.find("{")
+    last = text.rfind("}")
+    if first == -1 or last == -1:
+        raise ValueError("No JSON object found")
+    text = text[first : last + 1]
+    text = re.sub(r'"\s*"', '","', text)
+    text = re.sub(r"}\s*{", "},{", text)
+    text = re.sub(r"]\s*\[", "],[", text)
+    text = re.sub(r'}\s*"', '}, "', text)
+    text = re.sub(r']\s*"', '], "', text)
+    text = re.sub(r",(\s*[}\]])", r"\1", text)
+    text = re.sub(r":\s*([A-Za-z0-9_]+)([,\}\]])", r': "\1"\2', text)
+    return text
+
+
+def streamed_repair_json(text: str, size: int = 8) -> str:
+    parser = JSONRepairParser()
+    for i in range(0, len(text), size):
+        parser.feed(text[i : i + size])
+    return json.dumps(parser.close())
+
+
+def correct(repair, case) -> bool:
+    try:
+        return json.loads(repair(case["input"])) == case["expected"]
+    except ValueError:
+        return False
+
+
+def throughput(repair, texts, repeat: int) -> float:
+    size = sum(len(t) for t in texts) * repeat
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            try:
+                repair(text)
+            except ValueError:
+                pass
+    return size / (time.perf_counter() - started) / 1e6
+
+
+def main(repeat: int) -> None:
+    with open(CORPUS, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    texts = [c["input"] for c in cases]
+    implementations = [
+        ("regex (legacy)", legacy_repair_json),
+        ("parser", repair_json),
+        ("parser, streamed", streamed_repair_json),
+    ]
+    print(f"{'implementation':<18}{'correct':>10}{'MB/s':>8}")
+    for label, repair in implementations:
+        passed = sum(correct(repair, c) for c in cases)
+        rate = throughput(repair, texts, repeat)
+        print(f"{label:<18}{f'{passed}/{len(cases)}':>10}{rate:>8.2f}")
+
+    failures = [c["name"] for c in cases if not correct(legacy_repair_json, c)]
+    print(f"\nregex failures: {', '.join(failures) or '-'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=2000)
+    main(parser.parse_args().repeat)
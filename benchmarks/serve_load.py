@@ -0,0 +1,110 @@
+# benchmarks/serve_load.py
+"""
+Load test for `riil serve` against a local stub LLM.
+
+    python benchmarks/serve_load.py --requests 2000 --clients 64 --llm-delay 0.05
+
+Starts the stub OpenAI-compatible server from the test suite, a
+WorkflowServer over a temporary two-step workflow pointing at it, and
+`--clients` concurrent HTTP clients. Reports throughput, latency
+percentiles and how many requests were turned away with 503. Everything
+shares one process and event loop, so the numbers include the cost of the
+HTTP clients and the stub; with `--llm-delay 0` they bound the CPU cost.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from riil.infrastructure.llms.clients import close_clients  # noqa: E402
+from riil.interface.server import WorkflowServer  # noqa: E402
+from tests.stub_server import StubLLMServer, chat_completion  # noqa: E402
+
+WORKFLOW = """
+name: load
+steps:
+  - prompt: "Draft about {{{{topic}}}}"
+    llm:
+      {{provider: openai, model: stub, config: {{client: {{base_url: "{base_url}"}}}}}}
+    output_key: draft
+  - prompt: "Polish {{{{draft}}}}"
+    llm:
+      {{provider: openai, model: stub, config: {{client: {{base_url: "{base_url}"}}}}}}
+"""
+
+
+async def main(
+    requests: int, clients: int, llm_delay: float, concurrency: int, queue: int
+) -> None:
+    os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+
+    async def handler(payload):
+        await asyncio.sleep(llm_delay)
+        return 200, {}, chat_completion("ok")
+
+    llm = await StubLLMServer(handler).start()
+    with tempfile.TemporaryDirectory() as root:
+        Path(root, "load.yaml").write_text(WORKFLOW.format(base_url=llm.base_url))
+        server = await WorkflowServer(
+            Path(root), max_concurrency=concurrency, max_queue=queue
+        ).start(port=0)
+        latencies, statuses = [], {}
+        remaining = iter(range(requests))
+
+        limits = httpx.Limits(
+            max_connections=clients, max_keepalive_connections=clients
+        )
+        http = httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{server.port}", limits=limits, timeout=60
+        )
+
+        async def client_loop():
+            for i in remaining:
+                started = time.perf_counter()
+                response = await http.post(
+                    "/workflows/load/run", json={"inputs": {"topic": str(i)}}
+                )
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = (
+                    statuses.get(response.status_code, 0) + 1
+                )
+
+        started = time.perf_counter()
+        await asyncio.gather(*[client_loop() for _ in range(clients)])
+        elapsed = time.perf_counter() - started
+        await http.aclose()
+        await server.drain()
+        await close_clients()
+    await llm.stop()
+
+    latencies.sort()
+    print(
+        f"{requests} requests, {clients} clients, {llm_delay * 1000:.0f}ms per LLM call"
+    )
+    print(f"  throughput {requests / elapsed:.0f} req/s over {elapsed:.2f}s")
+    for q in (0.5, 0.95, 0.99):
+        print(
+            f"  p{int(q * 100)} {latencies[int(q * (len(latencies) - 1))] * 1000:.1f}ms"
+        )
+    print(f"  status {dict(sorted(statuses.items()))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--llm-delay", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--queue", type=int, default=256)
+    args = parser.parse_args()
+    asyncio.run(
+        main(args.requests, args.clients, args.llm_delay, args.concurrency, args.queue)
+    )
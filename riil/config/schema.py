@@ -1,6 +1,6 @@
 # riil/config/schema.py
-from typing import List, Dict, Any, Optional
-from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Literal, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 
 class LLMSpec(BaseModel):
@@ -9,11 +9,50 @@ class LLMSpec(BaseModel):
     config: Dict[str, Any] = Field(default_factory=dict)
 
 
+class MapSpec(BaseModel):
+    """Run the step once per element of the list in context key `over`."""
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    over: str
+    as_: str = Field(default="item", alias="as")
+    concurrency: int = Field(default=8, ge=1)
+    retries: int = Field(default=0, ge=0)
+    on_error: Literal["fail", "skip"] = "fail"
+    # collect | join | count | "module:factory", or {type: ..., **options}
+    reduce: Union[str, Dict[str, Any]] = "collect"
+    # Hand results to the reducer in item order rather than as they complete;
+    # default: what the reducer asks for (join does)
+    ordered: Optional[bool] = None
+    # Per-item sub-workflow (path relative to this file) instead of prompt/llm
+    workflow: Optional[str] = None
+
+
 class StepSpec(BaseModel):
-    prompt: str
+    prompt: str = ""
     rules: List[str] = Field(default_factory=list)
-    llm: LLMSpec
+    llm: Optional[LLMSpec] = None
     output_key: str = "output"
+    stream: bool = False
+    # Structured output: {field: type} with types str/int/float/bool/list/dict/any
+    output_schema: Optional[Dict[str, str]] = None
+    max_retries: int = Field(default=2, ge=0)
+    max_output_chars: Optional[int] = Field(default=None, ge=1)
+    map: Optional[MapSpec] = None
+    # "module:function" applied to the output: function(output) -> output
+    postprocess: Optional[str] = None
+    # Run CPU-heavy work (postprocess, structured output validation) in a worker pool
+    offload: Optional[Literal["process", "thread"]] = None
+    # Seconds the step may run, within the workflow's timeout
+    timeout: Optional[float] = Field(default=None, gt=0)
+
+    @model_validator(mode="after")
+    def _needs_llm(self) -> "StepSpec":
+        if self.llm is None and not (self.map and self.map.workflow):
+            raise ValueError(
+                "`llm` is required unless the step maps a sub-workflow (`map.workflow`)"
+            )
+        return self
 
 
 class WorkflowSpec(BaseModel):
@@ -22,4 +61,12 @@ class WorkflowSpec(BaseModel):
     author: Optional[str] = None
     version: str = "0.1.0"
     tags: List[str] = Field(default_factory=list)
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+    # Seconds a run may take; `riil run --timeout` overrides it
+    timeout: Optional[float] = Field(default=None, gt=0)
+    # Step outputs a run returns besides the final step's; the others are
+    # freed as soon as no later step reads them
+    outputs: List[str] = Field(default_factory=list)
+    # Keep every step's output until the run ends (debugging); `--keep-context`
+    keep_context: bool = False
     steps: List[StepSpec]
@@ -0,0 +1,56 @@
+# riil/core/checkpoint.py
+"""
+Abstract base class for checkpoint stores.
+A workflow with a store saves each step's output as it completes, so a
+failed run can be resumed without paying again for the steps that worked.
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class Checkpoint:
+    trace_id: str
+    workflow: str
+    # Identifies the steps the outputs belong to; see Workflow.fingerprint()
+    fingerprint: str
+    inputs: Dict[str, Any]
+    # Output of every completed step, by step index
+    outputs: Dict[int, Any] = field(default_factory=dict)
+    updated_at: float = 0.0
+
+
+class CheckpointStore(ABC):
+    """
+    Where checkpoints live. `save` is called on the event loop after every
+    step and must not block: implementations buffer writes and persist them
+    in the background, and `flush` waits for them.
+    """
+
+    @abstractmethod
+    async def begin(
+        self, trace_id: str, workflow: str, fingerprint: str, inputs: Dict[str, Any]
+    ) -> None:
+        """Record a new run and its inputs."""
+
+    @abstractmethod
+    def save(self, trace_id: str, step: int, output: Any) -> None:
+        """Queue a completed step's output."""
+
+    @abstractmethod
+    async def flush(self) -> None:
+        """Wait until every queued output is stored."""
+
+    @abstractmethod
+    async def load(self, trace_id: str) -> Optional[Checkpoint]:
+        """The checkpoint of a run, or None."""
+
+    @abstractmethod
+    async def delete(self, trace_id: str) -> None:
+        """Forget a run (it finished, or will not be resumed)."""
+
+    @abstractmethod
+    async def gc(self, max_age: float) -> int:
+        """Delete runs not updated for `max_age` seconds; returns how many."""
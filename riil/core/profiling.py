@@ -0,0 +1,162 @@
+# riil/core/profiling.py
+"""
+Span recording for profiling runs (`riil profile`).
+
+The engine opens spans around workflow runs, steps, callback dispatch,
+prompt rendering and LLM requests. Nothing is recorded unless a Recorder
+is active (`with recording() as recorder:`); otherwise `span()` returns a
+shared no-op context and `start_span()` returns None, so instrumented code
+costs a global lookup.
+
+Timestamps are `time.perf_counter()` seconds. A span's parent is the span
+open in the current task when it starts; tasks inherit it from the code
+that created them.
+"""
+
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import TracebackType
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Type
+
+
+class Span:
+    __slots__ = ("id", "parent", "name", "category", "start", "end", "attrs")
+
+    def __init__(
+        self,
+        id: int,
+        parent: Optional[int],
+        name: str,
+        category: str,
+        attrs: Dict[str, Any],
+    ):
+        self.id = id
+        self.parent = parent
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def finish(self, **attrs: Any) -> None:
+        self.end = time.perf_counter()
+        if attrs:
+            self.attrs.update(attrs)
+
+
+class Recorder:
+    """Spans and event-loop stalls of everything run while it is active."""
+
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+        # {"start", "duration", "stack"}, from the profiler's StallMonitor
+        self.stalls: List[Dict[str, Any]] = []
+        self.started = time.perf_counter()
+        self._ids = itertools.count(1)
+
+    def start(
+        self, name: str, category: str, parent: Optional[Span], attrs: Dict[str, Any]
+    ) -> Span:
+        span = Span(
+            next(self._ids),
+            parent.id if parent is not None else None,
+            name,
+            category,
+            attrs,
+        )
+        self.spans.append(span)
+        return span
+
+
+_recorder: Optional[Recorder] = None
+_current: ContextVar[Optional[Span]] = ContextVar("riil_span", default=None)
+
+
+@contextmanager
+def recording(recorder: Optional[Recorder] = None) -> Iterator[Recorder]:
+    """Record spans until the block exits."""
+    global _recorder
+    previous, _recorder = _recorder, recorder or Recorder()
+    try:
+        yield _recorder
+    finally:
+        _recorder = previous
+
+
+def is_recording() -> bool:
+    return _recorder is not None
+
+
+def start_span(name: str, category: str = "", **attrs: Any) -> Optional[Span]:
+    """
+    Open a span without making it current; the caller calls `finish()`.
+    For code that yields (async generators), where a current span would leak
+    into the consumer.
+    """
+    recorder = _recorder
+    if recorder is None:
+        return None
+    return recorder.start(name, category, _current.get(), attrs)
+
+
+def span(name: str, category: str = "", **attrs: Any) -> ContextManager[Optional[Span]]:
+    """A context manager timing its block as a child of the current span."""
+    if _recorder is None:
+        return _NOOP
+    return _SpanScope(name, category, attrs)
+
+
+class _SpanScope:
+    __slots__ = ("name", "category", "attrs", "span", "token")
+
+    def __init__(self, name: str, category: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+
+    def __enter__(self) -> Optional[Span]:
+        recorder = _recorder
+        if recorder is None:
+            self.span = None
+            return None
+        self.span = recorder.start(self.name, self.category, _current.get(), self.attrs)
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        if self.span is None:
+            return
+        _current.reset(self.token)
+        if exc_type is not None:
+            self.span.finish(error=exc_type.__name__)
+        else:
+            self.span.finish()
+
+
+class _NoopScope:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        return None
+
+
+_NOOP = _NoopScope()
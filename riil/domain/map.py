@@ -0,0 +1,284 @@
+# riil/domain/map.py
+"""
+Map steps: run one step (or a whole workflow) per item of a list in the
+context, with bounded concurrency, and fold the results with a reducer as
+they complete.
+
+Items are started lazily, at most `concurrency` at a time, and each result
+is handed to the reducer as soon as it completes, so memory stays flat
+however long the list is (apart from what the reducer itself keeps).
+Reducers that need item order (`ordered = True`, like join) get results
+through a bounded reorder buffer instead; a slow item then holds back the
+ones after it.
+
+Reducers are plain objects rather than steps: a step runs once per call, so
+folding through one would cost a (serial) LLM call per item. To reduce with
+a prompt, follow the map step with an ordinary step that reads its output.
+"""
+
+import asyncio
+import inspect
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .step import Step
+from .types import Inputs, Outputs
+from .workflow import Workflow
+
+ON_ERROR = ("fail", "skip")
+
+# Failed items reported in a map step's result, at most
+MAX_REPORTED_ERRORS = 20
+
+
+class Reducer(ABC):
+    """
+    Folds item results as they complete. `add` may be async. With `ordered`
+    set, results arrive in item order.
+    """
+
+    ordered = False
+
+    @abstractmethod
+    def add(self, index: int, output: Any) -> Any:
+        """Take the output of item `index`."""
+
+    def fail(self, index: int, error: Exception) -> Any:
+        """Item `index` failed and is skipped."""
+
+    @abstractmethod
+    def result(self) -> Any:
+        """The step output once every item is done."""
+
+
+class CollectReducer(Reducer):
+    """A list of outputs lined up with the items; skipped items are None."""
+
+    def __init__(self) -> None:
+        self.items: List[Any] = []
+
+    def add(self, index: int, output: Any) -> None:
+        # Results arrive in completion order; slots of pending items stay None
+        if index >= len(self.items):
+            self.items.extend([None] * (index + 1 - len(self.items)))
+        self.items[index] = output
+
+    def fail(self, index: int, error: Exception) -> None:
+        self.add(index, None)
+
+    def result(self) -> List[Any]:
+        return self.items
+
+
+class JoinReducer(Reducer):
+    """Outputs joined into one string, in item order; skipped items are left out."""
+
+    ordered = True
+
+    def __init__(self, separator: str = "\n\n") -> None:
+        self.separator = separator
+        self.parts: List[str] = []
+
+    def add(self, index: int, output: Any) -> None:
+        self.parts.append(output if isinstance(output, str) else str(output))
+
+    def result(self) -> str:
+        return self.separator.join(self.parts)
+
+
+class CountReducer(Reducer):
+    """Counts of succeeded and skipped items, for steps run for their side effects."""
+
+    def __init__(self) -> None:
+        self.succeeded = 0
+        self.skipped = 0
+
+    def add(self, index: int, output: Any) -> None:
+        self.succeeded += 1
+
+    def fail(self, index: int, error: Exception) -> None:
+        self.skipped += 1
+
+    def result(self) -> Dict[str, int]:
+        return {"succeeded": self.succeeded, "skipped": self.skipped}
+
+
+REDUCERS: Dict[str, Callable[..., Reducer]] = {
+    "collect": CollectReducer,
+    "join": JoinReducer,
+    "count": CountReducer,
+}
+
+
+class WorkflowStep(Step):
+    """A workflow used as one step; its output is the final step's output."""
+
+    def __init__(
+        self,
+        workflow: Workflow,
+        input_keys: Optional[Set[str]] = None,
+        output_key: str = "output",
+    ):
+        self.workflow = workflow
+        self.input_keys = input_keys
+        self.output_key = output_key
+
+    async def run(self, inputs: Inputs) -> Outputs:
+        # Only user keys: the sub-workflow starts its own trace, within the
+        # caller's deadline
+        sub_inputs = {k: v for k, v in inputs.items() if not k.startswith("__")}
+        if "__deadline" in inputs:
+            sub_inputs["__deadline"] = inputs["__deadline"]
+        context = await self.workflow.run(sub_inputs)
+        last = self.workflow.steps[-1] if self.workflow.steps else None
+        return {
+            "output": context.get(getattr(last, "output_key", "output")),
+            "output_key": self.output_key,
+        }
+
+
+class MapStep(Step):
+    def __init__(
+        self,
+        item_step: Step,
+        over: str,
+        item_key: str = "item",
+        output_key: str = "output",
+        concurrency: int = 8,
+        retries: int = 0,
+        on_error: str = "fail",
+        reducer: Callable[[], Reducer] = CollectReducer,
+        retry_delay: float = 0.5,
+        ordered: Optional[bool] = None,
+    ) -> None:
+        if concurrency < 1:
+            raise ValueError("map concurrency must be >= 1")
+        if retries < 0:
+            raise ValueError("map retries must be >= 0")
+        if on_error not in ON_ERROR:
+            raise ValueError(f"map on_error must be one of {', '.join(ON_ERROR)}")
+        self.item_step = item_step
+        self.over = over
+        self.item_key = item_key
+        self.output_key = output_key
+        self.concurrency = concurrency
+        self.retries = retries
+        self.on_error = on_error
+        self.reducer = reducer
+        self.retry_delay = retry_delay
+        # Deliver results in item order; None leaves it to the reducer
+        self.ordered = ordered
+        self.prompt = getattr(item_step, "prompt", None)
+        self.model = getattr(item_step, "model", "")
+        reads = getattr(item_step, "input_keys", None)
+        self.input_keys = None if reads is None else {over} | (set(reads) - {item_key})
+
+    async def run(self, inputs: Inputs) -> Outputs:
+        """
+        Run the item step for every element of `inputs[over]`. The output is
+        the reducer's result; `failed` and the first `errors` report skipped items.
+        """
+        items = inputs.get(self.over)
+        if items is None or isinstance(items, (str, bytes, dict)):
+            raise ValueError(
+                f"map step '{self.output_key}' needs a list in '{self.over}'"
+            )
+        reducer = self.reducer()
+        failed = 0
+        errors: List[Dict[str, Any]] = []
+
+        async def _deliver(index: int, outcome: Any) -> None:
+            nonlocal failed
+            if isinstance(outcome, _Failure):
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(
+                        {
+                            "index": index,
+                            "error": str(outcome.error),
+                            "error_type": outcome.error.__class__.__name__,
+                        }
+                    )
+                ret = reducer.fail(index, outcome.error)
+            else:
+                ret = reducer.add(index, outcome)
+            if inspect.isawaitable(ret):
+                await ret
+
+        ordered = self.ordered
+        if ordered is None:
+            ordered = getattr(reducer, "ordered", False)
+        await self._fan_out(items, inputs, _deliver, ordered)
+        return {
+            "output": reducer.result(),
+            "output_key": self.output_key,
+            "failed": failed,
+            "errors": errors,
+        }
+
+    async def _fan_out(
+        self,
+        items: Any,
+        inputs: Inputs,
+        deliver: Callable[[int, Any], Awaitable[None]],
+        ordered: bool,
+    ) -> None:
+        # In order, admission may run ahead of the oldest undelivered item by this much
+        window = self.concurrency * 4
+        running: "Set[asyncio.Future[Tuple[int, Any]]]" = set()
+        finished: Dict[int, Any] = {}
+        next_index = 0
+
+        async def _drain() -> None:
+            nonlocal next_index
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                running.discard(task)
+                index, outcome = task.result()
+                if isinstance(outcome, _Failure) and self.on_error == "fail":
+                    # Fail fast: in-flight items are cancelled below
+                    raise outcome.error
+                if ordered:
+                    finished[index] = outcome
+                else:
+                    await deliver(index, outcome)
+            while next_index in finished:
+                await deliver(next_index, finished.pop(next_index))
+                next_index += 1
+
+        try:
+            for index, item in enumerate(items):
+                while len(running) >= self.concurrency or (
+                    ordered and index - next_index >= window
+                ):
+                    await _drain()
+                running.add(asyncio.ensure_future(self._run_item(index, item, inputs)))
+            while running:
+                await _drain()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    async def _run_item(self, index: int, item: Any, inputs: Inputs) -> Tuple[int, Any]:
+        context = dict(inputs)
+        context[self.item_key] = item
+        context["__map_index"] = index
+        attempt = 0
+        while True:
+            try:
+                result = await self.item_step.run(context)
+                return index, result["output"]
+            except Exception as e:
+                if attempt == self.retries:
+                    return index, _Failure(e)
+                await asyncio.sleep(min(self.retry_delay * 2**attempt, 8.0))
+                attempt += 1
+
+
+class _Failure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: Exception):
+        self.error = error
@@ -3,8 +3,53 @@
 Safe prompt templating with rule injection support.
 """
 
-from string import Template
-from typing import List
+import re
+from string import Formatter, Template
+from typing import Any, Dict, FrozenSet, List, Set
+
+# Matches `{{name}}` and `{name}` placeholders, incl. `{name.attr}`, `{name[0]}`
+# and `{name:fmt}`
+_PLACEHOLDER = re.compile(
+    r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}|\{([A-Za-z_][A-Za-z0-9_]*)[^{}]*\}"
+)
+
+
+def extract_variables(template: str) -> Set[str]:
+    """
+    Return the names of the context keys a prompt template references.
+    Used by the workflow scheduler to infer step dependencies.
+    """
+    return {a or b for a, b in _PLACEHOLDER.findall(template or "")}
+
+
+_DOUBLE_BRACE = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+
+
+class PromptTemplate:
+    """
+    A prompt parsed once and rendered many times.
+    `{{name}}` placeholders are rewritten to `{name}` up front, so rendering is
+    a single `str.format_map` call.
+    """
+
+    __slots__ = ("source", "text", "variables")
+
+    def __init__(self, source: str):
+        if not source:
+            raise ValueError("Prompt template cannot be None or empty")
+        self.source = source
+        self.text = _DOUBLE_BRACE.sub(r"{\1}", source)
+        # Surface malformed braces when the workflow is loaded, not on first run
+        list(Formatter().parse(self.text))
+        self.variables: FrozenSet[str] = frozenset(extract_variables(source))
+
+    def render(self, inputs: Dict[str, Any]) -> str:
+        try:
+            return self.text.format_map(inputs)
+        except KeyError as e:
+            raise ValueError(f"Missing input for prompt: {e}")
+        except Exception as e:
+            raise ValueError(f"Failed to format prompt: {str(e)}")
 
 
 class Prompt:
@@ -4,11 +4,23 @@ Abstract base class for all executable steps.
 """
 
 from abc import ABC
-from typing import Dict, Any, AsyncGenerator
+from typing import Dict, Any, AsyncGenerator, NamedTuple, Optional, Set
 
 Inputs = Dict[str, Any]
 Outputs = Dict[str, Any]
-OutputStream = AsyncGenerator[str, None]
+OutputStream = AsyncGenerator[Any, None]
+
+
+class StepField(NamedTuple):
+    """
+    One validated field of a structured output, streamed before the step
+    finishes. `attempt` increases when the step retries, so consumers can
+    discard fields from an abandoned attempt.
+    """
+
+    name: str
+    value: Any
+    attempt: int = 1
 
 
 class Step(ABC):
@@ -16,6 +28,17 @@ class Step(ABC):
     Abstract base class for any executable step in a workflow.
     All steps must implement `run`.
     """
+
+    # Context keys the step reads. `None` means unknown: the workflow then
+    # schedules the step after everything before it and before everything after.
+    input_keys: Optional[Set[str]] = None
+
+    # Stream this step's tokens as workflow events even when it is not the last step
+    stream_events: bool = False
+
+    # Seconds the step may run; the run's deadline can cut it shorter
+    timeout: Optional[float] = None
+
     async def run(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         raise NotImplementedError("Subclasses must implement run()")
 
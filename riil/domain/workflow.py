@@ -1,52 +1,642 @@
 # riil/domain/workflow.py
+import asyncio
+import hashlib
+import heapq
+import json
+import time
 import uuid
-from typing import List
-from .step import Step
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+from .step import Step, StepField
 from .types import Inputs, Outputs
 from riil.core.callback import Callback
+from riil.core.checkpoint import CheckpointStore
+from riil.core.profiling import span
+
+Event = Dict[str, Any]
+Emit = Callable[[Event], None]
+
+
+class StepTimeoutError(TimeoutError):
+    """
+    A step ran past its own timeout or the run's deadline (`budget` is "step"
+    or "workflow"). It was cancelled, with any request it had in flight;
+    `context` holds the inputs and the outputs of the steps that completed.
+    """
+
+    def __init__(self, step: int, output_key: str, timeout: float, budget: str):
+        if budget == "step":
+            message = (
+                f"Step {step} ('{output_key}') exceeded its timeout of {timeout:.3g}s"
+            )
+        else:
+            message = (
+                f"Step {step} ('{output_key}') was still running at the run's"
+                f" deadline, {timeout:.3g}s after it started"
+            )
+        super().__init__(message)
+        self.step = step
+        self.output_key = output_key
+        self.timeout = timeout
+        self.budget = budget
+        self.context: Dict[str, Any] = {}
+
+
+def build_dependencies(steps: List[Step]) -> List[Set[int]]:
+    """
+    Infer the step DAG from the keys each step reads (`input_keys`) and writes
+    (`output_key`). Returns, for every step, the indices it must wait for.
+
+    Ordering is kept wherever sequential execution could observe it:
+    read-after-write, write-after-write and write-after-read on the same key.
+    Steps with unknown inputs act as barriers.
+    """
+    deps: List[Set[int]] = []
+    last_writer: Dict[str, int] = {}
+    readers: Dict[str, List[int]] = {}
+    barrier: Optional[int] = None
+
+    for i, step in enumerate(steps):
+        reads = getattr(step, "input_keys", None)
+        key = getattr(step, "output_key", "output")
+        d: Set[int] = set()
+
+        if reads is None:
+            d.update(range(i))
+        else:
+            if barrier is not None:
+                d.add(barrier)
+            d.update(last_writer[k] for k in reads if k in last_writer)
+        if key in last_writer:
+            d.add(last_writer[key])
+        d.update(readers.get(key, ()))
+        d.discard(i)
+        deps.append(d)
+
+        if reads is None:
+            barrier = i
+        else:
+            for k in reads:
+                readers.setdefault(k, []).append(i)
+        last_writer[key] = i
+        readers[key] = []
+
+    return deps
+
+
+def build_readers(steps: List[Step]) -> List[List[int]]:
+    """
+    For every step, the later steps that read the value it writes: those
+    reading its `output_key` before another step overwrites it, and steps
+    with unknown inputs in between. Once they have all finished, the value
+    is dead unless the run returns it.
+    """
+    readers: List[List[int]] = [[] for _ in steps]
+    # Key -> step whose output it currently holds
+    holder: Dict[str, int] = {}
+    for i, step in enumerate(steps):
+        reads = getattr(step, "input_keys", None)
+        sources = (
+            holder.values()
+            if reads is None
+            else (holder[k] for k in reads if k in holder)
+        )
+        for j in sources:
+            readers[j].append(i)
+        holder[getattr(step, "output_key", "output")] = i
+    return readers
+
+
+def build_layers(steps: List[Step]) -> List[List[int]]:
+    """
+    Group step indices into layers: every step depends only on steps in
+    earlier layers, so a layer can run once the previous one has finished.
+    """
+    depth: List[int] = []
+    layers: List[List[int]] = []
+    for i, d in enumerate(build_dependencies(steps)):
+        depth.append(max((depth[j] + 1 for j in d), default=0))
+        if depth[i] == len(layers):
+            layers.append([])
+        layers[depth[i]].append(i)
+    return layers
 
 
 class Workflow:
-    def __init__(self, name: str, callbacks: List[Callback] = None):
+    def __init__(
+        self,
+        name: str,
+        callbacks: Optional[List[Callback]] = None,
+        max_concurrency: Optional[int] = None,
+        checkpoints: Optional[CheckpointStore] = None,
+        timeout: Optional[float] = None,
+        outputs: Optional[Iterable[str]] = None,
+    ):
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be > 0")
         self.name = name
         self.steps: List[Step] = []
         self.callbacks = callbacks or []
+        self.max_concurrency = max_concurrency
+        # Saves each step's output so a failed run can be resumed
+        self.checkpoints = checkpoints
+        # Default time budget of a run, in seconds
+        self.timeout = timeout
+        # Step outputs a run returns. With a set, other outputs are dropped
+        # as soon as no later step reads them; None keeps the full context.
+        self.outputs = None if outputs is None else frozenset(outputs)
 
-    def add_step(self, step: Step):
+    def add_step(self, step: Step) -> "Workflow":
         self.steps.append(step)
         return self
 
-    async def run(self, inputs: Inputs) -> Outputs:
+    async def run(
+        self,
+        inputs: Inputs,
+        trace_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Outputs:
+        """
+        Run the workflow. With a checkpoint store, `trace_id` names the run:
+        if the store holds a checkpoint for it, completed steps are skipped.
+        `timeout` (default: the workflow's) bounds the whole run; a step
+        still running at the deadline is cancelled with StepTimeoutError.
+        Returns the inputs and the step outputs (only `outputs`, when set).
+        """
+        return await self._execute(inputs, trace_id=trace_id, timeout=timeout)
+
+    async def resume(self, trace_id: str, timeout: Optional[float] = None) -> Outputs:
+        """Finish a checkpointed run, with its original inputs, from its saved steps."""
+        if self.checkpoints is None:
+            raise ValueError("resume needs a workflow with a checkpoint store")
+        checkpoint = await self.checkpoints.load(trace_id)
+        if checkpoint is None:
+            raise ValueError(f"No checkpoint for run {trace_id}")
+        return await self._execute(
+            checkpoint.inputs, trace_id=trace_id, timeout=timeout
+        )
+
+    def fingerprint(self) -> str:
+        """Identifies the steps, so checkpoints only restore into the same workflow."""
+        steps = [
+            [
+                type(s).__name__,
+                getattr(s, "output_key", "output"),
+                getattr(s, "prompt", None),
+            ]
+            for s in self.steps
+        ]
+        return hashlib.sha256(
+            json.dumps([self.name, steps], default=str).encode("utf-8")
+        ).hexdigest()
+
+    async def stream(self, inputs: Inputs) -> AsyncGenerator[str, None]:
+        """
+        Run the workflow and yield the final step's output token by token.
+        Earlier steps run as usual; the context is still populated and
+        callbacks still fire.
+        """
+        last = len(self.steps) - 1
+        async for event in self.events(inputs):
+            if event["type"] == "token" and event["step"] == last:
+                yield event["text"]
+
+    async def events(
+        self,
+        inputs: Inputs,
+        trace_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncGenerator[Event, None]:
+        """
+        Run the workflow and yield its events as they happen:
+        - {"type": "token", "step", "output_key", "text"} for the final step
+          and for steps with `stream_events` set
+        - {"type": "field", "step", "output_key", "name", "value", "attempt"}
+          when such a step has an output schema, as each field completes
+        - {"type": "step_end", "step", "output_key", "output"} for every step
+        - {"type": "workflow_end", "context"} last
+        Steps restored from a checkpoint emit nothing.
+        """
+        queue: "asyncio.Queue[Any]" = asyncio.Queue()
+        finished = object()
+
+        async def _produce() -> None:
+            try:
+                context = await self._execute(
+                    inputs, queue.put_nowait, trace_id, timeout
+                )
+                queue.put_nowait({"type": "workflow_end", "context": context})
+            finally:
+                queue.put_nowait(finished)
+
+        task = asyncio.ensure_future(_produce())
+        try:
+            while True:
+                event = await queue.get()
+                if event is finished:
+                    break
+                yield event
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def _execute(
+        self,
+        inputs: Inputs,
+        emit: Optional[Emit] = None,
+        trace_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Outputs:
+        trace_id = trace_id or str(uuid.uuid4())
+        with span(self.name, "workflow", trace_id=trace_id):
+            return await self._execute_traced(inputs, emit, trace_id, timeout)
+
+    async def _execute_traced(
+        self,
+        inputs: Inputs,
+        emit: Optional[Emit],
+        trace_id: str,
+        timeout: Optional[float],
+    ) -> Outputs:
         # Add trace context
         context = inputs.copy()
-        context["__trace_id"] = str(uuid.uuid4())
+        context["__trace_id"] = trace_id
+        context["__started_at"] = time.monotonic()
+        # An absolute monotonic deadline; nested workflows inherit the caller's
+        timeout = timeout if timeout is not None else self.timeout
+        if timeout is not None:
+            deadline = context["__started_at"] + timeout
+            context["__deadline"] = min(deadline, context.get("__deadline", deadline))
 
         # Notify start
-        for cb in self.callbacks:
-            await cb.on_workflow_start(self, inputs)
+        if self.callbacks:
+            await self._notify("on_workflow_start", self, inputs)
 
-        for step in self.steps:
-            # Add step context
-            step_id = str(uuid.uuid4())
-            context["__step_id"] = step_id
+        try:
+            store = self.checkpoints
+            if store is None:
+                await self._run_steps(context, emit)
+            else:
+                restored = await self._restore(store, trace_id, inputs)
+                try:
+                    await self._run_steps(
+                        context,
+                        emit,
+                        restored,
+                        lambda i, output: store.save(trace_id, i, output),
+                    )
+                except BaseException:
+                    # Make sure what did complete is kept for the resume
+                    await store.flush()
+                    raise
+                await store.delete(trace_id)
 
-            for cb in self.callbacks:
-                await cb.on_step_start(step, context, context)
+            # Notify end
+            if self.callbacks:
+                await self._notify("on_workflow_end", self, context)
+        finally:
+            # The run's timing stamps are for callbacks, not the caller
+            context.pop("__started_at", None)
+            context.pop("__deadline", None)
 
-            try:
-                result = await step.run(context)
-                output_key = getattr(step, "output_key", "output")
-                context[output_key] = result["output"]
+        return context
 
-                for cb in self.callbacks:
-                    await cb.on_step_end(step, result, context)
-            except Exception as e:
-                for cb in self.callbacks:
-                    await cb.on_error(step, e, context)
-                raise
+    async def _restore(
+        self, store: CheckpointStore, trace_id: str, inputs: Inputs
+    ) -> Dict[int, Any]:
+        """Outputs of the steps a previous attempt of this run completed."""
+        fingerprint = self.fingerprint()
+        checkpoint = await store.load(trace_id)
+        if checkpoint is None:
+            await store.begin(trace_id, self.name, fingerprint, inputs)
+            return {}
+        if checkpoint.fingerprint != fingerprint:
+            raise ValueError(
+                f"Checkpoint {trace_id} was saved by a different version"
+                f" of workflow '{checkpoint.workflow}'"
+            )
+        return checkpoint.outputs
 
-        # Notify end
-        for cb in self.callbacks:
-            await cb.on_workflow_end(self, context)
+    async def _run_steps(
+        self,
+        context: Dict[str, Any],
+        emit: Optional[Emit] = None,
+        restored: Optional[Dict[int, Any]] = None,
+        on_output: Optional[Callable[[int, Any], None]] = None,
+    ) -> None:
+        """
+        Run steps as their dependencies complete, at most `max_concurrency` at a
+        time. Outputs are applied to `context` in declaration order, so the
+        result matches a sequential run. With `emit`, the final step and steps
+        with `stream_events` are streamed. Steps in `restored` are not run
+        again; `on_output` is called as each other step completes.
 
-        return context
+        With `outputs` set, a step sees only the keys it reads (plus the
+        run's `__` keys), and an output is released once every step reading
+        it has finished, unless it is one of `outputs`.
+        """
+        steps = self.steps
+        if not steps:
+            return
+
+        deps = build_dependencies(steps)
+        dependents: List[List[int]] = [[] for _ in steps]
+        for i, d in enumerate(deps):
+            for j in d:
+                dependents[j].append(i)
+        waiting = [len(d) for d in deps]
+        keys = [getattr(step, "output_key", "output") for step in steps]
+        release = self._release_plan(steps, keys)
+
+        step_ids = [str(uuid.uuid4()) for _ in steps]
+        context["__step_id"] = step_ids[-1]
+        working = dict(context)
+        results: Dict[int, Any] = {}
+        restored = restored or {}
+        for i in sorted(restored):
+            results[i] = restored[i]
+            working[keys[i]] = results[i]
+            for j in dependents[i]:
+                waiting[j] -= 1
+            if release is not None:
+                release(i, working, results, context)
+        ready = [i for i, n in enumerate(waiting) if n == 0 and i not in results]
+        heapq.heapify(ready)
+        running: Dict["asyncio.Future[Any]", int] = {}
+        limit = self.max_concurrency
+
+        try:
+            while ready or running:
+                while ready and (limit is None or len(running) < limit):
+                    i = heapq.heappop(ready)
+                    streamed = emit is not None and (
+                        i == len(steps) - 1 or getattr(steps[i], "stream_events", False)
+                    )
+                    view = working if release is None else _view(steps[i], working)
+                    task: "asyncio.Future[Any]" = asyncio.ensure_future(
+                        self._run_step(
+                            steps[i],
+                            step_ids[i],
+                            view,
+                            emit=emit,
+                            index=i,
+                            streamed=streamed,
+                        )
+                    )
+                    running[task] = i
+
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                # Lowest index first keeps error selection deterministic
+                for task in sorted(done, key=running.__getitem__):
+                    i = running.pop(task)
+                    error = task.exception()
+                    if isinstance(error, StepTimeoutError):
+                        # Report what the run got done before the budget ran out
+                        for j in sorted(results):
+                            context[keys[j]] = results[j]
+                        error.context = context
+                    if error is not None:
+                        raise error
+                    results[i] = task.result()
+                    working[keys[i]] = results[i]
+                    if on_output is not None:
+                        on_output(i, results[i])
+                    if emit is not None:
+                        emit(
+                            {
+                                "type": "step_end",
+                                "step": i,
+                                "output_key": keys[i],
+                                "output": results[i],
+                            }
+                        )
+                    for j in dependents[i]:
+                        waiting[j] -= 1
+                        if waiting[j] == 0:
+                            heapq.heappush(ready, j)
+                    if release is not None:
+                        release(i, working, results, context)
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        # Declaration order, so the last writer of a key wins
+        for i in sorted(results):
+            context[keys[i]] = results[i]
+
+    def _release_plan(
+        self, steps: List[Step], keys: List[str]
+    ) -> Optional[
+        Callable[[int, Dict[str, Any], Dict[int, Any], Dict[str, Any]], None]
+    ]:
+        """
+        With `outputs` set, a function to call as each step completes: it
+        drops that step's output, and those of the steps it read, from the
+        working context and the results once nothing left to run reads them.
+        """
+        if self.outputs is None:
+            return None
+        readers = build_readers(steps)
+        sources: List[List[int]] = [[] for _ in steps]
+        for i, r in enumerate(readers):
+            for j in r:
+                sources[j].append(i)
+        pending = [len(r) for r in readers]
+        last_writer = {key: i for i, key in enumerate(keys)}
+        returned = [
+            keys[i] in self.outputs and last_writer[keys[i]] == i
+            for i in range(len(steps))
+        ]
+
+        def _drop(
+            i: int,
+            working: Dict[str, Any],
+            results: Dict[int, Any],
+            context: Dict[str, Any],
+        ) -> None:
+            if pending[i] or returned[i] or i not in results:
+                return
+            # Dependencies keep a later writer of the key from running before now
+            value = results.pop(i)
+            if keys[i] in working and working[keys[i]] is value:
+                del working[keys[i]]
+            if last_writer[keys[i]] == i:
+                # Nor is an input it overwrote returned
+                context.pop(keys[i], None)
+
+        def _release(
+            i: int,
+            working: Dict[str, Any],
+            results: Dict[int, Any],
+            context: Dict[str, Any],
+        ) -> None:
+            for j in sources[i]:
+                pending[j] -= 1
+                _drop(j, working, results, context)
+            _drop(i, working, results, context)
+
+        return _release
+
+    async def _notify(self, hook: str, *args: Any) -> None:
+        """Call `hook` on every callback; several callbacks run concurrently."""
+        callbacks = self.callbacks
+        with span(hook, "callback", callbacks=len(callbacks)):
+            if len(callbacks) == 1:
+                await getattr(callbacks[0], hook)(*args)
+            else:
+                await asyncio.gather(*(getattr(cb, hook)(*args) for cb in callbacks))
+
+    async def _run_step(
+        self,
+        step: Step,
+        step_id: str,
+        working: Dict[str, Any],
+        emit: Optional[Emit] = None,
+        index: int = 0,
+        streamed: bool = False,
+    ) -> Any:
+        with span(
+            getattr(step, "output_key", "output"), "step", index=index, step_id=step_id
+        ):
+            return await self._run_step_traced(
+                step, step_id, working, emit, index, streamed
+            )
+
+    async def _run_step_traced(
+        self,
+        step: Step,
+        step_id: str,
+        working: Dict[str, Any],
+        emit: Optional[Emit],
+        index: int,
+        streamed: bool,
+    ) -> Any:
+        # Each step gets its own view so concurrent steps keep their own step id
+        context = dict(working)
+        context["__step_id"] = step_id
+        context["__workflow"] = self.name
+        context["__started_at"] = time.monotonic()
+        output_key = getattr(step, "output_key", "output")
+
+        callbacks = self.callbacks
+        if callbacks:
+            await self._notify("on_step_start", step, context, context)
+
+        try:
+            invoke = self._invoke(step, context, emit, index, output_key, streamed)
+            limit, budget = _step_budget(step, context)
+            if limit is None:
+                result = await invoke
+            else:
+                result = await _within(
+                    invoke,
+                    limit,
+                    lambda: StepTimeoutError(index, output_key, limit, budget),
+                )
+            context[output_key] = result["output"]
+
+            if callbacks:
+                await self._notify("on_step_end", step, result, context)
+        except Exception as e:
+            if callbacks:
+                await self._notify("on_error", step, e, context)
+            raise
+
+        return result["output"]
+
+    async def _invoke(
+        self,
+        step: Step,
+        context: Dict[str, Any],
+        emit: Optional[Emit],
+        index: int,
+        output_key: str,
+        streamed: bool,
+    ) -> Outputs:
+        if not streamed:
+            return await step.run(context)
+        assert emit is not None, "streamed steps need an emit callback"
+        chunks = []
+        ttft = None
+        async for text in step.stream(context):
+            if ttft is None:
+                ttft = time.monotonic() - context["__started_at"]
+            if isinstance(text, StepField):
+                emit(
+                    {
+                        "type": "field",
+                        "step": index,
+                        "output_key": output_key,
+                        "name": text.name,
+                        "value": text.value,
+                        "attempt": text.attempt,
+                    }
+                )
+                continue
+            chunks.append(text)
+            emit(
+                {"type": "token", "step": index, "output_key": output_key, "text": text}
+            )
+        # Non-text outputs arrive as a single chunk from Step.stream
+        output = chunks[0] if len(chunks) == 1 else "".join(chunks)
+        return {"output": output, "output_key": output_key, "ttft": ttft}
+
+
+def _view(step: Step, working: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of the working context `step` reads, with the run's `__` keys."""
+    reads = getattr(step, "input_keys", None)
+    if reads is None:
+        return working
+    view = {k: v for k, v in working.items() if k.startswith("__")}
+    view.update((k, working[k]) for k in reads if k in working)
+    return view
+
+
+def _step_budget(step: Step, context: Dict[str, Any]) -> Tuple[Optional[float], str]:
+    """Seconds `step` may run, and whose limit that is: its own or the run deadline."""
+    limit = getattr(step, "timeout", None)
+    deadline = context.get("__deadline")
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if limit is None or remaining < limit:
+            return max(remaining, 0.0), "workflow"
+    return limit, "step"
+
+
+async def _within(
+    coro: Awaitable[Outputs], timeout: float, on_timeout: Callable[[], Exception]
+) -> Outputs:
+    """
+    Await `coro` for at most `timeout` seconds. On timeout it is cancelled,
+    and awaited so whatever it held (sockets, pool slots) is released first.
+    Unlike wait_for, a TimeoutError raised by `coro` itself is not mistaken
+    for running out of time.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    if not done:
+        raise on_timeout()
+    return task.result()
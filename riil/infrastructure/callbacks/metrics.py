@@ -0,0 +1,427 @@
+# riil/infrastructure/callbacks/metrics.py
+"""
+In-process workflow metrics with Prometheus text export.
+
+MetricsCallback aggregates, per workflow / step / model: latency histograms,
+time to first token for streamed steps, prompt and completion tokens, cache
+hits and errors. Aggregates are plain dicts and fixed-bucket histograms, so
+recording costs a dict lookup and a bisect per event.
+"""
+
+import asyncio
+import bisect
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from riil.core.callback import Callback
+from riil.domain.step import Step
+from riil.domain.workflow import Workflow
+
+Labels = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+# name -> (type, help)
+METRICS: Dict[str, Tuple[str, str]] = {
+    "riil_workflow_duration_seconds": ("histogram", "Workflow run latency"),
+    "riil_step_duration_seconds": ("histogram", "Step latency, successful runs"),
+    "riil_step_ttft_seconds": ("histogram", "Time to first token of streamed steps"),
+    "riil_step_errors_total": ("counter", "Failed step runs"),
+    "riil_step_cache_hits_total": (
+        "counter",
+        "Step results served from the response cache",
+    ),
+    "riil_tokens_total": (
+        "counter",
+        "Tokens used by non-streamed LLM steps, by kind (prompt/completion)",
+    ),
+    "riil_route_attempts_total": (
+        "counter",
+        "Cascade route attempts, by outcome (accepted/rejected/error) and reason",
+    ),
+    "riil_route_duration_seconds": (
+        "histogram",
+        "Cascade route latency, whatever the outcome",
+    ),
+}
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def inc(self, name: str, labels: Labels, value: float = 1) -> None:
+        series = self.counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        series = self.histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines: List[str] = []
+        for name in sorted(set(self.counters) | set(self.histograms)):
+            kind, help_text = METRICS.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(self.counters.get(name, {}).items()):
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            for labels, h in sorted(self.histograms.get(name, {}).items()):
+                cumulative = 0
+                for bound, count in zip(list(h.bounds) + ["+Inf"], h.counts):
+                    cumulative += count
+                    le = bound if isinstance(bound, str) else _number(bound)
+                    lines.append(
+                        f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{_labels(labels)} {_number(h.sum)}")
+                lines.append(f"{name}_count{_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.histograms.clear()
+
+
+default_registry = MetricsRegistry()
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricsCallback(Callback):
+    """
+    Record step and workflow metrics into `registry` (the process default
+    unless given). Step latency is measured from the `__started_at` stamp the
+    workflow puts in each step's context.
+
+    Token counts come from the step's `usage` output. Streamed steps yield
+    only text, so they record TTFT but nothing under `riil_tokens_total`.
+    """
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or default_registry
+
+    def _step_labels(self, step: Step, context: Dict[str, Any]) -> Labels:
+        return (
+            ("workflow", str(context.get("__workflow", ""))),
+            ("step", str(getattr(step, "output_key", step.__class__.__name__))),
+            ("model", str(getattr(step, "model", "") or "")),
+        )
+
+    async def on_step_start(
+        self, step: Step, inputs: Dict[str, Any], context: Dict[str, Any]
+    ) -> None:
+        pass
+
+    async def on_step_end(
+        self, step: Step, outputs: Dict[str, Any], context: Dict[str, Any]
+    ) -> None:
+        labels = self._step_labels(step, context)
+        registry = self.registry
+        started = context.get("__started_at")
+        if started is not None:
+            registry.observe(
+                "riil_step_duration_seconds", labels, time.monotonic() - started
+            )
+        if outputs.get("ttft") is not None:
+            registry.observe("riil_step_ttft_seconds", labels, outputs["ttft"])
+        if outputs.get("cached"):
+            registry.inc("riil_step_cache_hits_total", labels)
+            return
+        usage = outputs.get("usage")
+        if usage:
+            registry.inc(
+                "riil_tokens_total",
+                labels + (("kind", "prompt"),),
+                usage.get("prompt_tokens", 0),
+            )
+            registry.inc(
+                "riil_tokens_total",
+                labels + (("kind", "completion"),),
+                usage.get("completion_tokens", 0),
+            )
+
+    async def on_error(
+        self, step: Step, error: Exception, context: Dict[str, Any]
+    ) -> None:
+        labels = self._step_labels(step, context) + (
+            ("error_type", error.__class__.__name__),
+        )
+        self.registry.inc("riil_step_errors_total", labels)
+
+    async def on_workflow_end(
+        self, workflow: Workflow, outputs: Dict[str, Any]
+    ) -> None:
+        started = outputs.get("__started_at")
+        if started is not None:
+            self.registry.observe(
+                "riil_workflow_duration_seconds",
+                (("workflow", workflow.name),),
+                time.monotonic() - started,
+            )
+
+
+def create_metrics_callback(config: Dict[str, Any]) -> MetricsCallback:
+    """Factory for `type: metrics` callbacks, recording into the default registry."""
+    return MetricsCallback()
+
+
+def write_metrics(path: str, registry: Optional[MetricsRegistry] = None) -> None:
+    """Atomically write the Prometheus text export to `path`."""
+    registry = registry or default_registry
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+
+async def serve_metrics(
+    port: int, host: str = "127.0.0.1", registry: Optional[MetricsRegistry] = None
+) -> asyncio.AbstractServer:
+    """Serve `GET /metrics` on a local port; close the returned server when done."""
+    registry = registry or default_registry
+
+    async def _handle(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if (
+                len(parts) >= 2
+                and parts[0] == "GET"
+                and parts[1].split("?")[0] == "/metrics"
+            ):
+                status, body = "200 OK", registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\ncontent-type: text/plain; version=0.0.4\r\n"
+                f"content-length: {len(body)}\r\nconnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(_handle, host, port)
+
+
+_SAMPLE = re.compile(r"^(\w+)(?:\{(.*)\})?\s+(\S+)$")
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+_ESCAPE = re.compile(r"\\(.)")
+
+
+def _unescape(match: "re.Match[str]") -> str:
+    return "\n" if match.group(1) == "n" else match.group(1)
+
+
+def parse_metrics(text: str) -> List[Tuple[str, Dict[str, str], float]]:
+    """Parse Prometheus text into (name, labels, value) samples."""
+    samples = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE.match(line.strip())
+        if match:
+            name, labels, value = match.groups()
+            parsed = {
+                k: _ESCAPE.sub(_unescape, v) for k, v in _LABEL.findall(labels or "")
+            }
+            samples.append((name, parsed, float(value)))
+    return samples
+
+
+def summarize(samples: List[Tuple[str, Dict[str, str], float]]) -> List[Dict[str, Any]]:
+    """
+    Per (workflow, step, model) summary rows: runs, errors, mean/p50/p95
+    latency, mean TTFT, tokens and cache hits. Quantiles are estimated from
+    histogram buckets.
+    """
+    rows: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    buckets: Dict[Tuple[str, str, str], List[Tuple[float, float]]] = {}
+
+    def row(labels: Dict[str, str]) -> Dict[str, Any]:
+        key = (
+            labels.get("workflow", ""),
+            labels.get("step", ""),
+            labels.get("model", ""),
+        )
+        if key not in rows:
+            rows[key] = {
+                "workflow": key[0],
+                "step": key[1],
+                "model": key[2],
+                "runs": 0,
+                "errors": 0,
+                "seconds": 0.0,
+                "ttft_sum": 0.0,
+                "ttft_count": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cache_hits": 0,
+            }
+        return rows[key]
+
+    for name, labels, value in samples:
+        if name == "riil_step_duration_seconds_count":
+            row(labels)["runs"] += int(value)
+        elif name == "riil_step_duration_seconds_sum":
+            row(labels)["seconds"] += value
+        elif name == "riil_step_duration_seconds_bucket":
+            r = row(labels)
+            key = (r["workflow"], r["step"], r["model"])
+            le = float("inf") if labels["le"] == "+Inf" else float(labels["le"])
+            buckets.setdefault(key, []).append((le, value))
+        elif name == "riil_step_ttft_seconds_sum":
+            row(labels)["ttft_sum"] += value
+        elif name == "riil_step_ttft_seconds_count":
+            row(labels)["ttft_count"] += int(value)
+        elif name == "riil_step_errors_total":
+            row(labels)["errors"] += int(value)
+        elif name == "riil_step_cache_hits_total":
+            row(labels)["cache_hits"] += int(value)
+        elif name == "riil_tokens_total":
+            row(labels)[f"{labels.get('kind', 'prompt')}_tokens"] += int(value)
+
+    result = []
+    for key, r in sorted(rows.items()):
+        bounds = sorted(buckets.get(key, []))
+        r["mean"] = r["seconds"] / r["runs"] if r["runs"] else None
+        r["p50"] = _quantile(bounds, 0.5)
+        r["p95"] = _quantile(bounds, 0.95)
+        r["ttft"] = r["ttft_sum"] / r["ttft_count"] if r["ttft_count"] else None
+        result.append(r)
+    return result
+
+
+def summarize_routes(
+    samples: List[Tuple[str, Dict[str, str], float]],
+) -> List[Dict[str, Any]]:
+    """
+    Per (workflow, step, route) cascade summary rows: attempts, accepted,
+    rejected (by check) and errors, acceptance rate, mean and p95 latency.
+    """
+    rows: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    buckets: Dict[Tuple[str, str, str], List[Tuple[float, float]]] = {}
+
+    def row(labels: Dict[str, str]) -> Dict[str, Any]:
+        key = (
+            labels.get("workflow", ""),
+            labels.get("step", ""),
+            labels.get("route", ""),
+        )
+        if key not in rows:
+            rows[key] = {
+                "workflow": key[0],
+                "step": key[1],
+                "route": key[2],
+                "attempts": 0,
+                "accepted": 0,
+                "rejected": 0,
+                "errors": 0,
+                "reasons": {},
+                "seconds": 0.0,
+            }
+        return rows[key]
+
+    for name, labels, value in samples:
+        if name == "riil_route_attempts_total":
+            r = row(labels)
+            outcome = labels.get("outcome", "")
+            r["attempts"] += int(value)
+            r[
+                {"accepted": "accepted", "rejected": "rejected"}.get(outcome, "errors")
+            ] += int(value)
+            if labels.get("reason"):
+                r["reasons"][labels["reason"]] = r["reasons"].get(
+                    labels["reason"], 0
+                ) + int(value)
+        elif name == "riil_route_duration_seconds_sum":
+            row(labels)["seconds"] += value
+        elif name == "riil_route_duration_seconds_bucket":
+            r = row(labels)
+            le = float("inf") if labels["le"] == "+Inf" else float(labels["le"])
+            buckets.setdefault((r["workflow"], r["step"], r["route"]), []).append(
+                (le, value)
+            )
+
+    result = []
+    for key, r in sorted(rows.items()):
+        r["acceptance"] = r["accepted"] / r["attempts"] if r["attempts"] else None
+        r["mean"] = r["seconds"] / r["attempts"] if r["attempts"] else None
+        r["p95"] = _quantile(sorted(buckets.get(key, [])), 0.95)
+        result.append(r)
+    return result
+
+
+def _quantile(buckets: List[Tuple[float, float]], q: float) -> Optional[float]:
+    """Interpolate within cumulative buckets, as PromQL's histogram_quantile."""
+    if not buckets or buckets[-1][1] == 0:
+        return None
+    rank = q * buckets[-1][1]
+    lower, below = 0.0, 0.0
+    for bound, cumulative in buckets:
+        if cumulative >= rank:
+            if bound == float("inf"):
+                return lower
+            if cumulative == below:
+                return bound
+            return lower + (bound - lower) * (rank - below) / (cumulative - below)
+        lower, below = bound, cumulative
+    return lower
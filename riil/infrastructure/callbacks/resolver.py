@@ -1,14 +1,30 @@
 # riil/infrastructure/callbacks/resolver.py
 """
 Registry for callback types used in YAML.
+
+Like providers, callback types are looked up in registered factories, then
+the built-in table, then `riil.callbacks` entry points, and imported lazily.
 """
 
-from typing import Dict, Callable, Any
+from typing import Dict, Callable, Any, List, Optional
+
+from riil.core.callback import Callback
+
+from riil.infrastructure.utils.plugins import find_plugin, plugin_names
+
+CALLBACK_ENTRY_POINTS = "riil.callbacks"
+
+BUILTIN_CALLBACKS: Dict[str, str] = {
+    "json": "riil.infrastructure.callbacks.structured:create_json_callback",
+    "metrics": "riil.infrastructure.callbacks.metrics:create_metrics_callback",
+}
+
+CallbackFactory = Callable[[Dict[str, Any]], Callback]
 
-_callback_factories: Dict[str, Callable] = {}
+_callback_factories: Dict[str, CallbackFactory] = {}
 
 
-def register_callback(name: str, factory: Callable[[Dict[str, Any]], 'Callback']):
+def register_callback(name: str, factory: CallbackFactory) -> None:
     """
     Register a callback factory.
     Can be used in YAML workflows.
@@ -16,11 +32,28 @@ def register_callback(name: str, factory: Callable[[Dict[str, Any]], 'Callback']
     _callback_factories[name] = factory
 
 
-def resolve_callback(config: Dict[str, Any]) -> 'Callback':
+def get_callback_factory(cb_type: str) -> CallbackFactory:
+    """Return the factory for a callback type, importing it on first use."""
+    if cb_type not in _callback_factories:
+        factory: Optional[CallbackFactory] = find_plugin(
+            CALLBACK_ENTRY_POINTS, cb_type, BUILTIN_CALLBACKS
+        )
+        if factory is None:
+            raise ValueError(f"Unknown callback type: {cb_type}")
+        _callback_factories[cb_type] = factory
+    return _callback_factories[cb_type]
+
+
+def available_callbacks() -> List[str]:
+    """Names of every registered, built-in and installed callback type."""
+    return sorted(
+        set(_callback_factories)
+        | set(plugin_names(CALLBACK_ENTRY_POINTS, BUILTIN_CALLBACKS))
+    )
+
+
+def resolve_callback(config: Dict[str, Any]) -> Callback:
     """
     Create a callback from config.
     """
-    cb_type = config["type"]
-    if cb_type not in _callback_factories:
-        raise ValueError(f"Unknown callback type: {cb_type}")
-    return _callback_factories[cb_type](config.get("config", {}))
+    return get_callback_factory(config["type"])(config.get("config", {}))
@@ -0,0 +1,241 @@
+# riil/infrastructure/callbacks/sink.py
+"""
+Non-blocking NDJSON sink for log events.
+
+Callbacks emit plain dicts, serialized on the spot so the record shows the
+run as it was, however the run's context changes afterwards. A background
+task drains the bounded queue of NDJSON lines and writes whatever has
+accumulated as one batch from a worker thread, so slow pipes or disks never
+stall the event loop. When the queue is
+full the sink either drops the event (counted, and reported in the stream)
+or makes the producer wait, depending on `policy`.
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import sys
+from typing import Any, BinaryIO, Dict, List, Optional, Set, TextIO, Union
+
+# Options accepted under a `json` callback's `config` in workflow YAML
+DEFAULT_SINK_OPTIONS: Dict[str, Any] = {
+    "path": None,  # None writes to stdout
+    "max_bytes": 50 * 1024 * 1024,  # rotate the file past this size; 0 disables
+    "backups": 5,  # rotated files kept (path.1, path.2, ...)
+    "gzip": False,  # compress rotated files
+    "queue_size": 10000,
+    "batch_size": 512,
+    "flush_interval": 0.05,  # seconds to let a batch accumulate before writing
+    "policy": "drop",  # "drop" new events or "block" producers when full
+}
+
+SINK_POLICIES = {"drop", "block"}
+
+_sinks: Set["EventSink"] = set()
+
+
+def validate_sink_options(options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Return options merged over the defaults. Raises ValueError on bad values."""
+    options = options or {}
+    unknown = set(options) - set(DEFAULT_SINK_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown sink options: {', '.join(sorted(unknown))}")
+    merged = {**DEFAULT_SINK_OPTIONS, **options}
+    if merged["policy"] not in SINK_POLICIES:
+        raise ValueError(
+            f"Unknown sink policy: {merged['policy']} (expected drop or block)"
+        )
+    if merged["queue_size"] < 1 or merged["batch_size"] < 1:
+        raise ValueError("queue_size and batch_size must be >= 1")
+    return merged
+
+
+class StreamWriter:
+    def __init__(self, stream: Optional[TextIO] = None) -> None:
+        self.stream = stream
+
+    def write(self, data: str) -> None:
+        stream = self.stream or sys.stdout
+        stream.write(data)
+        stream.flush()
+
+    def close(self) -> None:
+        pass
+
+
+class RotatingFileWriter:
+    """Append-only file rotated by size; rotated files are optionally gzipped."""
+
+    def __init__(
+        self, path: str, max_bytes: int = 0, backups: int = 5, compress: bool = False
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress
+        self._file: Optional[BinaryIO] = None
+        self._size = 0
+
+    def write(self, data: str) -> None:
+        encoded = data.encode("utf-8")
+        file = self._file
+        if file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            file = self._file = open(self.path, "ab")
+            self._size = file.tell()
+        if self.max_bytes and self._size and self._size + len(encoded) > self.max_bytes:
+            file = self._rotate(file)
+        file.write(encoded)
+        file.flush()
+        self._size += len(encoded)
+
+    def _backup(self, index: int) -> str:
+        return f"{self.path}.{index}" + (".gz" if self.compress else "")
+
+    def _rotate(self, file: BinaryIO) -> BinaryIO:
+        """Move the current file aside and return a new, empty one."""
+        file.close()
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(self._backup(i)):
+                    os.replace(self._backup(i), self._backup(i + 1))
+            if self.compress:
+                with open(self.path, "rb") as src, gzip.open(
+                    self._backup(1), "wb"
+                ) as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self._backup(1))
+        file = self._file = open(self.path, "wb")
+        self._size = 0
+        return file
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class EventSink:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = DEFAULT_SINK_OPTIONS["max_bytes"],
+        backups: int = 5,
+        gzip: bool = False,
+        queue_size: int = 10000,
+        batch_size: int = 512,
+        flush_interval: float = 0.05,
+        policy: str = "drop",
+        stream: Optional[TextIO] = None,
+    ) -> None:
+        if policy not in SINK_POLICIES:
+            raise ValueError(f"Unknown sink policy: {policy} (expected drop or block)")
+        self.writer: Union[RotatingFileWriter, StreamWriter]
+        if path:
+            self.writer = RotatingFileWriter(path, max_bytes, backups, gzip)
+        else:
+            self.writer = StreamWriter(stream)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        # NDJSON lines waiting for the writer
+        self._queue: "Optional[asyncio.Queue[str]]" = None
+        self._task: "Optional[asyncio.Task[None]]" = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Counters
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self._reported_drops = 0
+
+    def _start(self) -> "asyncio.Queue[str]":
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        task = self._task
+        if queue is None or self._loop is not loop or task is None or task.done():
+            # One writer per event loop; a sink reused under a new loop starts afresh
+            self._loop = loop
+            queue = self._queue = asyncio.Queue(self.queue_size)
+            self._task = loop.create_task(self._drain(queue))
+            _sinks.add(self)
+        return queue
+
+    async def emit(self, record: Dict[str, Any]) -> None:
+        """Queue one event. Under the drop policy this never waits."""
+        queue = self._start()
+        # Only the string crosses into the writer thread
+        line = _serialize(record)
+        if self.policy == "block":
+            await queue.put(line)
+            return
+        try:
+            queue.put_nowait(line)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _drain(self, queue: "asyncio.Queue[str]") -> None:
+        while True:
+            batch = [await queue.get()]
+            if self.flush_interval and queue.qsize() < self.batch_size:
+                await asyncio.sleep(self.flush_interval)
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            taken = len(batch)
+            batch.extend(self._drop_report())
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                print(f"riil: log sink write failed: {e}", file=sys.stderr)
+            finally:
+                for _ in range(taken):
+                    queue.task_done()
+
+    def _drop_report(self) -> List[str]:
+        """A `log.dropped` line when events were dropped since the last report."""
+        missed = self.dropped - self._reported_drops
+        self._reported_drops = self.dropped
+        return [_serialize({"event": "log.dropped", "count": missed})] if missed else []
+
+    def _write_batch(self, batch: List[str]) -> None:
+        self.writer.write("".join(batch))
+        self.written += len(batch)
+        self.batches += 1
+
+    async def flush(self) -> None:
+        """Wait until every queued event has been written."""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def close(self) -> None:
+        await self.flush()
+        report = self._drop_report()
+        if report:
+            await asyncio.to_thread(self._write_batch, report)
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self.writer.close()
+        _sinks.discard(self)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+        }
+
+
+def _serialize(record: Dict[str, Any]) -> str:
+    return json.dumps(record, default=str) + "\n"
+
+
+async def close_sinks() -> None:
+    """Flush and close every active sink; call before the event loop shuts down."""
+    for sink in list(_sinks):
+        await sink.close()
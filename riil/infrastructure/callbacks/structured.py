@@ -1,41 +1,55 @@
 # riil/infrastructure/callbacks/structured.py
 """
 Structured JSON logger for ELK, Splunk, etc.
+Events go through a non-blocking EventSink (NDJSON on stdout or rotating files).
 """
 
-import json
-import sys
 from datetime import datetime
+from typing import Any, Dict, Optional
 from riil.core.callback import Callback
+from riil.infrastructure.callbacks.sink import EventSink, validate_sink_options
 
 
 class StructuredJSONCallback(Callback):
-    def _emit(self, event: str, data: dict):
-        record = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "event": event,
-            **data
-        }
-        print(json.dumps(record), file=sys.stdout)
+    def __init__(self, sink: Optional[EventSink] = None):
+        self.sink = sink or EventSink()
+
+    async def _emit(self, event: str, data: dict):
+        # Serialized by the sink right away, so later changes to the context don't show
+        await self.sink.emit(
+            {"timestamp": datetime.utcnow().isoformat(), "event": event, **data}
+        )
 
     async def on_step_start(self, step, inputs, context):
-        self._emit("step.start", {
-            "step_type": step.__class__.__name__,
-            "inputs": self._safe(inputs)
-        })
+        await self._emit(
+            "step.start",
+            {"step_type": step.__class__.__name__, "inputs": self._safe(inputs)},
+        )
 
     async def on_step_end(self, step, outputs, context):
-        self._emit("step.end", {
-            "step_type": step.__class__.__name__,
-            "outputs": self._safe(outputs)
-        })
+        await self._emit(
+            "step.end",
+            {"step_type": step.__class__.__name__, "outputs": self._safe(outputs)},
+        )
 
     async def on_error(self, step, error, context):
-        self._emit("step.error", {
-            "step_type": step.__class__.__name__,
-            "error": str(error),
-            "error_type": error.__class__.__name__
-        })
+        await self._emit(
+            "step.error",
+            {
+                "step_type": step.__class__.__name__,
+                "error": str(error),
+                "error_type": error.__class__.__name__,
+            },
+        )
 
     def _safe(self, data):
-        return {k: v for k, v in data.items() if isinstance(v, (str, int, float, bool, dict, list, type(None)))}
+        return {
+            k: v
+            for k, v in data.items()
+            if isinstance(v, (str, int, float, bool, dict, list, type(None)))
+        }
+
+
+def create_json_callback(config: Dict[str, Any]) -> StructuredJSONCallback:
+    """Factory for `type: json` callbacks; `config` holds sink options."""
+    return StructuredJSONCallback(EventSink(**validate_sink_options(config)))
@@ -3,9 +3,414 @@
 Base LLM interface.
 """
 
-from riil.domain.step import Step
+import asyncio
+import json
+import time
+from typing import Any, AsyncGenerator, Dict, Hashable, List, Optional, Type
+
+from pydantic import BaseModel
+
+from riil.core.profiling import span, start_span
+from riil.domain.prompt import PromptTemplate
+from riil.domain.step import Step, StepField
+from riil.domain.types import Inputs
+from riil.infrastructure.llms.cache import cache_key, is_deterministic, resolve_cache
+from riil.infrastructure.llms.errors import (
+    LLMTimeoutError,
+    RateLimitedError,
+    SchemaViolationError,
+)
+from riil.infrastructure.llms.ratelimit import estimate_tokens, get_scheduler
+from riil.infrastructure.llms.retry import (
+    HedgePolicy,
+    LatencyTracker,
+    RetryPolicy,
+    get_latency_tracker,
+    hedge_counters,
+)
+from riil.infrastructure.llms.singleflight import default_flight
+from riil.infrastructure.llms.structured import (
+    StreamingValidator,
+    portable_schema,
+    schema_instructions,
+    validate_value,
+)
+from riil.infrastructure.utils.offload import offload
+
+Messages = List[Dict[str, Any]]
+Completion = Dict[str, Any]
 
 
 class LLM(Step):
-    """Base class for LLM steps."""
-    pass
+    """
+    Base class for LLM steps.
+
+    Providers implement `complete()` (and `complete_stream()` when they can
+    stream); steps call `generate()`, which adds the shared request layers on
+    top of it: response cache, in-flight coalescing, retries with backoff
+    and optional hedging, then the per-model scheduler (rate limits, adaptive
+    concurrency, retry on HTTP 429). Providers raise the errors in
+    riil.infrastructure.llms.errors so these layers can classify failures.
+    """
+
+    provider: str = "llm"
+    model: str = ""
+    # Request parameters (temperature, max_tokens...); set per instance
+    params: Dict[str, Any]
+    cache_options: Any = None
+    coalesce: bool = True
+    rate_limit: Optional[Dict[str, Any]] = None
+    retry_policy: Optional[RetryPolicy] = None
+    hedge_policy: Optional[HedgePolicy] = None
+    template: Optional[PromptTemplate] = None
+    # System message rendered from the step's rules (riil.infrastructure.rules)
+    rules: Any = None
+    # Worker pool ("process" / "thread") for validating complete structured outputs
+    offload: Optional[str] = None
+
+    def __init__(self) -> None:
+        self.params = {}
+
+    @property
+    def endpoint(self) -> str:
+        """Identifies where requests go (e.g. base URL); part of the request key."""
+        return ""
+
+    async def complete(self, messages: Messages) -> Completion:
+        """
+        Send one request to the provider.
+        Returns {"content": str, "usage": dict or None}.
+        """
+        raise NotImplementedError("Subclasses must implement complete()")
+
+    async def complete_stream(self, messages: Messages) -> AsyncGenerator[str, None]:
+        """
+        Stream one request's content. Providers without a streaming API
+        inherit this single-chunk fallback.
+        """
+        response = await self.complete(messages)
+        yield response["content"]
+
+    def prompt_messages(self, inputs: Inputs) -> Messages:
+        """
+        The request for `inputs`: the rules' system message, then the rendered
+        prompt. Everything that varies per request comes last, so repeated
+        requests share the longest possible prefix.
+        """
+        template = self.template
+        if template is None:
+            raise ValueError(f"{type(self).__name__} has no prompt template")
+        with span("prompt", "prompt"):
+            messages = [{"role": "user", "content": template.render(inputs)}]
+            if self.rules is not None:
+                messages.insert(0, self.rules.message())
+        return messages
+
+    def batch_request(self, inputs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        This step's request for `inputs` as a batch-file line without its
+        custom_id ({"method", "url", "body"}), or None when the provider has
+        no batch API and the step must run live.
+        """
+        return None
+
+    def batch_output(self, body: Dict[str, Any]) -> Any:
+        """The step output for one response body from a batch results file."""
+        raise NotImplementedError(
+            "Subclasses with batch_request() must implement batch_output()"
+        )
+
+    @property
+    def scheduler_key(self) -> Hashable:
+        """Requests sharing this key share rate limits; include the credential."""
+        return (self.provider, self.endpoint, self.model)
+
+    def request_key(self, messages: Messages) -> str:
+        return cache_key(
+            f"{self.provider}:{self.endpoint}", self.model, messages, self.params
+        )
+
+    async def generate(self, messages: Messages) -> Completion:
+        """
+        Complete `messages` through the response cache when it is enabled, and
+        share one request between concurrent identical calls. Sampled requests
+        (temperature > 0, n > 1) are never coalesced.
+        """
+        cache = resolve_cache(self.cache_options, self.params)
+        coalesce = self.coalesce and is_deterministic(self.params)
+        if cache is None and not coalesce:
+            return await self._request(messages)
+
+        key = self.request_key(messages)
+        if cache is not None:
+            with span("cache", "llm") as cache_span:
+                hit = await cache.get(key)
+                if cache_span is not None:
+                    cache_span.attrs["hit"] = hit is not None
+            if hit is not None:
+                return {**hit, "cached": True}
+
+        async def _fetch() -> Completion:
+            response = await self._request(messages)
+            if cache is not None:
+                await cache.set(key, response)
+            return response
+
+        if coalesce:
+            # Identical concurrent requests share one; only the first records attempts
+            with span("coalesce", "llm"):
+                shared: Completion = await default_flight.do(key, _fetch)
+                return shared
+        return await _fetch()
+
+    async def generate_stream(self, messages: Messages) -> AsyncGenerator[str, None]:
+        """
+        Stream `messages`. A cache hit is replayed as one chunk; a completed
+        stream is stored in the cache. Streams are never coalesced.
+        """
+        cache = resolve_cache(self.cache_options, self.params)
+        key = self.request_key(messages) if cache is not None else ""
+        if cache is not None:
+            hit = await cache.get(key)
+            if hit is not None:
+                yield hit["content"]
+                return
+
+        chunks = []
+        async for text in self._request_stream(messages):
+            chunks.append(text)
+            yield text
+        if cache is not None:
+            await cache.set(key, {"content": "".join(chunks), "usage": None})
+
+    async def generate_structured(
+        self,
+        messages: Messages,
+        schema: Type[BaseModel],
+        max_retries: int = 2,
+        max_chars: Optional[int] = None,
+    ) -> AsyncGenerator[Any, None]:
+        """
+        Stream `messages` and validate the JSON against `schema` as it arrives.
+        Yields a StepField for each valid top-level field, then a result dict
+        {"output", "repaired", "attempts"}. A certain violation cancels the
+        request and retries, up to `max_retries` times, telling the model
+        what was wrong.
+        """
+        attempt_messages = with_system_message(messages, schema_instructions(schema))
+        for attempt in range(1, max_retries + 2):
+            validator = StreamingValidator(schema, max_chars)
+            stream = self.generate_stream(attempt_messages)
+            try:
+                try:
+                    async for text in stream:
+                        validator.feed(text)
+                        for name, value in validator.completed:
+                            yield StepField(name, value, attempt)
+                        validator.completed.clear()
+                finally:
+                    # Closing the stream early stops paying for the rest of it
+                    await stream.aclose()
+                if self.offload:
+                    # Validating a large object holds the loop; the text is parsed
+                    output = await offload(
+                        validate_value,
+                        portable_schema(schema),
+                        validator.close(),
+                        mode=self.offload,
+                    )
+                else:
+                    output = validator.finish().model_dump()
+            except SchemaViolationError as e:
+                if attempt > max_retries:
+                    raise
+                attempt_messages = [
+                    *attempt_messages,
+                    {
+                        "role": "user",
+                        "content": f"Your previous reply was invalid ({e})."
+                        " Reply again with only the JSON object.",
+                    },
+                ]
+                continue
+            yield {
+                "output": output,
+                "repaired": _needs_repair(validator.text),
+                "attempts": attempt,
+            }
+            return
+
+    async def _request(self, messages: Messages) -> Completion:
+        """Attempts under the retry policy; each attempt may be hedged."""
+        policy = self.retry_policy or _SINGLE_ATTEMPT
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                with span("attempt", "llm", model=self.model, attempt=attempt):
+                    return await self._attempt(messages, policy.attempt_timeout)
+            except Exception as e:
+                if not policy.should_retry(e, attempt):
+                    raise
+            await asyncio.sleep(policy.backoff(attempt))
+
+    async def _request_stream(self, messages: Messages) -> AsyncGenerator[str, None]:
+        """Streams are retried only while no chunk has been yielded yet."""
+        policy = self.retry_policy or _SINGLE_ATTEMPT
+        attempt = 0
+        while True:
+            attempt += 1
+            started = False
+            # Not made current: it would leak into the consumer between chunks
+            attempt_span = start_span(
+                "attempt", "llm", model=self.model, attempt=attempt, stream=True
+            )
+            try:
+                async for text in self._send_stream(messages):
+                    if not started and attempt_span is not None:
+                        attempt_span.attrs["ttft"] = attempt_span.duration
+                    started = True
+                    yield text
+                return
+            except Exception as e:
+                if started or not policy.should_retry(e, attempt):
+                    raise
+            finally:
+                if attempt_span is not None:
+                    attempt_span.finish()
+            await asyncio.sleep(policy.backoff(attempt))
+
+    async def _attempt(
+        self, messages: Messages, timeout: Optional[float]
+    ) -> Completion:
+        if timeout is None:
+            return await self._hedged(messages)
+        try:
+            return await asyncio.wait_for(self._hedged(messages), timeout)
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"LLM attempt timed out after {timeout}s") from None
+
+    async def _hedged(self, messages: Messages) -> Completion:
+        """
+        Send the request; if it is still running after the model's latency
+        percentile, send a duplicate and keep whichever succeeds first.
+        """
+        tracker = get_latency_tracker(self.scheduler_key)
+        delay = self.hedge_policy.delay(tracker) if self.hedge_policy else None
+        if delay is None:
+            return await self._timed_send(messages, tracker)
+
+        tasks = [asyncio.ensure_future(self._timed_send(messages, tracker))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            counters = hedge_counters(self.scheduler_key)
+            if not done:
+                counters["issued"] += 1
+                tasks.append(asyncio.ensure_future(self._timed_send(messages, tracker)))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in (t for t in tasks if t in done):
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            counters["won"] += 1
+                        return task.result()
+                    error = error or task.exception()
+            # Every task finished without a success, so one of them failed
+            assert error is not None
+            raise error
+        finally:
+            # Losers are awaited so their streams and scheduler slots are released now
+            losers = [task for task in tasks if not task.done()]
+            for task in losers:
+                task.cancel()
+            if losers:
+                await asyncio.gather(*losers, return_exceptions=True)
+
+    async def _timed_send(
+        self, messages: Messages, tracker: LatencyTracker
+    ) -> Completion:
+        started = time.monotonic()
+        response = await self._send(messages)
+        tracker.record(time.monotonic() - started)
+        return response
+
+    async def _send(self, messages: Messages) -> Completion:
+        """One request through the shared scheduler, retrying on HTTP 429."""
+        scheduler = get_scheduler(self.scheduler_key, self.rate_limit)
+        estimate = estimate_tokens(messages, self.params)
+        attempt = 0
+        while True:
+            with span("queue", "llm"):
+                await scheduler.acquire(estimate)
+            try:
+                with span("request", "llm", model=self.model):
+                    response = await self.complete(messages)
+            except RateLimitedError as e:
+                scheduler.release(estimate, throttled=True, retry_after=e.retry_after)
+                attempt += 1
+                if attempt > scheduler.max_retries:
+                    raise
+                continue
+            except BaseException:
+                scheduler.release(estimate, succeeded=False)
+                raise
+            scheduler.release(estimate, _total_tokens(response.get("usage")))
+            return response
+
+    async def _send_stream(self, messages: Messages) -> AsyncGenerator[str, None]:
+        """Streaming counterpart of `_send`; 429s are retried until the first chunk."""
+        scheduler = get_scheduler(self.scheduler_key, self.rate_limit)
+        estimate = estimate_tokens(messages, self.params)
+        attempt = 0
+        while True:
+            with span("queue", "llm"):
+                await scheduler.acquire(estimate)
+            started = False
+            outcome: Dict[str, Any] = {"succeeded": False}
+            try:
+                async for text in self.complete_stream(messages):
+                    started = True
+                    yield text
+                outcome = {"succeeded": True}
+                return
+            except RateLimitedError as e:
+                outcome = {"throttled": True, "retry_after": e.retry_after}
+                if started or attempt >= scheduler.max_retries:
+                    raise
+                attempt += 1
+            finally:
+                scheduler.release(estimate, **outcome)
+
+
+_SINGLE_ATTEMPT = RetryPolicy(max_attempts=1)
+
+
+def _needs_repair(text: str) -> bool:
+    try:
+        json.loads(text)
+    except ValueError:
+        return True
+    return False
+
+
+def _total_tokens(usage: Optional[Dict[str, int]]) -> Optional[int]:
+    if not usage:
+        return None
+    return usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+
+
+def with_system_message(messages: Messages, content: str) -> Messages:
+    """`messages` with a system message added after the leading ones (e.g. rules)."""
+    split = next(
+        (i for i, m in enumerate(messages) if m.get("role") != "system"), len(messages)
+    )
+    return [
+        *messages[:split],
+        {"role": "system", "content": content},
+        *messages[split:],
+    ]
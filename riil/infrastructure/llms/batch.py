@@ -0,0 +1,160 @@
+# riil/infrastructure/llms/batch.py
+"""
+Transports for provider batch files.
+
+A batch file is JSONL in the OpenAI batch format, one request per line:
+
+    {"custom_id": "...", "method": "POST", "url": "/v1/chat/completions", "body": {...}}
+
+and its results file has one line per request, in any order:
+
+    {"custom_id": "...", "response": {"status_code": 200, "body": {...}}, "error": null}
+
+A transport submits a request file, reports when the batch has finished,
+and downloads whatever results it produced. DirectoryTransport is a
+stand-in provider backed by a local directory, for tests and dry runs.
+"""
+
+import json
+import os
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from riil.infrastructure.llms.clients import get_openai_client
+
+# OpenAI batch statuses after which no more results will appear
+_FINISHED_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchTransport(ABC):
+    @abstractmethod
+    async def submit(self, path: Path) -> str:
+        """Upload a request file and start a batch; returns the batch id."""
+
+    @abstractmethod
+    async def poll(self, batch_id: str) -> bool:
+        """True once the batch has finished, successfully or not."""
+
+    @abstractmethod
+    async def download(self, batch_id: str, dest: Path) -> None:
+        """Write the finished batch's result lines, per-request errors included."""
+
+
+class OpenAIBatchTransport(BatchTransport):
+    def __init__(self, client: Any = None, completion_window: str = "24h"):
+        if client is None:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise EnvironmentError("OPENAI_API_KEY not set")
+            client = get_openai_client(api_key)
+        self.client = client
+        self.completion_window = completion_window
+
+    async def submit(self, path: Path) -> str:
+        with open(path, "rb") as f:
+            uploaded = await self.client.files.create(file=f, purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=_endpoint(path),
+            completion_window=self.completion_window,
+        )
+        batch_id: str = batch.id
+        return batch_id
+
+    async def poll(self, batch_id: str) -> bool:
+        batch = await self.client.batches.retrieve(batch_id)
+        return batch.status in _FINISHED_STATUSES
+
+    async def download(self, batch_id: str, dest: Path) -> None:
+        batch = await self.client.batches.retrieve(batch_id)
+        with open(dest, "wb") as f:
+            # Failed requests are listed in a separate error file
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    content = await self.client.files.content(file_id)
+                    f.write(content.read())
+
+
+class DirectoryTransport(BatchTransport):
+    """
+    Batches are files under `root`: submitted requests go to `inbox/` and a
+    batch has finished once `outbox/<batch id>.jsonl` exists. Something else
+    plays the provider, e.g. `fulfil_directory_batches`.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.inbox = self.root / "inbox"
+        self.outbox = self.root / "outbox"
+        self.inbox.mkdir(parents=True, exist_ok=True)
+        self.outbox.mkdir(parents=True, exist_ok=True)
+
+    async def submit(self, path: Path) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        shutil.copyfile(path, self.inbox / f"{batch_id}.jsonl")
+        return batch_id
+
+    async def poll(self, batch_id: str) -> bool:
+        return (self.outbox / f"{batch_id}.jsonl").exists()
+
+    async def download(self, batch_id: str, dest: Path) -> None:
+        shutil.copyfile(self.outbox / f"{batch_id}.jsonl", dest)
+
+
+async def fulfil_directory_batches(
+    root: Path, respond: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+) -> int:
+    """
+    Answer every pending batch in a DirectoryTransport directory with
+    `respond(body) -> response body`. Returns the number of batches answered.
+    """
+    transport = DirectoryTransport(root)
+    answered = 0
+    for request_file in sorted(transport.inbox.glob("*.jsonl")):
+        result_file = transport.outbox / request_file.name
+        if result_file.exists():
+            continue
+        tmp = result_file.with_suffix(".tmp")
+        with open(request_file, encoding="utf-8") as src, open(
+            tmp, "w", encoding="utf-8"
+        ) as dst:
+            for line in src:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                try:
+                    body = await respond(request["body"])
+                    result = {
+                        "custom_id": request["custom_id"],
+                        "response": {"status_code": 200, "body": body},
+                        "error": None,
+                    }
+                except Exception as e:
+                    result = {
+                        "custom_id": request["custom_id"],
+                        "response": None,
+                        "error": {"message": str(e)},
+                    }
+                dst.write(json.dumps(result, ensure_ascii=False) + "\n")
+        os.replace(tmp, result_file)
+        answered += 1
+    return answered
+
+
+def get_batch_transport(spec: str) -> BatchTransport:
+    """Transport from a CLI spec: `openai` or `dir:PATH`."""
+    if spec == "openai":
+        return OpenAIBatchTransport()
+    if spec.startswith("dir:"):
+        return DirectoryTransport(Path(spec[4:]))
+    raise ValueError(f"Unknown batch transport: {spec} (use 'openai' or 'dir:PATH')")
+
+
+def _endpoint(path: Path) -> str:
+    """The batch endpoint, taken from the first request in the file."""
+    with open(path, encoding="utf-8") as f:
+        first: Optional[str] = next((line for line in f if line.strip()), None)
+    return json.loads(first)["url"] if first else "/v1/chat/completions"
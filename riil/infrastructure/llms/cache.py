@@ -0,0 +1,294 @@
+# riil/infrastructure/llms/cache.py
+"""
+Two-tier LLM response cache: bounded in-memory LRU in front of an optional
+SQLite file. Opt-in per step (`llm.config.cache`) or globally (`--cache`).
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Options accepted under `llm.config.cache` in workflow YAML
+DEFAULT_CACHE_OPTIONS: Dict[str, Any] = {
+    "ttl": None,  # seconds; None keeps entries until evicted
+    "max_entries": 1024,  # in-memory LRU size
+    "path": None,  # SQLite file; None keeps the cache in memory only
+    "max_disk_entries": None,
+    "max_disk_bytes": None,
+    "sampled": False,  # also cache when temperature > 0 or n > 1
+}
+
+_global: Dict[str, Any] = {"enabled": None, "options": {}}
+_caches: Dict[Tuple[Any, ...], "ResponseCache"] = {}
+
+
+def cache_key(
+    provider: str, model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]
+) -> str:
+    """Stable key over everything that determines a completion."""
+    payload = json.dumps(
+        {"provider": provider, "model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_deterministic(params: Dict[str, Any]) -> bool:
+    """False when the generation config explicitly asks for sampled output."""
+    return not ((params.get("temperature") or 0) > 0 or (params.get("n") or 1) > 1)
+
+
+class CacheStats:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+
+class MemoryCache:
+    """LRU of (created, value) bounded by entry count."""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        created, value = item
+        if self.ttl is not None and time.time() - created > self.ttl:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, created: Optional[float] = None) -> int:
+        """Store a value; returns how many entries were evicted."""
+        self._data[key] = (created or time.time(), value)
+        self._data.move_to_end(key)
+        evicted = 0
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            evicted += 1
+        return evicted
+
+
+class SQLiteCache:
+    """Persistent tier. Least recently read entries are evicted first."""
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, "
+            "accessed REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+        )
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+            )
+        return row[1], json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> int:
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, data, now, now, len(data)),
+            )
+            return self._evict()
+
+    def _evict(self) -> int:
+        evicted = 0
+        if self.max_entries is not None:
+            count: int = self._conn.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()[0]
+            if count > self.max_entries:
+                evicted += self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                    (count - self.max_entries,),
+                ).rowcount
+        if self.max_bytes is not None:
+            total: int = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                stale: List[Tuple[str]] = []
+                for key, size in self._conn.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed"
+                ):
+                    if total <= self.max_bytes:
+                        break
+                    stale.append((key,))
+                    total -= size
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+                evicted += len(stale)
+        return evicted
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """Memory LRU backed by an optional SQLite tier, with hit/miss counters."""
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        ttl: Optional[float] = None,
+        max_entries: int = 1024,
+        max_disk_entries: Optional[int] = None,
+        max_disk_bytes: Optional[int] = None,
+    ):
+        self.memory = MemoryCache(max_entries, ttl)
+        self.disk = (
+            SQLiteCache(path, ttl, max_disk_entries, max_disk_bytes) if path else None
+        )
+        self.stats = CacheStats()
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats.hits += 1
+            self.stats.memory_hits += 1
+            return value
+        if self.disk is not None:
+            row = await asyncio.to_thread(self.disk.get, key)
+            if row is not None:
+                created, value = row
+                self.stats.evictions += self.memory.set(key, value, created)
+                self.stats.hits += 1
+                self.stats.disk_hits += 1
+                return value
+        self.stats.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        self.stats.writes += 1
+        self.stats.evictions += self.memory.set(key, value)
+        if self.disk is not None:
+            self.stats.evictions += await asyncio.to_thread(self.disk.set, key, value)
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
+
+
+def validate_cache_options(
+    value: Union[None, bool, Dict[str, Any]],
+) -> Union[None, bool, Dict[str, Any]]:
+    """
+    Normalize a step's `cache` setting: None (unset), False (disabled) or an
+    options dict (enabled). Raises ValueError on unknown keys.
+    """
+    if value is None or value is False:
+        return value
+    if value is True:
+        return {}
+    if not isinstance(value, dict):
+        raise ValueError(
+            f"cache must be a bool or a mapping, got {type(value).__name__}"
+        )
+    unknown = set(value) - set(DEFAULT_CACHE_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown cache options: {', '.join(sorted(unknown))}")
+    return value
+
+
+def configure_cache(enabled: Optional[bool] = None, **options: Any) -> None:
+    """
+    Process-wide cache settings (used by the CLI).
+    enabled=True caches every step that does not set `cache: false`,
+    enabled=False bypasses the cache everywhere, None defers to each step.
+    """
+    validate_cache_options(options)
+    _global["enabled"] = enabled
+    _global["options"] = options
+
+
+def resolve_cache(
+    step_options: Union[None, bool, Dict[str, Any]], params: Dict[str, Any]
+) -> Optional[ResponseCache]:
+    """Return the cache a request should go through, or None to bypass."""
+    if _global["enabled"] is False or step_options is False:
+        return None
+    if step_options is None and not _global["enabled"]:
+        return None
+    overrides = step_options if isinstance(step_options, dict) else {}
+    options = {**DEFAULT_CACHE_OPTIONS, **_global["options"], **overrides}
+    if not options.pop("sampled") and not is_deterministic(params):
+        return None
+    key = tuple(sorted(options.items()))
+    cache = _caches.get(key)
+    if cache is None:
+        cache = _caches[key] = ResponseCache(**options)
+    return cache
+
+
+def cache_stats() -> Dict[str, int]:
+    """Counters summed over every live cache."""
+    totals = CacheStats().as_dict()
+    for cache in _caches.values():
+        for name, value in cache.stats.as_dict().items():
+            totals[name] += value
+    return totals
+
+
+def close_caches() -> None:
+    """Close SQLite tiers and drop every live cache."""
+    caches = list(_caches.values())
+    _caches.clear()
+    for cache in caches:
+        cache.close()
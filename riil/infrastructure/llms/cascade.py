@@ -0,0 +1,310 @@
+# riil/infrastructure/llms/cascade.py
+"""
+Cascade routing: try an ordered list of models, cheapest first, and
+escalate to the next one when a route fails or its answer is rejected.
+
+    llm:
+      provider: cascade
+      model: mini-then-4o            # label for metrics
+      config:
+        temperature: 0               # shared by every route
+        routes:
+          - gpt-4o-mini              # same provider as `provider` (default openai)
+          - {model: gpt-4o, config: {max_tokens: 800}, max_retries: 2}
+        accept:                      # every check must pass
+          - no_repair
+          - {check: min_length, chars: 20}
+          - {check: scorer, function: "mypkg.scoring:score", threshold: 0.7}
+        strict: false                # true: fail when no route is accepted
+
+Routes are built with the registered provider factories, from the step's
+own config (prompt, rules, output_schema...) and the route's overrides. An
+answer that fails the step's output schema makes the route raise, which
+escalates like any other error. Every attempt is recorded in the metrics
+registry, per route: outcome (accepted / rejected / error), the check or
+error that rejected it, and latency. `riil stats` reports acceptance rates
+from those.
+"""
+
+import inspect
+import json
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from riil.domain.prompt import PromptTemplate
+from riil.domain.step import Step
+from riil.domain.types import Inputs, Outputs
+from riil.infrastructure.callbacks.metrics import MetricsRegistry, default_registry
+from riil.infrastructure.llms.errors import SchemaViolationError
+from riil.infrastructure.llms.resolver import get_step_factory
+from riil.infrastructure.llms.structured import model_from_spec, validate_output
+from riil.infrastructure.utils.plugins import load_target
+
+# `llm.config` keys of the cascade itself; the rest is passed to every route
+CASCADE_CONFIG_KEYS = {"routes", "accept", "strict", "provider"}
+
+# A check returns None to accept a result, or the reason it was rejected
+AcceptanceCheck = Callable[
+    [Outputs, Inputs], Union[Optional[str], Awaitable[Optional[str]]]
+]
+CheckFactory = Callable[[Dict[str, Any], Dict[str, Any]], AcceptanceCheck]
+
+_check_factories: Dict[str, CheckFactory] = {}
+
+
+def register_acceptance_check(name: str, factory: CheckFactory) -> None:
+    """
+    Register an acceptance check for `accept:` lists. The factory gets the
+    check's options and the step config, and returns the check.
+    """
+    _check_factories[name] = factory
+
+
+def build_check(
+    spec: Union[str, Dict[str, Any]], step_config: Dict[str, Any]
+) -> Tuple[str, AcceptanceCheck]:
+    """A check from its YAML form: a name, or {check: name, **options}."""
+    options = {"check": spec} if isinstance(spec, str) else dict(spec)
+    name = options.pop("check", None)
+    if name not in _check_factories:
+        raise ValueError(
+            f"Unknown acceptance check: {name}"
+            f" (available: {', '.join(sorted(_check_factories))})"
+        )
+    return name, _check_factories[name](options, step_config)
+
+
+@dataclass(frozen=True)
+class Route:
+    name: str
+    step: Step
+
+
+class CascadeStep(Step):
+    provider = "cascade"
+
+    def __init__(
+        self,
+        prompt: Union[str, PromptTemplate],
+        routes: List[Route],
+        checks: Optional[List[Tuple[str, AcceptanceCheck]]] = None,
+        model: str = "cascade",
+        output_key: str = "output",
+        strict: bool = False,
+        registry: Optional[MetricsRegistry] = None,
+    ):
+        if not routes:
+            raise ValueError("a cascade needs at least one route")
+        self.template = (
+            prompt if isinstance(prompt, PromptTemplate) else PromptTemplate(prompt)
+        )
+        self.prompt = self.template.source
+        self.input_keys = set(self.template.variables)
+        self.routes = routes
+        self.checks = checks or []
+        self.model = model
+        self.output_key = output_key
+        self.strict = strict
+        self.registry = registry or default_registry
+
+    async def run(self, inputs: Inputs) -> Outputs:
+        """The first accepted route's result, with `route` and `escalations` added."""
+        last_result: Optional[Outputs] = None
+        last_error: Optional[Exception] = None
+        for escalations, route in enumerate(self.routes):
+            started = time.monotonic()
+            try:
+                result = await route.step.run(inputs)
+            except Exception as e:
+                self._record(inputs, route, "error", e.__class__.__name__, started)
+                last_error = e
+                continue
+            reason = await self._rejection(result, inputs)
+            self._record(
+                inputs,
+                route,
+                "rejected" if reason else "accepted",
+                reason or "",
+                started,
+            )
+            if reason is None:
+                return {
+                    **result,
+                    "output_key": self.output_key,
+                    "route": route.name,
+                    "escalations": escalations,
+                }
+            last_result = {
+                **result,
+                "output_key": self.output_key,
+                "route": route.name,
+                "escalations": escalations,
+            }
+            last_error = None
+
+        if last_result is not None and not self.strict:
+            # Nothing passed every check: the last answer is the best there is
+            return last_result
+        if last_error is not None:
+            raise last_error
+        raise ValueError(f"No route of cascade '{self.model}' was accepted")
+
+    async def _rejection(self, result: Outputs, inputs: Inputs) -> Optional[str]:
+        for name, check in self.checks:
+            reason = check(result, inputs)
+            if inspect.isawaitable(reason):
+                reason = await reason
+            if reason:
+                return name
+        return None
+
+    def _record(
+        self, inputs: Inputs, route: Route, outcome: str, reason: str, started: float
+    ) -> None:
+        labels = (
+            ("workflow", str(inputs.get("__workflow", ""))),
+            ("step", self.output_key),
+            ("route", route.name),
+        )
+        self.registry.observe(
+            "riil_route_duration_seconds", labels, time.monotonic() - started
+        )
+        self.registry.inc(
+            "riil_route_attempts_total",
+            labels + (("outcome", outcome), ("reason", reason)),
+        )
+
+
+def _text(output: Any) -> str:
+    return (
+        output
+        if isinstance(output, str)
+        else json.dumps(output, ensure_ascii=False, default=str)
+    )
+
+
+def _length_check(compare: Callable[[int, int], bool]) -> CheckFactory:
+    def factory(
+        options: Dict[str, Any], step_config: Dict[str, Any]
+    ) -> AcceptanceCheck:
+        limit = options.get("chars")
+        if not isinstance(limit, int) or limit < 0:
+            raise ValueError("length checks need `chars`, a non-negative integer")
+        return lambda result, inputs: (
+            None if compare(len(_text(result["output"])), limit) else "length"
+        )
+
+    return factory
+
+
+def _regex_check(
+    options: Dict[str, Any], step_config: Dict[str, Any]
+) -> AcceptanceCheck:
+    if "pattern" not in options:
+        raise ValueError("regex check needs `pattern`")
+    pattern = re.compile(options["pattern"])
+    return lambda result, inputs: (
+        None if pattern.search(_text(result["output"])) else "no match"
+    )
+
+
+def _schema_check(
+    options: Dict[str, Any], step_config: Dict[str, Any]
+) -> AcceptanceCheck:
+    """Output parses as JSON and matches `schema` (or the step's output_schema)."""
+    spec = options.get("schema") or step_config.get("output_schema")
+    schema = model_from_spec("cascade_schema", spec) if isinstance(spec, dict) else spec
+
+    def check(result: Outputs, inputs: Inputs) -> Optional[str]:
+        output = result["output"]
+        if not isinstance(output, str):
+            # Structured routes have already validated it
+            return None
+        try:
+            if schema is not None:
+                validate_output(schema, output)
+            else:
+                json.loads(output)
+        except (SchemaViolationError, ValueError) as e:
+            return str(e)
+        return None
+
+    return check
+
+
+def _no_repair_check(
+    options: Dict[str, Any], step_config: Dict[str, Any]
+) -> AcceptanceCheck:
+    """Rejects structured output that had to be repaired or retried to parse."""
+    return lambda result, inputs: (
+        "repaired" if result.get("repaired") or result.get("attempts", 1) > 1 else None
+    )
+
+
+def _scorer_check(
+    options: Dict[str, Any], step_config: Dict[str, Any]
+) -> AcceptanceCheck:
+    """`function(output, inputs)` returns a score; accepted at `threshold` or above."""
+    if "function" not in options:
+        raise ValueError("scorer check needs `function` (module:attribute)")
+    score_fn = load_target(options["function"])
+    threshold = float(options.get("threshold", 0.5))
+
+    async def check(result: Outputs, inputs: Inputs) -> Optional[str]:
+        score = score_fn(result["output"], inputs)
+        if inspect.isawaitable(score):
+            score = await score
+        return None if score >= threshold else f"score {score}"
+
+    return check
+
+
+register_acceptance_check("min_length", _length_check(lambda n, limit: n >= limit))
+register_acceptance_check("max_length", _length_check(lambda n, limit: n <= limit))
+register_acceptance_check("regex", _regex_check)
+register_acceptance_check("schema", _schema_check)
+register_acceptance_check("no_repair", _no_repair_check)
+register_acceptance_check("scorer", _scorer_check)
+
+
+def create_cascade_step(config: Dict[str, Any]) -> CascadeStep:
+    """Factory for CascadeStep; routes are built by their providers' factories."""
+    prompt = config.get("template") or config.get("prompt")
+    if not prompt:
+        raise ValueError("Missing 'prompt' in CascadeStep config")
+    llm_config = config.get("config", {})
+    routes_spec = llm_config.get("routes")
+    if not isinstance(routes_spec, list) or not routes_spec:
+        raise ValueError("cascade needs `routes`, a list of models")
+
+    shared = {k: v for k, v in llm_config.items() if k not in CASCADE_CONFIG_KEYS}
+    step_config = {k: v for k, v in config.items() if k not in ("config", "model")}
+    routes = []
+    for i, spec in enumerate(routes_spec):
+        spec = {"model": spec} if isinstance(spec, str) else dict(spec)
+        if not spec.get("model"):
+            raise ValueError(f"cascade route {i} is missing `model`")
+        provider = spec.pop("provider", llm_config.get("provider", "openai"))
+        name = spec.pop("name", None) or f"{provider}:{spec['model']}"
+        route_config = {
+            **step_config,
+            **spec,
+            "config": {**shared, **spec.get("config", {})},
+        }
+        try:
+            routes.append(Route(name, get_step_factory(provider)(route_config)))
+        except Exception as e:
+            raise ValueError(f"cascade route {i} ({name}): {str(e)}") from e
+
+    return CascadeStep(
+        prompt=prompt,
+        routes=routes,
+        checks=[
+            build_check(spec, step_config) for spec in llm_config.get("accept", [])
+        ],
+        model=config.get("model", "cascade"),
+        output_key=config.get("output_key", "output"),
+        strict=bool(llm_config.get("strict", False)),
+    )
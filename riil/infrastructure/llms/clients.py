@@ -0,0 +1,83 @@
+# riil/infrastructure/llms/clients.py
+"""
+Process-wide registry of pooled LLM clients.
+Steps that share a base URL, API key and options share one connection pool.
+"""
+
+import importlib.util
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+import openai
+
+# Options accepted under `llm.config.client` in workflow YAML
+DEFAULT_CLIENT_OPTIONS: Dict[str, Any] = {
+    "base_url": None,
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "http2": False,
+    "timeout": 600.0,
+    # HTTP 429s are retried by the per-model scheduler (see ratelimit.py)
+    "max_retries": 0,
+}
+
+_clients: Dict[Tuple[Any, ...], openai.AsyncOpenAI] = {}
+
+
+def validate_client_options(options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Return options merged over the defaults. Raises ValueError on unknown keys."""
+    options = options or {}
+    unknown = set(options) - set(DEFAULT_CLIENT_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown client options: {', '.join(sorted(unknown))}")
+    return {**DEFAULT_CLIENT_OPTIONS, **options}
+
+
+def get_openai_client(api_key: str, **options: Any) -> openai.AsyncOpenAI:
+    """
+    Return the shared AsyncOpenAI client for (api_key, options), creating it
+    on first use. Clients hold live sockets: call `close_clients()` on shutdown.
+    """
+    opts = validate_client_options(options)
+    key = ("openai", api_key, tuple(sorted(opts.items())))
+    client = _clients.get(key)
+    if client is None:
+        client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=opts["base_url"],
+            max_retries=opts["max_retries"],
+            http_client=_build_http_client(opts),
+        )
+        _clients[key] = client
+    return client
+
+
+def _build_http_client(opts: Dict[str, Any]) -> httpx.AsyncClient:
+    if opts["http2"]:
+        if importlib.util.find_spec("h2") is None:
+            raise ImportError(
+                "http2 requires the 'h2' package: pip install 'httpx[http2]'"
+            )
+    return httpx.AsyncClient(
+        http2=opts["http2"],
+        timeout=opts["timeout"],
+        limits=httpx.Limits(
+            max_connections=opts["max_connections"],
+            max_keepalive_connections=opts["max_keepalive_connections"],
+            keepalive_expiry=opts["keepalive_expiry"],
+        ),
+    )
+
+
+def client_count() -> int:
+    """Number of live pooled clients."""
+    return len(_clients)
+
+
+async def close_clients() -> None:
+    """Close every pooled client and release its connections."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.close()
@@ -0,0 +1,75 @@
+# riil/infrastructure/llms/errors.py
+"""
+Provider-neutral LLM errors.
+Providers translate their SDK exceptions into these so the shared request
+layers (rate limiting, retries) can react to them.
+"""
+
+from typing import Mapping, Optional
+
+
+class LLMError(Exception):
+    """Base class for errors raised by LLM steps."""
+
+
+class RateLimitedError(LLMError):
+    """The provider rejected the request for exceeding a quota (HTTP 429)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMTimeoutError(LLMError):
+    """The request (or one attempt of it) took longer than allowed."""
+
+
+class LLMConnectionError(LLMError):
+    """The provider could not be reached."""
+
+
+class LLMServerError(LLMError):
+    """The provider failed with a 5xx response."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SchemaViolationError(LLMError):
+    """The output does not (and can no longer) match the step's output schema."""
+
+
+# Names usable in `llm.config.retry.retry_on`
+RETRYABLE_ERRORS = {
+    "timeout": LLMTimeoutError,
+    "connection": LLMConnectionError,
+    "server_error": LLMServerError,
+    "rate_limit": RateLimitedError,
+}
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Seconds to wait from `retry-after-ms` / `retry-after` headers, if present."""
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            from email.utils import parsedate_to_datetime
+            from datetime import datetime, timezone
+
+            try:
+                delta = parsedate_to_datetime(value) - datetime.now(timezone.utc)
+            except (TypeError, ValueError):
+                return None
+            return max(0.0, delta.total_seconds())
+    return None
@@ -0,0 +1,244 @@
+# riil/infrastructure/llms/fake.py
+"""
+Deterministic fake LLM provider for benchmarks and tests.
+
+Goes through the same request layers as real providers (cache, coalescing,
+retries, scheduler), with a configurable latency distribution, token rate,
+stream chunking and error injection:
+
+    llm:
+      provider: fake
+      config:
+        latency: {distribution: lognormal, mean: 0.8, stddev: 0.3}
+        ttft: 0.2               # streaming: delay before the first chunk (or latency)
+        tokens_per_second: 60   # paces streamed chunks and adds to completion time
+        chunk_tokens: 1
+        response_tokens: 40     # reply length; default echoes the prompt
+        error_rate: 0.01
+        error: server           # server | timeout | connection | rate_limit
+        seed: 0
+
+Every random draw comes from a generator seeded by (seed, request, call
+number), so a run is reproducible whatever order concurrent requests
+happen in.
+"""
+
+import asyncio
+import math
+import random
+from collections import Counter
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Union
+
+from riil.domain.prompt import PromptTemplate
+from riil.domain.types import Inputs, Outputs
+from riil.infrastructure.llms.base import LLM, Completion, Messages
+from riil.infrastructure.llms.cache import validate_cache_options
+from riil.infrastructure.llms.errors import (
+    LLMConnectionError,
+    LLMServerError,
+    LLMTimeoutError,
+    RateLimitedError,
+)
+from riil.infrastructure.llms.ratelimit import validate_rate_limit_options
+from riil.infrastructure.llms.retry import HedgePolicy, RetryPolicy
+
+DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal", "exponential")
+
+# `llm.config` keys of the fake provider; anything else is a request parameter
+FAKE_CONFIG_KEYS = {
+    "latency",
+    "ttft",
+    "tokens_per_second",
+    "chunk_tokens",
+    "response",
+    "response_tokens",
+    "error_rate",
+    "error",
+    "seed",
+    "cache",
+    "coalesce",
+    "rate_limit",
+    "retry",
+    "hedge",
+}
+
+_ERRORS: Dict[str, Callable[[], Exception]] = {
+    "server": lambda: LLMServerError("fake server error", status_code=500),
+    "timeout": lambda: LLMTimeoutError("fake timeout"),
+    "connection": lambda: LLMConnectionError("fake connection error"),
+    "rate_limit": lambda: RateLimitedError("fake rate limit", retry_after=0.0),
+}
+
+
+class LatencyModel:
+    """Seconds per request: a number (constant) or a distribution spec."""
+
+    def __init__(self, spec: Union[None, float, Dict[str, Any]] = None):
+        if spec is None or isinstance(spec, (int, float)):
+            spec = {"distribution": "constant", "mean": float(spec or 0.0)}
+        self.distribution = spec.get("distribution", "constant")
+        if self.distribution not in DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown latency distribution '{self.distribution}'"
+                f" (use {', '.join(DISTRIBUTIONS)})"
+            )
+        self.mean = float(spec.get("mean", 0.0))
+        self.stddev = float(spec.get("stddev", 0.0))
+        self.min = float(spec.get("min", 0.0))
+        self.max = float(spec.get("max", self.mean * 2))
+        if self.mean < 0 or self.stddev < 0:
+            raise ValueError("latency mean and stddev must be >= 0")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.distribution == "constant":
+            value = self.mean
+        elif self.distribution == "uniform":
+            value = rng.uniform(self.min, self.max)
+        elif self.distribution == "normal":
+            value = rng.gauss(self.mean, self.stddev)
+        elif self.distribution == "exponential":
+            value = rng.expovariate(1 / self.mean) if self.mean > 0 else 0.0
+        else:
+            # Parameterized by the mean and stddev of the latency itself
+            if self.mean <= 0:
+                return 0.0
+            sigma2 = math.log1p((self.stddev / self.mean) ** 2)
+            value = rng.lognormvariate(
+                math.log(self.mean) - sigma2 / 2, math.sqrt(sigma2)
+            )
+        return max(0.0, value)
+
+
+class FakeLLMStep(LLM):
+    provider = "fake"
+
+    def __init__(
+        self,
+        prompt: Union[str, PromptTemplate],
+        model: str = "fake",
+        output_key: str = "output",
+        latency: Union[None, float, Dict[str, Any]] = None,
+        ttft: Union[None, float, Dict[str, Any]] = None,
+        tokens_per_second: Optional[float] = None,
+        chunk_tokens: int = 1,
+        response: Optional[str] = None,
+        response_tokens: Optional[int] = None,
+        error_rate: float = 0.0,
+        error: str = "server",
+        seed: int = 0,
+        params: Optional[Dict[str, Any]] = None,
+        cache: Any = None,
+        coalesce: bool = True,
+        rate_limit: Optional[Dict[str, Any]] = None,
+        retry: Optional[Dict[str, Any]] = None,
+        hedge: Any = None,
+        rules: Any = None,
+    ):
+        super().__init__()
+        if not prompt:
+            raise ValueError("prompt is required")
+        if not 0.0 <= error_rate <= 1.0:
+            raise ValueError("error_rate must be between 0 and 1")
+        if error not in _ERRORS:
+            raise ValueError(f"Unknown error '{error}' (use {', '.join(_ERRORS)})")
+        if chunk_tokens < 1:
+            raise ValueError("chunk_tokens must be >= 1")
+        if tokens_per_second is not None and tokens_per_second <= 0:
+            raise ValueError("tokens_per_second must be > 0")
+        self.template = (
+            prompt if isinstance(prompt, PromptTemplate) else PromptTemplate(prompt)
+        )
+        self.prompt = self.template.source
+        self.input_keys = set(self.template.variables)
+        self.model = model
+        self.output_key = output_key
+        self.latency = LatencyModel(latency)
+        self.ttft = LatencyModel(ttft) if ttft is not None else self.latency
+        self.tokens_per_second = tokens_per_second
+        self.chunk_tokens = chunk_tokens
+        self.response = response
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.error = error
+        self.seed = seed
+        self.params = params or {}
+        self.cache_options = validate_cache_options(cache)
+        self.coalesce = coalesce
+        validate_rate_limit_options(rate_limit)
+        self.rate_limit = rate_limit
+        self.retry_policy = RetryPolicy.from_config(retry)
+        self.hedge_policy = HedgePolicy.from_config(hedge)
+        self.rules = rules
+        self._calls: "Counter[str]" = Counter()
+
+    async def run(self, inputs: Inputs) -> Outputs:
+        response = await self.generate(self.prompt_messages(inputs))
+        return {
+            "output": response["content"],
+            "output_key": self.output_key,
+            "cached": response.get("cached", False),
+            "usage": response.get("usage"),
+        }
+
+    async def stream(self, inputs: Inputs) -> AsyncGenerator[str, None]:
+        async for text in self.generate_stream(self.prompt_messages(inputs)):
+            yield text
+
+    async def complete(self, messages: Messages) -> Completion:
+        rng = self._rng(messages)
+        tokens = self._tokens(messages)
+        delay = self.latency.sample(rng)
+        if self.tokens_per_second:
+            delay += len(tokens) / self.tokens_per_second
+        await self._fail_or_wait(rng, delay)
+        return {"content": "".join(tokens), "usage": _usage(messages, tokens)}
+
+    async def complete_stream(self, messages: Messages) -> AsyncGenerator[str, None]:
+        rng = self._rng(messages)
+        tokens = self._tokens(messages)
+        await self._fail_or_wait(rng, self.ttft.sample(rng))
+        for i in range(0, len(tokens), self.chunk_tokens):
+            if i and self.tokens_per_second:
+                await asyncio.sleep(self.chunk_tokens / self.tokens_per_second)
+            yield "".join(tokens[i : i + self.chunk_tokens])
+
+    async def _fail_or_wait(self, rng: random.Random, delay: float) -> None:
+        failing = self.error_rate and rng.random() < self.error_rate
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if failing:
+            raise _ERRORS[self.error]()
+
+    def _rng(self, messages: Messages) -> random.Random:
+        key = self.request_key(messages)
+        self._calls[key] += 1
+        return random.Random(f"{self.seed}:{key}:{self._calls[key]}")
+
+    def _tokens(self, messages: Messages) -> List[str]:
+        if self.response_tokens is not None:
+            words = [f"tok{i}" for i in range(self.response_tokens)]
+        else:
+            words = (self.response or f"echo: {messages[-1]['content']}").split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+
+def _usage(messages: Messages, tokens: List[str]) -> Dict[str, int]:
+    prompt_tokens = sum(len(str(m.get("content") or "").split()) for m in messages)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens)}
+
+
+def create_fake_step(config: Dict[str, Any]) -> FakeLLMStep:
+    """Factory for FakeLLMStep from a workflow step config."""
+    prompt = config.get("template") or config.get("prompt")
+    if not prompt:
+        raise ValueError("Missing 'prompt' in FakeLLMStep config")
+    llm_config = config.get("config", {})
+    options = {k: v for k, v in llm_config.items() if k in FAKE_CONFIG_KEYS}
+    return FakeLLMStep(
+        prompt=prompt,
+        model=config.get("model", "fake"),
+        output_key=config.get("output_key", "output"),
+        params={k: v for k, v in llm_config.items() if k not in FAKE_CONFIG_KEYS},
+        rules=config.get("rules"),
+        **options,
+    )
@@ -1,65 +1,273 @@
 # riil/infrastructure/llms/openai.py
+import hashlib
 import os
-from typing import Dict, Any
-from openai import AsyncOpenAI
-from riil.infrastructure.llms.base import LLM
+from typing import AsyncGenerator, Dict, Any, Hashable, Optional, Type, Union
+
+import openai
+from pydantic import BaseModel
+from riil.infrastructure.llms.base import LLM, Messages, Completion, with_system_message
+from riil.infrastructure.llms.cache import validate_cache_options
+from riil.infrastructure.llms.clients import get_openai_client, validate_client_options
+from riil.infrastructure.llms.errors import (
+    LLMConnectionError,
+    LLMServerError,
+    LLMTimeoutError,
+    RateLimitedError,
+    parse_retry_after,
+)
+from riil.infrastructure.llms.ratelimit import validate_rate_limit_options
+from riil.infrastructure.llms.retry import HedgePolicy, RetryPolicy
+from riil.infrastructure.llms.structured import (
+    model_from_spec,
+    schema_instructions,
+    validate_output,
+)
+from riil.infrastructure.utils.offload import OFFLOAD_MODES
+from riil.domain.step import StepField
+from riil.domain.prompt import PromptTemplate
 from riil.domain.types import Inputs, Outputs
 
+# `llm.config` keys handled by riil; everything else is sent as a request parameter
+RESERVED_CONFIG_KEYS = {"client", "cache", "coalesce", "rate_limit", "retry", "hedge"}
+
 
 class OpenAIStep(LLM):
+    provider = "openai"
+
     def __init__(
         self,
-        prompt: str,
+        prompt: Union[str, PromptTemplate],
         model: str = "gpt-3.5-turbo",
-        output_key: str = "output"
+        output_key: str = "output",
+        client_options: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        cache: Any = None,
+        coalesce: bool = True,
+        rate_limit: Optional[Dict[str, Any]] = None,
+        retry: Optional[Dict[str, Any]] = None,
+        hedge: Any = None,
+        output_schema: Optional[Type[BaseModel]] = None,
+        max_retries: int = 2,
+        max_output_chars: Optional[int] = None,
+        rules: Any = None,
+        offload: Optional[str] = None,
     ):
+        super().__init__()
         if not prompt:
             raise ValueError("prompt is required")
-        self.prompt = prompt
+        self.template = (
+            prompt if isinstance(prompt, PromptTemplate) else PromptTemplate(prompt)
+        )
+        self.prompt = self.template.source
+        self.input_keys = set(self.template.variables)
         self.model = model
         self.output_key = output_key
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
             raise EnvironmentError("OPENAI_API_KEY not set")
-        self.client = AsyncOpenAI(api_key=self.api_key)
+        self.api_key = api_key
+        validate_client_options(client_options)
+        self.client_options = client_options or {}
+        self.params = params or {}
+        self.cache_options = validate_cache_options(cache)
+        self.coalesce = coalesce
+        validate_rate_limit_options(rate_limit)
+        self.rate_limit = rate_limit
+        self.retry_policy = RetryPolicy.from_config(retry)
+        self.hedge_policy = HedgePolicy.from_config(hedge)
+        if max_retries < 0:
+            raise ValueError("max_retries must be >= 0")
+        self.output_schema = output_schema
+        self.max_retries = max_retries
+        self.max_output_chars = max_output_chars
+        self.rules = rules
+        if offload is not None and offload not in OFFLOAD_MODES:
+            raise ValueError(f"offload must be one of {', '.join(OFFLOAD_MODES)}")
+        self.offload = offload
+        self._client: Optional[openai.AsyncOpenAI] = None
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        """Shared pooled client, resolved once; see riil.infrastructure.llms.clients."""
+        client = self._client
+        if client is None or client.is_closed():
+            # Resolved again after close_clients() shut the pool down
+            client = self._client = get_openai_client(
+                self.api_key, **self.client_options
+            )
+        return client
+
+    @property
+    def endpoint(self) -> str:
+        return self.client_options.get("base_url") or ""
+
+    @property
+    def scheduler_key(self) -> Hashable:
+        # Quotas are per API key; keep only a fingerprint of it
+        key_id = hashlib.sha256(self.api_key.encode("utf-8")).hexdigest()[:12]
+        return (self.provider, self.endpoint, self.model, key_id)
 
     async def run(self, inputs: Inputs) -> Outputs:
-        try:
-            # ✅ Safe formatting
-            formatted_prompt = self.prompt.format(**inputs)
-        except KeyError as e:
-            raise ValueError(f"Missing input for prompt: {e}")
-        except Exception as e:
-            raise ValueError(f"Failed to format prompt: {str(e)}")
-
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": formatted_prompt}]
+        # ✅ Safe formatting
+        messages = self.prompt_messages(inputs)
+
+        schema = self.output_schema
+        if schema is not None:
+            async for item in self._generate_structured(messages, schema):
+                result = item
+            return {
+                "output": result["output"],
+                "output_key": self.output_key,
+                "cached": False,
+                "usage": None,
+                "repaired": result["repaired"],
+                "attempts": result["attempts"],
+            }
+
+        response = await self.generate(messages)
+        return {
+            "output": response["content"],
+            "output_key": self.output_key,
+            "cached": response.get("cached", False),
+            "usage": response.get("usage"),
+        }
+
+    async def stream(self, inputs: Inputs) -> AsyncGenerator[Any, None]:
+        """Yield tokens; with an output schema, validated fields and then the output."""
+        messages = self.prompt_messages(inputs)
+        schema = self.output_schema
+        if schema is not None:
+            async for item in self._generate_structured(messages, schema):
+                yield item if isinstance(item, StepField) else item["output"]
+            return
+        async for text in self.generate_stream(messages):
+            yield text
+
+    def batch_request(self, inputs: Inputs) -> Dict[str, Any]:
+        messages = self.prompt_messages(inputs)
+        if self.output_schema is not None:
+            messages = with_system_message(
+                messages, schema_instructions(self.output_schema)
+            )
+        return {
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": self.model, "messages": messages, **self.params},
+        }
+
+    def batch_output(self, body: Dict[str, Any]) -> Any:
+        content = body["choices"][0]["message"]["content"]
+        if self.output_schema is None:
+            return content
+        # Offline there is no retry: a violation fails the record
+        return validate_output(self.output_schema, content, self.max_output_chars)
+
+    def _generate_structured(
+        self, messages: Messages, schema: Type[BaseModel]
+    ) -> AsyncGenerator[Any, None]:
+        return self.generate_structured(
+            messages, schema, self.max_retries, self.max_output_chars
         )
-        content = response.choices[0].message.content
+
+    async def _create(self, messages: Messages, **options: Any) -> Any:
+        # Messages are plain dicts; the SDK's overloads want its TypedDicts
+        create: Any = self.client.chat.completions.create
+        return await create(
+            model=self.model, messages=messages, **options, **self.params
+        )
+
+    async def complete_stream(self, messages: Messages) -> AsyncGenerator[str, None]:
+        try:
+            stream = await self._create(messages, stream=True)
+        except _TRANSLATED_ERRORS as e:
+            raise _translate_error(e) from e
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except _TRANSLATED_ERRORS as e:
+            raise _translate_error(e) from e
+        finally:
+            # Frees the connection when the consumer stops early
+            await stream.close()
+
+    async def complete(self, messages: Messages) -> Completion:
+        try:
+            response = await self._create(messages)
+        except _TRANSLATED_ERRORS as e:
+            raise _translate_error(e) from e
         return {
-            "output": content,
-            "output_key": self.output_key
+            "content": response.choices[0].message.content,
+            "usage": _usage(response),
         }
 
 
+# SDK exceptions that have a provider-neutral equivalent in errors.py
+_TRANSLATED_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def _translate_error(error: "openai.OpenAIError") -> Exception:
+    if isinstance(error, openai.RateLimitError):
+        return _rate_limited(error)
+    # APITimeoutError subclasses APIConnectionError
+    if isinstance(error, openai.APITimeoutError):
+        return LLMTimeoutError(str(error))
+    if isinstance(error, openai.APIConnectionError):
+        return LLMConnectionError(str(error))
+    if isinstance(error, openai.APIStatusError):
+        return LLMServerError(str(error), status_code=error.status_code)
+    return LLMServerError(str(error))
+
+
+def _rate_limited(error: "openai.RateLimitError") -> RateLimitedError:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    return RateLimitedError(str(error), retry_after=parse_retry_after(headers))
+
+
+def _usage(response: Any) -> Optional[Dict[str, int]]:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    return {
+        "prompt_tokens": int(getattr(usage, "prompt_tokens", 0) or 0),
+        "completion_tokens": int(getattr(usage, "completion_tokens", 0) or 0),
+    }
+
+
 # ✅ Factory function — must use config["prompt"]
-def create_openai_step(config: dict) -> OpenAIStep:
+def create_openai_step(config: Dict[str, Any]) -> OpenAIStep:
     """
     Factory for OpenAIStep from config.
-    Called by resolver.
+    Called by resolver. Uses the pre-parsed `template` when the loader provides one.
     """
-    prompt = config.get("prompt")
+    prompt = config.get("template") or config.get("prompt")
     if not prompt:
         raise ValueError("Missing 'prompt' in OpenAIStep config")
 
+    llm_config = config.get("config", {})
+    output_schema = config.get("output_schema")
+    if isinstance(output_schema, dict):
+        output_schema = model_from_spec(
+            f"{config.get('output_key', 'output')}_schema", output_schema
+        )
     return OpenAIStep(
         prompt=prompt,
         model=config.get("model", "gpt-3.5-turbo"),
-        output_key=config.get("output_key", "output")
+        output_key=config.get("output_key", "output"),
+        client_options=llm_config.get("client"),
+        params={k: v for k, v in llm_config.items() if k not in RESERVED_CONFIG_KEYS},
+        cache=llm_config.get("cache"),
+        coalesce=llm_config.get("coalesce", True),
+        rate_limit=llm_config.get("rate_limit"),
+        retry=llm_config.get("retry"),
+        hedge=llm_config.get("hedge"),
+        output_schema=output_schema,
+        max_retries=config.get("max_retries", 2),
+        max_output_chars=config.get("max_output_chars"),
+        rules=config.get("rules"),
+        offload=config.get("offload"),
     )
-
-
-# ✅ Register it
-from riil.infrastructure.llms.resolver import register_step_type
-register_step_type("openai", create_openai_step)
\ No newline at end of file
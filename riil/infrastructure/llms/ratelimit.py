@@ -0,0 +1,238 @@
+# riil/infrastructure/llms/ratelimit.py
+"""
+Per-model request scheduling shared by every workflow in the process.
+
+Each (provider, endpoint, model, key) gets one ModelScheduler that enforces
+requests-per-minute and tokens-per-minute budgets with token buckets, and an
+adaptive concurrency limit: halved on HTTP 429, grown back slowly on success
+(AIMD), so throughput settles just under the quota instead of oscillating.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional
+
+# Options accepted under `llm.config.rate_limit` in workflow YAML
+DEFAULT_RATE_LIMIT_OPTIONS: Dict[str, Any] = {
+    "rpm": None,  # requests per minute
+    "tpm": None,  # tokens per minute (prompt + completion)
+    "burst_seconds": 1.0,  # bucket capacity, in seconds of budget
+    # Starting/maximum in-flight requests; None = adaptive only
+    "max_concurrency": None,
+    "max_retries": 3,  # retries after HTTP 429
+}
+
+# Rough completion size when the request does not set max_tokens
+DEFAULT_COMPLETION_ESTIMATE = 256
+
+_schedulers: Dict[Hashable, "ModelScheduler"] = {}
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], params: Dict[str, Any]) -> int:
+    """Cheap pre-flight estimate: ~4 characters per prompt token plus the completion."""
+    chars = sum(len(str(m.get("content") or "")) for m in messages)
+    completion = (
+        params.get("max_tokens")
+        or params.get("max_completion_tokens")
+        or DEFAULT_COMPLETION_ESTIMATE
+    )
+    return chars // 4 + 4 * len(messages) + int(completion)
+
+
+class TokenBucket:
+    """
+    Reservation-style token bucket: `reserve()` takes tokens immediately
+    (going negative if needed) and returns how long the caller must wait.
+    Waiters are therefore served in arrival order without a lock.
+    """
+
+    def __init__(
+        self,
+        per_minute: float,
+        burst_seconds: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.scale = 1.0
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate * self.scale
+        )
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        self._refill()
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / (self.rate * self.scale)
+
+    def refund(self, amount: float) -> None:
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ModelScheduler:
+    def __init__(
+        self,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        burst_seconds: float = 1.0,
+        max_concurrency: Optional[int] = None,
+        max_retries: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.requests = TokenBucket(rpm, burst_seconds, clock) if rpm else None
+        self.tokens = TokenBucket(tpm, burst_seconds, clock) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.clock = clock
+        self.limit: Optional[float] = (
+            float(max_concurrency) if max_concurrency else None
+        )
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self._throttle_streak = 0
+        self._waiters: "Deque[asyncio.Future[None]]" = deque()
+        # Counters
+        self.sent = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        """Wait for a concurrency slot, the cooldown and both budgets."""
+        while self.limit is not None and self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._wake()
+                raise
+        self.in_flight += 1
+
+        delay = self.cooldown_until - self.clock()
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(estimated_tokens))
+        if delay > 0:
+            self.waited += delay
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.release(estimated_tokens, actual_tokens=0, succeeded=False)
+                raise
+        self.sent += 1
+
+    def release(
+        self,
+        estimated_tokens: int,
+        actual_tokens: Optional[int] = None,
+        succeeded: bool = True,
+        throttled: bool = False,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        """Return the slot; reconcile the token estimate and adapt to the outcome."""
+        self.in_flight -= 1
+        if self.tokens is not None and actual_tokens is not None:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+        if throttled:
+            self._on_throttled(retry_after)
+        elif succeeded:
+            self._on_success()
+        self._wake()
+
+    def _on_throttled(self, retry_after: Optional[float]) -> None:
+        self.throttled += 1
+        self._throttle_streak += 1
+        if retry_after is None:
+            retry_after = min(60.0, 0.5 * 2 ** (self._throttle_streak - 1)) * (
+                0.5 + random.random() / 2
+            )
+        self.cooldown_until = max(self.cooldown_until, self.clock() + retry_after)
+        # Multiplicative decrease of both concurrency and bucket rates
+        current = self.limit if self.limit is not None else self.in_flight + 1
+        self.limit = max(1.0, current / 2)
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.scale = max(0.1, bucket.scale * 0.75)
+
+    def _on_success(self) -> None:
+        self._throttle_streak = 0
+        # Additive increase: about +1 slot per window of successful requests
+        if self.limit is not None:
+            ceiling = self.max_concurrency or float("inf")
+            self.limit = min(ceiling, self.limit + 1 / self.limit)
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None and bucket.scale < 1.0:
+                bucket.scale = min(1.0, bucket.scale + 0.01)
+
+    def _wake(self) -> None:
+        if self.limit is None:
+            free = len(self._waiters)
+        else:
+            free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sent": self.sent,
+            "throttled": self.throttled,
+            "waited_seconds": round(self.waited, 3),
+            "in_flight": self.in_flight,
+            "concurrency_limit": self.limit,
+        }
+
+
+def validate_rate_limit_options(options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Return options merged over the defaults. Raises ValueError on unknown keys."""
+    options = options or {}
+    unknown = set(options) - set(DEFAULT_RATE_LIMIT_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown rate_limit options: {', '.join(sorted(unknown))}")
+    return {**DEFAULT_RATE_LIMIT_OPTIONS, **options}
+
+
+def get_scheduler(
+    key: Hashable, options: Optional[Dict[str, Any]] = None
+) -> ModelScheduler:
+    """
+    Shared scheduler for `key`. Options apply when it is first created, so
+    every step using the same model and key sees the same budgets.
+    """
+    scheduler = _schedulers.get(key)
+    if scheduler is None:
+        scheduler = _schedulers[key] = ModelScheduler(
+            **validate_rate_limit_options(options)
+        )
+    return scheduler
+
+
+def key_label(key: Hashable) -> str:
+    """A scheduler key (provider, endpoint, model, ...) as one readable string."""
+    if isinstance(key, tuple):
+        return "/".join(str(part) for part in key)
+    return str(key)
+
+
+def scheduler_stats() -> Dict[str, Dict[str, Any]]:
+    return {key_label(key): s.stats() for key, s in _schedulers.items()}
+
+
+def reset_schedulers() -> None:
+    _schedulers.clear()
@@ -1,21 +1,54 @@
 # eko/infrastructure/llms/resolver.py
 """
 Registry for dynamic step resolution.
+
+Providers are found by name, in this order: factories registered with
+`register_step_type`, the built-in table below, then `riil.providers` entry
+points. A provider's module is only imported when a workflow uses it.
 """
 
-from typing import Callable, Dict
+from typing import Any, Callable, Dict, List, Optional
 from riil.domain.step import Step
+from riil.infrastructure.utils.plugins import find_plugin, plugin_names
+
+PROVIDER_ENTRY_POINTS = "riil.providers"
+
+BUILTIN_PROVIDERS: Dict[str, str] = {
+    "openai": "riil.infrastructure.llms.openai:create_openai_step",
+    "fake": "riil.infrastructure.llms.fake:create_fake_step",
+    "cascade": "riil.infrastructure.llms.cascade:create_cascade_step",
+}
 
-_step_factories: Dict[str, Callable] = {}
+StepFactory = Callable[[Dict[str, Any]], Step]
 
+_step_factories: Dict[str, StepFactory] = {}
 
-def register_step_type(name: str, factory: Callable):
+
+def register_step_type(name: str, factory: StepFactory) -> None:
     """Register a step factory."""
     _step_factories[name] = factory
 
 
-def resolve_step(provider: str, config: dict) -> Step:
-    """Resolve provider to step."""
+def get_step_factory(provider: str) -> StepFactory:
+    """Return the factory for a provider, importing it on first use."""
     if provider not in _step_factories:
-        raise ValueError(f"Unknown provider: {provider}")
-    return _step_factories[provider](config)
\ No newline at end of file
+        factory: Optional[StepFactory] = find_plugin(
+            PROVIDER_ENTRY_POINTS, provider, BUILTIN_PROVIDERS
+        )
+        if factory is None:
+            raise ValueError(f"Unknown provider: {provider}")
+        _step_factories[provider] = factory
+    return _step_factories[provider]
+
+
+def available_providers() -> List[str]:
+    """Names of every registered, built-in and installed provider."""
+    return sorted(
+        set(_step_factories)
+        | set(plugin_names(PROVIDER_ENTRY_POINTS, BUILTIN_PROVIDERS))
+    )
+
+
+def resolve_step(provider: str, config: Dict[str, Any]) -> Step:
+    """Resolve provider to step."""
+    return get_step_factory(provider)(config)
@@ -0,0 +1,169 @@
+# riil/infrastructure/llms/retry.py
+"""
+Retry policies and hedged requests for LLM calls.
+
+Retries use exponential backoff with full jitter and an optional per-attempt
+timeout. Hedging sends a duplicate request once an attempt has been running
+longer than a latency percentile observed for the same model; whichever
+finishes first wins and the other is cancelled.
+"""
+
+import bisect
+import random
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, List, Optional, Tuple, Type
+
+from riil.infrastructure.llms.errors import RETRYABLE_ERRORS
+from riil.infrastructure.llms.ratelimit import key_label
+
+# Options accepted under `llm.config.retry` in workflow YAML
+DEFAULT_RETRY_OPTIONS: Dict[str, Any] = {
+    "max_attempts": 3,
+    "base_delay": 0.5,
+    "max_delay": 20.0,
+    "attempt_timeout": None,  # seconds per attempt; None relies on the client timeout
+    "retry_on": ["timeout", "connection", "server_error"],
+}
+
+# Options accepted under `llm.config.hedge`
+DEFAULT_HEDGE_OPTIONS: Dict[str, Any] = {
+    "percentile": 95,  # hedge once an attempt is slower than this
+    "min_samples": 20,  # latencies needed before hedging starts
+    "min_delay": 0.05,  # never hedge earlier than this (seconds)
+}
+
+LATENCY_WINDOW = 500
+
+_trackers: Dict[Hashable, "LatencyTracker"] = {}
+_hedges: Dict[Hashable, Dict[str, int]] = {}
+
+
+def _validate(name: str, options: Any, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    if options is None:
+        options = {}
+    if not isinstance(options, dict):
+        raise ValueError(f"{name} must be a mapping, got {type(options).__name__}")
+    unknown = set(options) - set(defaults)
+    if unknown:
+        raise ValueError(f"Unknown {name} options: {', '.join(sorted(unknown))}")
+    return {**defaults, **options}
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        attempt_timeout: Optional[float] = None,
+        retry_on: Optional[List[str]] = None,
+    ):
+        if max_attempts < 1:
+            raise ValueError("retry.max_attempts must be >= 1")
+        retry_on = DEFAULT_RETRY_OPTIONS["retry_on"] if retry_on is None else retry_on
+        unknown = set(retry_on) - set(RETRYABLE_ERRORS)
+        if unknown:
+            raise ValueError(f"Unknown retry_on errors: {', '.join(sorted(unknown))}")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self.retryable: Tuple[Type[BaseException], ...] = tuple(
+            RETRYABLE_ERRORS[n] for n in retry_on
+        )
+
+    @classmethod
+    def from_config(cls, options: Any) -> Optional["RetryPolicy"]:
+        """`retry: true` uses the defaults; absent or false makes a single attempt."""
+        if options is None or options is False:
+            return None
+        return cls(
+            **_validate(
+                "retry", {} if options is True else options, DEFAULT_RETRY_OPTIONS
+            )
+        )
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        """`attempt` is the 1-based number of the attempt that just failed."""
+        return attempt < self.max_attempts and isinstance(error, self.retryable)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff after the given failed attempt."""
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        )
+
+
+class HedgePolicy:
+    def __init__(
+        self, percentile: float = 95, min_samples: int = 20, min_delay: float = 0.05
+    ):
+        if not 0 < percentile < 100:
+            raise ValueError("hedge.percentile must be between 0 and 100")
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+
+    @classmethod
+    def from_config(cls, options: Any) -> Optional["HedgePolicy"]:
+        """`hedge: true` uses the defaults; absent or false disables hedging."""
+        if not options:
+            return None
+        return cls(
+            **_validate(
+                "hedge", {} if options is True else options, DEFAULT_HEDGE_OPTIONS
+            )
+        )
+
+    def delay(self, tracker: "LatencyTracker") -> Optional[float]:
+        """Seconds to wait before hedging, or None while there is too little data."""
+        if len(tracker) < self.min_samples:
+            return None
+        return max(self.min_delay, tracker.percentile(self.percentile))
+
+
+class LatencyTracker:
+    """Sliding window of recent successful request latencies for one model."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._sorted: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        if len(self._samples) == self._samples.maxlen:
+            old = self._samples[0]
+            del self._sorted[bisect.bisect_left(self._sorted, old)]
+        self._samples.append(seconds)
+        bisect.insort(self._sorted, seconds)
+
+    def percentile(self, p: float) -> float:
+        if not self._sorted:
+            return 0.0
+        index = min(len(self._sorted) - 1, int(len(self._sorted) * p / 100))
+        return self._sorted[index]
+
+
+def get_latency_tracker(key: Hashable) -> LatencyTracker:
+    tracker = _trackers.get(key)
+    if tracker is None:
+        tracker = _trackers[key] = LatencyTracker()
+    return tracker
+
+
+def hedge_counters(key: Hashable) -> Dict[str, int]:
+    counters = _hedges.get(key)
+    if counters is None:
+        counters = _hedges[key] = {"issued": 0, "won": 0}
+    return counters
+
+
+def hedge_stats() -> Dict[str, Dict[str, int]]:
+    return {key_label(key): dict(c) for key, c in _hedges.items()}
+
+
+def reset_latency_stats() -> None:
+    _trackers.clear()
+    _hedges.clear()
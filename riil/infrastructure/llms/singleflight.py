@@ -0,0 +1,68 @@
+# riil/infrastructure/llms/singleflight.py
+"""
+Coalesce identical in-flight LLM requests: concurrent callers with the same
+key share the first caller's request instead of sending their own.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Call:
+    def __init__(self, task: "asyncio.Future[Any]") -> None:
+        self.task = task
+        self.waiters = 0
+        self.cancelling = False
+
+
+class SingleFlight:
+    """
+    `do(key, fn)` runs `fn()` once per key at a time; everyone who asks for the
+    same key while it runs awaits that result or exception. A waiter being
+    cancelled only cancels the shared request when nobody else is waiting.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, _Call] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is not None and (call.cancelling or call.task.done()):
+            # Finished or being torn down; its done-callback may not have run yet
+            call = None
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finish(key, call))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Forget it now: cancellation cleanup may take a while, and
+                # a new caller must not join a dying call
+                call.cancelling = True
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
+
+    def _finish(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark the error as retrieved even if every waiter went away
+        if not call.task.cancelled():
+            call.task.exception()
+
+
+# Shared by every LLM step in the process
+default_flight = SingleFlight()
@@ -0,0 +1,235 @@
+# riil/infrastructure/llms/structured.py
+"""
+Incremental validation of streamed JSON against a pydantic model.
+
+StreamingValidator feeds the completion through the repairing parser and
+checks every top-level field as soon as it is complete. It raises
+SchemaViolationError only when the final validation is certain to fail:
+a value of the wrong type, a key the model forbids, or output that runs
+past a length cap. That lets the caller cancel the request early.
+"""
+
+import functools
+import json
+from typing import Annotated, Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import (
+    BaseModel,
+    PydanticUserError,
+    TypeAdapter,
+    ValidationError,
+    create_model,
+)
+from pydantic_core import ErrorDetails
+
+from riil.infrastructure.llms.errors import SchemaViolationError
+from riil.infrastructure.utils.json_repair import Event, JSONRepairParser
+
+# Type names accepted by `output_schema` mappings in workflow YAML
+SCHEMA_TYPES: Dict[str, Any] = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": bool,
+    "list": list,
+    "dict": dict,
+    "any": Any,
+}
+
+
+def model_from_spec(name: str, spec: Dict[str, str]) -> Type[BaseModel]:
+    """
+    Build a model from a `{field: type}` mapping, e.g. `{"joke": "str",
+    "rating": "int?"}`; a trailing `?` makes the field optional.
+    """
+    fields: Dict[str, Any] = {}
+    for field, type_name in spec.items():
+        optional = str(type_name).endswith("?")
+        base = str(type_name).rstrip("?")
+        if base not in SCHEMA_TYPES:
+            raise ValueError(f"Unknown type '{type_name}' for output field '{field}'")
+        annotation = SCHEMA_TYPES[base]
+        fields[field] = (Optional[annotation], None) if optional else (annotation, ...)
+    model: Type[BaseModel] = create_model(name, **fields)
+    # Models built at runtime cannot be pickled; worker processes rebuild them from this
+    setattr(model, "__riil_spec__", (name, dict(spec)))
+    return model
+
+
+def portable_schema(schema: Type[BaseModel]) -> Any:
+    """`schema` in a form that can be sent to a worker process; see validate_value."""
+    return getattr(schema, "__riil_spec__", schema)
+
+
+def validate_value(schema: Any, value: Any) -> Dict[str, Any]:
+    """
+    Validate a parsed JSON value and dump it; raises SchemaViolationError.
+    Takes a model or its `portable_schema()`, so it can run in a worker process.
+    """
+    if isinstance(schema, tuple):
+        schema = _spec_model(schema[0], tuple(schema[1].items()))
+    try:
+        validated: Dict[str, Any] = schema.model_validate(value).model_dump()
+    except ValidationError as e:
+        raise SchemaViolationError(_describe(e)) from None
+    return validated
+
+
+@functools.lru_cache(maxsize=64)
+def _spec_model(name: str, spec: Tuple[Tuple[str, str], ...]) -> Type[BaseModel]:
+    return model_from_spec(name, dict(spec))
+
+
+def schema_instructions(schema: Type[BaseModel]) -> str:
+    return (
+        "Respond with a single JSON object matching this JSON schema,"
+        " and nothing else:\n"
+        + json.dumps(schema.model_json_schema(), separators=(",", ":"))
+    )
+
+
+def validate_output(
+    schema: Type[BaseModel], text: str, max_chars: Optional[int] = None
+) -> Dict[str, Any]:
+    """Validate a complete reply; raises SchemaViolationError."""
+    validator = StreamingValidator(schema, max_chars)
+    validator.feed(text)
+    return validator.finish().model_dump()
+
+
+class StreamingValidator:
+    def __init__(self, schema: Type[BaseModel], max_chars: Optional[int] = None):
+        self.schema = schema
+        self.max_chars = max_chars
+        self.parser = JSONRepairParser(self._on_event)
+        # Validated top-level fields not yet collected by the caller
+        self.completed: List[Tuple[str, Any]] = []
+        self._chunks: List[str] = []
+
+        config = schema.model_config
+        self._forbid_extra = config.get("extra") == "forbid"
+        self._fields: Dict[str, str] = {}
+        for name, info in schema.model_fields.items():
+            alias = (
+                info.validation_alias
+                if isinstance(info.validation_alias, str)
+                else info.alias
+            )
+            self._fields[alias or name] = name
+            if not alias or config.get("populate_by_name"):
+                self._fields[name] = name
+
+        # Custom validators may accept what a field's type alone would not
+        decorators = schema.__pydantic_decorators__
+        self._checked = set(schema.model_fields)
+        if any(
+            d.info.mode in ("before", "wrap")
+            for d in decorators.model_validators.values()
+        ):
+            self._checked = set()
+        for d in decorators.field_validators.values():
+            self._checked -= set(
+                schema.model_fields if "*" in d.info.fields else d.info.fields
+            )
+        self._adapters: Dict[str, "TypeAdapter[Any]"] = {}
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> None:
+        self._chunks.append(chunk)
+        if self.parser.done:
+            return
+        self.parser.feed(chunk)
+        if (
+            self.max_chars
+            and not self.parser.done
+            and self.parser.consumed > self.max_chars
+        ):
+            raise SchemaViolationError(
+                f"Output exceeded {self.max_chars} characters without completing"
+            )
+
+    def close(self) -> Any:
+        """Close the input and return the parsed value, not yet validated."""
+        try:
+            return self.parser.close()
+        except ValueError:
+            raise SchemaViolationError("No JSON object in the output") from None
+
+    def finish(self) -> BaseModel:
+        """Close the input and validate the whole object."""
+        value = self.close()
+        try:
+            return self.schema.model_validate(value)
+        except ValidationError as e:
+            raise SchemaViolationError(_describe(e)) from e
+
+    def _on_event(self, event: Event) -> None:
+        kind, path = event[0], event[1]
+        if not path:
+            if kind == "open" and event[2] != "object":
+                raise SchemaViolationError("Expected a JSON object, got an array")
+            return
+        if len(path) != 1:
+            return
+        key = path[0]
+        name = self._fields.get(key)
+        if name is None:
+            if kind == "key" and self._forbid_extra:
+                raise SchemaViolationError(f"Unknown field '{key}'")
+            return
+        if name not in self._checked:
+            if kind == "value":
+                self.completed.append((name, event[2]))
+            return
+        if kind == "open":
+            # An empty container rejected on type alone can never become valid
+            empty: Any = {} if event[2] == "object" else []
+            errors = self._errors(name, empty)
+            if errors and all(_is_type_error(e) for e in errors):
+                raise SchemaViolationError(f"Field '{name}' cannot be an {event[2]}")
+        elif kind == "value":
+            errors = self._errors(name, event[2])
+            if errors:
+                raise SchemaViolationError(f"Field '{name}': {errors[0]['msg']}")
+            self.completed.append((name, event[2]))
+
+    def _errors(self, name: str, value: Any) -> List[ErrorDetails]:
+        adapter = self._adapters.get(name)
+        if adapter is None:
+            adapter = self._adapters[name] = _field_adapter(self.schema, name)
+        try:
+            adapter.validate_python(value)
+        except ValidationError as e:
+            return e.errors()
+        return []
+
+
+def _field_adapter(schema: Type[BaseModel], name: str) -> "TypeAdapter[Any]":
+    """
+    Validator for one field under the model's config (strict, coercions...),
+    so a field is never rejected early that the whole model would accept.
+    """
+    info = schema.model_fields[name]
+    annotation: Any = info.annotation
+    if info.metadata:
+        annotation = Annotated[(annotation, *info.metadata)]
+    try:
+        return TypeAdapter(annotation, config=schema.model_config)
+    except PydanticUserError:
+        # Nested models, dataclasses and TypedDicts validate by their own config
+        return TypeAdapter(annotation)
+
+
+def _is_type_error(error: ErrorDetails) -> bool:
+    kind = error["type"]
+    return kind.endswith("_type") or kind == "none_required"
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in e['loc']) or 'output'}: {e['msg']}"
+        for e in error.errors()
+    )
@@ -0,0 +1,206 @@
+# riil/infrastructure/rules/loader.py
+"""
+Rules: reusable instructions (role, tone, format...) kept as Markdown files
+under `config/rules/` and referenced by name from a step's `rules:` list.
+
+The directory is `$RIIL_RULES_DIR` when set. Otherwise it is the
+`config/rules/` of the nearest ancestor of the workflow file that has one,
+so a workflow compiles the same from any working directory.
+
+A rule file starts with `key: value` lines and may continue with free text:
+
+    # funny.md
+    name: funny
+    role: stand-up comedian
+    tone: playful
+
+    Keep it short. No puns about the user's name.
+
+A step's rules are rendered into one system message placed before its
+prompt. The text depends only on the rule files, so every request of the
+step starts with the same bytes and providers can reuse their prompt cache
+for that prefix. Files are read once into a RuleIndex, which re-reads only
+the files whose mtime or size changed, at most every `check_interval`
+seconds; rendered prefixes are memoized until a file changes.
+"""
+
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_RULES_DIR = Path("config/rules")
+
+_FIELD = re.compile(r"^([A-Za-z_][\w-]*):\s*(.*)$")
+
+_indexes: Dict[str, "RuleIndex"] = {}
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    fields: Tuple[Tuple[str, str], ...]
+    body: str
+
+    def render(self) -> str:
+        lines = [
+            f"{key.capitalize()}: {value}"
+            for key, value in self.fields
+            if key != "name"
+        ]
+        if self.body:
+            lines.append(self.body)
+        return "\n".join(lines)
+
+
+def parse_rule(text: str, default_name: str) -> Rule:
+    """Parse a rule file: leading `key: value` lines, then an optional body."""
+    lines = text.replace("\r\n", "\n").lstrip("\ufeff").split("\n")
+    fields: List[Tuple[str, str]] = []
+    i = 0
+    while i < len(lines):
+        line = lines[i].rstrip()
+        match = _FIELD.match(line)
+        if match:
+            fields.append((match.group(1).lower(), match.group(2).strip()))
+        elif line and not (line.startswith("#") and not fields):
+            # Comments are only skipped above the fields, e.g. the `# name.md` title
+            break
+        i += 1
+    body = "\n".join(l.rstrip() for l in lines[i:]).strip()
+    name = dict(fields).get("name") or default_name
+    return Rule(name, tuple(fields), body)
+
+
+class RuleIndex:
+    """In-memory index of the rules in a directory, invalidated by file changes."""
+
+    def __init__(self, root: Path, check_interval: float = 1.0):
+        self.root = Path(root)
+        self.check_interval = check_interval
+        # Bumped whenever a rule file is added, changed or removed
+        self.version = 0
+        self._rules: Dict[str, Rule] = {}
+        self._by_name: Dict[str, Rule] = {}
+        self._files: Dict[str, Tuple[int, int]] = {}
+        self._rendered: Dict[Tuple[str, ...], str] = {}
+        self._checked: Optional[float] = None
+
+    def refresh(self, force: bool = False) -> int:
+        """Re-read changed files once `check_interval` is up; return the version."""
+        now = time.monotonic()
+        if (
+            not force
+            and self._checked is not None
+            and now - self._checked < self.check_interval
+        ):
+            return self.version
+        self._checked = now
+
+        seen = {}
+        changed = False
+        if self.root.is_dir():
+            for entry in os.scandir(self.root):
+                if not entry.name.endswith(".md") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                previous = self._files.get(entry.path)
+                if previous == (stat.st_mtime_ns, stat.st_size):
+                    seen[entry.path] = previous
+                    continue
+                text = Path(entry.path).read_text(encoding="utf-8")
+                self._rules[entry.path] = parse_rule(text, entry.name[:-3])
+                seen[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                changed = True
+        for path in set(self._files) - set(seen):
+            del self._rules[path]
+            changed = True
+        self._files = seen
+        if changed:
+            self.version += 1
+            self._rendered.clear()
+            # On a duplicate name the first file in path order wins
+            self._by_name = {}
+            for path in sorted(self._rules):
+                self._by_name.setdefault(self._rules[path].name, self._rules[path])
+        return self.version
+
+    def names(self) -> List[str]:
+        self.refresh()
+        return sorted(self._by_name)
+
+    def get(self, name: str) -> Rule:
+        self.refresh()
+        rule = self._by_name.get(name)
+        if rule is None:
+            raise ValueError(f"Unknown rule: {name} (looked in {self.root})")
+        return rule
+
+    def render(self, names: Sequence[str]) -> str:
+        """The rules' text, in the order given, memoized until a rule file changes."""
+        self.refresh()
+        key = tuple(dict.fromkeys(names))
+        text = self._rendered.get(key)
+        if text is None:
+            text = "\n\n".join(self.get(name).render() for name in key)
+            self._rendered[key] = text
+        return text
+
+
+class RulePrefix:
+    """
+    The system message for one step's rules. Compiled once per workflow
+    step and shared by every instance of it, so rendering happens once per
+    (rule set, step) until a rule file changes.
+    """
+
+    def __init__(self, index: RuleIndex, names: Sequence[str]):
+        self.index = index
+        self.names = tuple(names)
+        self._version = -1
+        self._text = ""
+        # Fail at compile time on a misspelled rule
+        self.text()
+
+    def text(self) -> str:
+        version = self.index.refresh()
+        if version != self._version:
+            self._text = self.index.render(self.names)
+            self._version = version
+        return self._text
+
+    def message(self) -> Dict[str, str]:
+        return {"role": "system", "content": self.text()}
+
+
+def rules_dir(source: Optional[Path] = None) -> Path:
+    """
+    Where rules are read from: $RIIL_RULES_DIR, else config/rules under the
+    nearest ancestor of the workflow file `source` that has one, else
+    config/rules under the working directory.
+    """
+    override = os.getenv("RIIL_RULES_DIR")
+    if override:
+        return Path(override)
+    if source is not None:
+        for parent in Path(source).resolve().parents:
+            candidate = parent / DEFAULT_RULES_DIR
+            if candidate.is_dir():
+                return candidate
+    return DEFAULT_RULES_DIR
+
+
+def get_rule_index(root: Optional[Path] = None) -> RuleIndex:
+    """The process-wide RuleIndex for a directory (default: `rules_dir()`)."""
+    key = os.path.abspath(root or rules_dir())
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes[key] = RuleIndex(Path(key))
+    return index
+
+
+def reset_rule_indexes() -> None:
+    """Forget every loaded index (tests, or after moving the rules directory)."""
+    _indexes.clear()
@@ -1,36 +1,450 @@
-# eko/infrastructure/utils/json_repair.py
+# riil/infrastructure/utils/json_repair.py
 """
 Lightweight JSON repair for malformed LLM outputs.
+
+JSONRepairParser is a single-pass, incremental tokenizer: feed it chunks as
+they stream in and it builds the Python value as it goes, fixing the usual
+LLM mistakes on the way - prose or code fences around the JSON, single
+quotes, unquoted keys and values, Python literals, missing or trailing
+commas, missing colons, unclosed strings and truncated objects/arrays.
+
+Objects are preferred over arrays: brackets in the prose before an object
+("see [docs]", "note [1]") are parsed tentatively and dropped once an
+object follows. A top-level array is returned when no object does.
 """
 
-import re
 import json
-from typing import Any
+import re
+from typing import Any, Callable, List, Optional, Tuple
+
+Path = Tuple[Any, ...]
+# ("key", path) | ("open", path, "object" | "array") | ("value", path, value)
+Event = Tuple[Any, ...]
+
+# Whitespace, then a complete double-quoted string, a complete number or
+# literal, or a single character handled by the state machine
+_TOKEN = re.compile(
+    r'[ \t\r\n]*(?:"((?:[^"\\]|\\.)*)"'
+    r"|(-?\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|true|false|null)(?=[ \t\r\n]*[,}\]])"
+    r"|(\S))?",
+    re.S,
+)
+_ESCAPE_SEQUENCE = re.compile(r"\\(u[0-9a-fA-F]{4}|.)", re.S)
+_STRING_RUN = {'"': re.compile(r'[^"\\]+'), "'": re.compile(r"[^'\\]+")}
+# Unquoted keys stop at whitespace; unquoted values may contain spaces and colons
+_KEY_RUN = re.compile(r"[^\s,:\[\]{}\"']+")
+_VALUE_RUN = re.compile(r"[^,\[\]{}\"'\n]+")
+_NUMBER = re.compile(r"-?\d+(\.\d*)?([eE][+-]?\d+)?")
+_LITERALS = {
+    "true": True,
+    "false": False,
+    "null": None,
+    "True": True,
+    "False": False,
+    "None": None,
+}
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+# Parser states outside containers
+_SEEK, _DONE = "seek", "done"
+# Container states
+_KEY, _COLON, _VALUE, _COMMA = "key", "colon", "value", "comma"
+
+
+class _Frame:
+    __slots__ = ("container", "is_object", "state", "key", "path")
+
+    def __init__(self, container: Any, path: Path):
+        self.container = container
+        self.is_object = isinstance(container, dict)
+        self.state = _KEY if self.is_object else _VALUE
+        self.key: Optional[str] = None
+        self.path = path
+
+
+class JSONRepairParser:
+    """
+    Incremental repairing parser.
+
+        parser = JSONRepairParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+        value = parser.close()
+
+    `value` holds the (partial) root as it is built. `listener`, if given,
+    receives an event for every key, container and completed value.
+    """
+
+    def __init__(self, listener: Optional[Callable[[Event], None]] = None):
+        self.listener = listener
+        self.value: Any = None
+        self.done = False
+        self.consumed = 0
+        self._stack: List[_Frame] = []
+        self._state = _SEEK
+        # Pending token: a string (quote char set) or a bareword
+        self._quote: Optional[str] = None
+        self._escape: Optional[str] = None
+        self._bareword: Optional[List[str]] = None
+        self._buffer: List[str] = []
+        self._surrogates = False
+        # A top-level array being read while an object may still follow:
+        # its raw text and the listener events held back until it is kept
+        self._candidate: Optional[List[str]] = None
+        self._held: Optional[List[Event]] = None
+        # The first closed array, (value, events, valid JSON), in case no object follows
+        self._fallback: Optional[Tuple[Any, List[Event], bool]] = None
+
+    @property
+    def pending_length(self) -> int:
+        """Characters of the string or bareword currently being read."""
+        return sum(len(part) for part in self._buffer)
+
+    def feed(self, chunk: str) -> None:
+        """Consume the next piece of text. Input after the root closes is ignored."""
+        self.consumed += len(chunk)
+        i, n = 0, len(chunk)
+        # Where the candidate array's text starts in this chunk
+        mark = 0
+        while i < n and not self.done:
+            quote, bareword = self._quote, self._bareword
+            if quote is not None:
+                i = self._read_string(chunk, i, quote)
+            elif bareword is not None:
+                i = self._read_bareword(chunk, i, bareword)
+            elif self._state == _SEEK:
+                start = min(
+                    (p for p in (chunk.find("{", i), chunk.find("[", i)) if p != -1),
+                    default=-1,
+                )
+                if start == -1:
+                    return
+                if chunk[start] == "[":
+                    self._candidate = []
+                    self._held = [] if self.listener else None
+                    mark = start
+                else:
+                    self._fallback = None
+                self._open(chunk[start])
+                i = start + 1
+            else:
+                i = self._read_structure(chunk, i)
+            if self.done and self._candidate is not None:
+                self._candidate.append(chunk[mark:i])
+                self._set_aside()
+        if self._candidate is not None:
+            self._candidate.append(chunk[mark:])
+
+    def close(self) -> Any:
+        """Finish the input, closing whatever was left open, and return the value."""
+        if self._candidate is not None:
+            # Cut off by the end of the input: no object can follow
+            self._keep_candidate()
+        if self._quote is not None:
+            self._escape = None
+            self._end_string()
+        elif self._bareword is not None:
+            self._end_bareword(truncated=True)
+        while self._stack:
+            self._close_top()
+        if self._state == _SEEK and self._fallback is not None:
+            self.value, events, _ = self._fallback
+            self._fallback = None
+            self._state = _DONE
+            self.done = True
+            for event in events:
+                self._emit(event)
+        if self._state == _SEEK:
+            raise ValueError("No JSON object found")
+        return self.value
+
+    # Top-level arrays
+
+    def _keep_candidate(self) -> None:
+        """The array being read is the result: release its held events."""
+        held = self._held
+        self._candidate = self._held = None
+        self._fallback = None
+        for event in held or ():
+            self._emit(event)
+
+    def _set_aside(self) -> None:
+        """
+        The candidate array closed before any object: keep it as the fallback
+        (a valid one replaces an invalid one) and seek on.
+        """
+        text = "".join(self._candidate or ())
+        try:
+            json.loads(text)
+            valid = True
+        except ValueError:
+            valid = False
+        if self._fallback is None or (valid and not self._fallback[2]):
+            self._fallback = (self.value, self._held or [], valid)
+        self._candidate = self._held = None
+        self.value = None
+        self.done = False
+        self._state = _SEEK
+
+    def _emit(self, event: Event) -> None:
+        if self._held is not None:
+            self._held.append(event)
+        elif self.listener:
+            self.listener(event)
+
+    # Structure
+
+    def _read_structure(self, chunk: str, i: int) -> int:
+        match = _TOKEN.match(chunk, i)
+        # Every part of _TOKEN is optional, so it always matches
+        assert match is not None
+        body, scalar, c = match.groups()
+        frame = self._stack[-1]
+        if body is not None or scalar is not None:
+            # Fast path: the whole token is in this chunk
+            if frame.is_object and frame.state == _COMMA:
+                frame.state = _KEY
+            if body is None:
+                self._complete(_scalar(scalar))
+            else:
+                self._complete(_decode_string(body) if "\\" in body else body)
+            return match.end()
+        if c is None:
+            return match.end()
+        i = match.end() - 1
+        if c == "{" or c == "[":
+            if self._begin_value(frame):
+                self._open(c)
+        elif c == "}" or c == "]":
+            self._close_matching(c == "}")
+        elif c == ",":
+            if frame.is_object:
+                frame.key = None
+                frame.state = _KEY
+            else:
+                frame.state = _VALUE
+        elif c == ":":
+            if frame.is_object and frame.state == _COLON:
+                frame.state = _VALUE
+        elif c == '"' or c == "'":
+            self._quote = c
+            self._buffer = []
+            if frame.is_object and frame.state == _COMMA:
+                frame.state = _KEY  # missing comma before a key
+        else:
+            if frame.is_object and frame.state == _COMMA:
+                frame.state = _KEY
+            self._bareword = self._buffer = []
+            return i
+        return i + 1
+
+    def _begin_value(self, frame: _Frame) -> bool:
+        """Prepare `frame` to receive a value; False when one cannot go here."""
+        if frame.is_object:
+            if frame.state == _COLON:
+                frame.state = _VALUE  # missing colon
+            return frame.state == _VALUE
+        return True  # arrays: a value where a comma was expected just appends
+
+    def _open(self, bracket: str) -> None:
+        if bracket == "{" and self._candidate is not None:
+            # An array of objects is the payload
+            self._keep_candidate()
+        container: Any = {} if bracket == "{" else []
+        if not self._stack:
+            self.value = container
+            self._state = _VALUE
+            path: Path = ()
+        else:
+            path = self._attach(container)
+        self._stack.append(_Frame(container, path))
+        self._emit(("open", path, "object" if bracket == "{" else "array"))
+
+    def _attach(self, value: Any) -> Path:
+        frame = self._stack[-1]
+        if frame.is_object:
+            frame.container[frame.key] = value
+            path = frame.path + (frame.key,)
+        else:
+            path = frame.path + (len(frame.container),)
+            frame.container.append(value)
+        frame.state = _COMMA
+        return path
+
+    def _close_matching(self, is_object: bool) -> None:
+        if self._stack[-1].is_object == is_object:
+            self._close_top()
+            return
+        if not any(f.is_object == is_object for f in self._stack):
+            return  # stray closer
+        while True:
+            closing_object = self._stack[-1].is_object
+            self._close_top()
+            if closing_object == is_object:
+                return
+
+    def _close_top(self) -> None:
+        # A dangling key (no value yet) was never attached, so it is dropped
+        frame = self._stack.pop()
+        self._emit(("value", frame.path, frame.container))
+        if not self._stack:
+            self.done = True
+            self._state = _DONE
+
+    def _complete(self, value: Any) -> None:
+        frame = self._stack[-1]
+        if frame.is_object and frame.state == _KEY:
+            frame.key = value if isinstance(value, str) else json.dumps(value)
+            frame.state = _COLON
+            self._emit(("key", frame.path + (frame.key,)))
+            return
+        if not self._begin_value(frame):
+            return
+        path = self._attach(value)
+        self._emit(("value", path, value))
+
+    # Tokens
+
+    def _read_string(self, chunk: str, i: int, quote: str) -> int:
+        n = len(chunk)
+        run = _STRING_RUN[quote]
+        while i < n:
+            escape = self._escape
+            if escape is not None:
+                i = self._read_escape(chunk, i, escape)
+                continue
+            match = run.match(chunk, i)
+            if match:
+                self._buffer.append(match.group())
+                i = match.end()
+                continue
+            c = chunk[i]
+            if c == "\\":
+                self._escape = ""
+                i += 1
+            else:  # closing quote
+                self._end_string()
+                return i + 1
+        return i
+
+    def _read_escape(self, chunk: str, i: int, escape: str) -> int:
+        escape += chunk[i]
+        if escape[0] != "u":
+            self._buffer.append(_ESCAPES.get(escape, escape))
+            self._escape = None
+        elif len(escape) == 5:
+            try:
+                code = int(escape[1:], 16)
+                self._buffer.append(chr(code))
+                self._surrogates = self._surrogates or 0xD800 <= code <= 0xDFFF
+            except ValueError:
+                self._buffer.append(escape)
+            self._escape = None
+        else:
+            self._escape = escape
+        return i + 1
+
+    def _end_string(self) -> None:
+        text = "".join(self._buffer)
+        if self._surrogates:
+            self._surrogates = False
+            text = text.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+        self._quote = None
+        self._buffer = []
+        self._complete(text)
+
+    def _read_bareword(self, chunk: str, i: int, bareword: List[str]) -> int:
+        frame = self._stack[-1]
+        run = _KEY_RUN if frame.is_object and frame.state == _KEY else _VALUE_RUN
+        match = run.match(chunk, i)
+        if match:
+            bareword.append(match.group())
+            if match.end() < len(chunk):
+                self._end_bareword()
+            return match.end()
+        self._end_bareword()
+        return i
+
+    def _end_bareword(self, truncated: bool = False) -> None:
+        token = "".join(self._bareword or ()).strip()
+        self._bareword = None
+        self._buffer = []
+        if not token:
+            return
+        frame = self._stack[-1]
+        if frame.is_object and frame.state == _KEY:
+            if not truncated:
+                self._complete(token)
+            return
+        if truncated:
+            completed = _complete_truncated(token)
+            if completed is None:
+                return
+            token = completed
+        parts = token.split()
+        if len(parts) > 1 and all(
+            p in _LITERALS or _NUMBER.fullmatch(p) for p in parts
+        ):
+            # Values missing their commas, e.g. [1 2 3]
+            for part in parts:
+                self._complete(_scalar(part))
+            return
+        self._complete(_scalar(token))
+
+
+def _scalar(token: str) -> Any:
+    """Value of an unquoted token: literal, number, or else the text itself."""
+    if token in _LITERALS:
+        return _LITERALS[token]
+    if _NUMBER.fullmatch(token):
+        return float(token) if any(c in token for c in ".eE") else int(token)
+    return token
+
+
+def _decode_string(body: str) -> str:
+    try:
+        text: str = json.loads(f'"{body}"', strict=False)
+        return text
+    except ValueError:
+        # Invalid escapes: decode leniently, as the streaming path does
+        text = _ESCAPE_SEQUENCE.sub(_unescape, body)
+        return text.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+
+
+def _unescape(match: "re.Match[str]") -> str:
+    escape: str = match.group(1)
+    if escape[0] == "u" and len(escape) == 5:
+        return chr(int(escape[1:], 16))
+    return _ESCAPES.get(escape, escape)
+
+
+def _complete_truncated(token: str) -> Optional[str]:
+    """Best guess for a value cut off by the end of input."""
+    for literal in ("true", "false", "null"):
+        if literal.startswith(token):
+            return literal
+    if token[0] in "-0123456789":
+        number = token.rstrip(".eE+-")
+        return number if _NUMBER.fullmatch(number) else None
+    return token
+
+
+def parse_json(text: str) -> Any:
+    """Parse possibly malformed JSON from an LLM. Raises ValueError if none is found."""
+    stripped = text.strip()
+    if stripped[:1] in ("{", "["):
+        try:
+            return json.loads(stripped)
+        except ValueError:
+            pass
+    parser = JSONRepairParser()
+    parser.feed(text)
+    return parser.close()
 
 
 def repair_json(text: str) -> str:
     """
     Attempt to repair common JSON syntax errors.
-    Inspired by json-repair, simplified for core use.
+    Returns valid JSON text; raises ValueError when there is no object or array.
     """
-    # Remove text before first { and after last }
-    first = text.find("{")
-    last = text.rfind("}")
-    if first == -1 or last == -1:
-        raise ValueError("No JSON object found")
-    text = text[first : last + 1]
-
-    # Fix missing commas
-    text = re.sub(r'"\s*"', '","', text)
-    text = re.sub(r'}\s*{', '},{', text)
-    text = re.sub(r']\s*\[', '],[', text)
-    text = re.sub(r'}\s*"', '}, "', text)
-    text = re.sub(r']\s*"', '], "', text)
-
-    # Fix trailing commas
-    text = re.sub(r',(\s*[}\]])', r'\1', text)
-
-    # Ensure strings are quoted
-    text = re.sub(r':\s*([A-Za-z0-9_]+)([,\}\]])', r': "\1"\2', text)
-
-    return text
+    return json.dumps(parse_json(text), ensure_ascii=False)
@@ -0,0 +1,123 @@
+# riil/infrastructure/utils/offload.py
+"""
+Shared worker pools for CPU-bound work, so it does not stall the event loop.
+
+    result = await offload(parse_report, text, mode="process")
+
+"process" runs the function in a process pool: true parallelism, but the
+function must be importable (module level) and its arguments and result
+are pickled, so pass plain data (str, bytes, lists, dicts) rather than
+objects that drag their whole graph along. "thread" runs it in a thread
+pool: no copying, for work that releases the GIL (hashing, compression,
+numpy...) or that only needs to stop monopolizing the loop.
+
+Pools are created on first use and sized by `configure_offload()` or
+$RIIL_OFFLOAD_PROCESSES / $RIIL_OFFLOAD_THREADS. Call `shutdown_offload()`
+on exit; the CLI and the server do.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+OFFLOAD_MODES = ("process", "thread")
+
+_sizes: Dict[str, Optional[int]] = {"process": None, "thread": None}
+_executors: Dict[str, Executor] = {}
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def configure_offload(
+    processes: Optional[int] = None, threads: Optional[int] = None
+) -> None:
+    """Set pool sizes. Running pools are shut down and recreated on next use."""
+    for mode, size in (("process", processes), ("thread", threads)):
+        if size is not None and size < 1:
+            raise ValueError(f"{mode} pool size must be >= 1")
+        _sizes[mode] = size
+    shutdown_offload(wait=False)
+
+
+def pool_size(mode: str) -> int:
+    """Workers in the `mode` pool: configured, from the environment, or by CPU count."""
+    _check_mode(mode)
+    size = _sizes[mode]
+    if size is not None:
+        return size
+    env = os.getenv(f"RIIL_OFFLOAD_{mode.upper()}S")
+    if env:
+        return max(1, int(env))
+    cpus = os.cpu_count() or 1
+    return max(1, min(cpus - 1, 8)) if mode == "process" else min(32, cpus + 4)
+
+
+def get_executor(mode: str) -> Executor:
+    """The shared pool for `mode`, created on first use."""
+    _check_mode(mode)
+    executor = _executors.get(mode)
+    if executor is None:
+        if mode == "process":
+            # Forking a process that runs threads (to_thread, pools) can deadlock
+            executor = ProcessPoolExecutor(
+                pool_size(mode), mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            executor = ThreadPoolExecutor(
+                pool_size(mode), thread_name_prefix="riil-offload"
+            )
+        _executors[mode] = executor
+    return executor
+
+
+async def offload(
+    fn: Callable[..., Any], *args: Any, mode: str = "process", **kwargs: Any
+) -> Any:
+    """Run `fn(*args, **kwargs)` in the shared `mode` pool and await its result."""
+    if kwargs:
+        fn = functools.partial(fn, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(
+        get_executor(mode), fn, *args
+    )
+
+
+def cpu_bound(mode: str = "process") -> Callable[[F], F]:
+    """Mark a hook as CPU-bound; `call_hook` then runs it in the `mode` pool."""
+    _check_mode(mode)
+
+    def mark(fn: F) -> F:
+        setattr(fn, "__riil_offload__", mode)
+        return fn
+
+    return mark
+
+
+async def call_hook(
+    fn: Callable[..., Any], *args: Any, mode: Optional[str] = None
+) -> Any:
+    """
+    Call a synchronous hook: in the `mode` pool when given, else where
+    `@cpu_bound` says, else inline on the loop. mode="inline" forces inline.
+    """
+    mode = mode or getattr(fn, "__riil_offload__", None)
+    if mode is None or mode == "inline":
+        return fn(*args)
+    return await offload(fn, *args, mode=mode)
+
+
+def shutdown_offload(wait: bool = True) -> None:
+    """Shut down the pools; queued work that has not started is cancelled."""
+    executors = list(_executors.values())
+    _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _check_mode(mode: str) -> None:
+    if mode not in OFFLOAD_MODES:
+        raise ValueError(
+            f"Unknown offload mode: {mode} (use {', '.join(OFFLOAD_MODES)})"
+        )
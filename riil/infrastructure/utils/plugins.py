@@ -0,0 +1,47 @@
+# riil/infrastructure/utils/plugins.py
+"""
+Lazy plugin lookup for the provider and callback registries.
+
+Plugins are named by "module:attribute" targets, either in a built-in table
+or through package entry points, and nothing is imported until a name is
+looked up. A third-party package exposes a provider with:
+
+    [tool.poetry.plugins."riil.providers"]
+    anthropic = "riil_anthropic:create_step"
+"""
+
+import importlib
+from importlib import metadata
+from typing import Any, Dict, List, Optional
+
+
+def load_target(target: str) -> Any:
+    """Import `module:attribute` and return the attribute."""
+    module_name, _, attr = target.partition(":")
+    obj = importlib.import_module(module_name)
+    for part in filter(None, attr.split(".")):
+        obj = getattr(obj, part)
+    return obj
+
+
+def find_plugin(group: str, name: str, builtins: Dict[str, str]) -> Optional[Any]:
+    """The plugin called `name`: a built-in target first, then the entry point group."""
+    if name in builtins:
+        return load_target(builtins[name])
+    for ep in _entry_points(group):
+        if ep.name == name:
+            return ep.load()
+    return None
+
+
+def plugin_names(group: str, builtins: Dict[str, str]) -> List[str]:
+    """Names of every known plugin, without importing any of them."""
+    return sorted(set(builtins) | {ep.name for ep in _entry_points(group)})
+
+
+def _entry_points(group: str) -> List[Any]:
+    eps = metadata.entry_points()
+    # Python 3.9 returns a dict of groups; 3.10+ a selectable collection
+    if hasattr(eps, "select"):
+        return list(eps.select(group=group))
+    return list(eps.get(group, []))
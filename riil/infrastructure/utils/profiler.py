@@ -0,0 +1,242 @@
+# riil/infrastructure/utils/profiler.py
+"""
+Event-loop stall detection and exporters for recorded spans
+(riil.core.profiling): Chrome trace JSON, which Perfetto and
+chrome://tracing open, and a plain-text waterfall per run.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+from riil.core.profiling import Recorder, Span
+
+# Stall events go on their own track, above the runs
+STALL_TRACK = 0
+MAX_STACK_FRAMES = 12
+
+
+class StallMonitor:
+    """
+    Records every time the event loop fails to run for longer than
+    `threshold` seconds. A heartbeat task measures how late it wakes up; a
+    watchdog thread samples the loop thread's stack while it is late, so
+    each stall comes with the code that was holding the loop.
+    """
+
+    def __init__(self, recorder: Recorder, threshold: float = 0.05):
+        if threshold <= 0:
+            raise ValueError("stall threshold must be > 0")
+        self.recorder = recorder
+        self.threshold = threshold
+        self.interval = min(threshold / 4, 0.01)
+        self._beat = 0.0
+        self._stack: Optional[List[str]] = None
+        self._loop_thread = 0
+        self._heartbeat: "Optional[asyncio.Future[None]]" = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    async def __aenter__(self) -> "StallMonitor":
+        self._loop_thread = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._stopped.clear()
+        self._heartbeat = asyncio.ensure_future(self._run_heartbeat())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="riil-stall-watchdog", daemon=True
+        )
+        self._watchdog.start()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+        if self._watchdog is not None:
+            self._watchdog.join()
+
+    async def _run_heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            late = now - self._beat - self.interval
+            if late > self.threshold:
+                self.recorder.stalls.append(
+                    {
+                        "start": self._beat + self.interval,
+                        "duration": late,
+                        "stack": self._stack or [],
+                    }
+                )
+            self._stack = None
+            self._beat = now
+
+    def _watch(self) -> None:
+        sampled = None
+        while not self._stopped.wait(self.interval / 2):
+            beat = self._beat
+            if (
+                beat != sampled
+                and time.perf_counter() - beat - self.interval > self.threshold
+            ):
+                # One sample per stall, taken once it is known to be one
+                sampled = beat
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    self._stack = [
+                        line.rstrip()
+                        for line in traceback.format_stack(frame)[-MAX_STACK_FRAMES:]
+                    ]
+
+
+def chrome_trace(recorder: Recorder) -> Dict[str, Any]:
+    """
+    The recording in Chrome trace event format. Each run gets one or more
+    tracks (overlapping steps are spread over tracks so slices nest);
+    stalls are on their own track, with their stacks as arguments.
+    """
+    origin = recorder.started
+    events: List[Dict[str, Any]] = [
+        {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "riil"}},
+        {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": 1,
+            "tid": STALL_TRACK,
+            "args": {"name": "event loop stalls"},
+        },
+    ]
+    for span, track in _tracks(recorder.spans).items():
+        events.append(
+            {
+                "name": span.name,
+                "cat": span.category or "riil",
+                "ph": "X",
+                "pid": 1,
+                "tid": track,
+                "ts": _us(span.start - origin),
+                "dur": _us(span.duration),
+                "args": {
+                    k: v if isinstance(v, (str, int, float, bool)) else str(v)
+                    for k, v in span.attrs.items()
+                },
+            }
+        )
+    for stall in recorder.stalls:
+        events.append(
+            {
+                "name": "event loop stall",
+                "cat": "stall",
+                "ph": "X",
+                "pid": 1,
+                "tid": STALL_TRACK,
+                "ts": _us(stall["start"] - origin),
+                "dur": _us(stall["duration"]),
+                "args": {"stack": "\n".join(stall["stack"])},
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def waterfall(recorder: Recorder, width: int = 40) -> str:
+    """One waterfall per run: offset and duration of every span, as a tree with bars."""
+    children: Dict[Optional[int], List[Span]] = {}
+    for span in recorder.spans:
+        children.setdefault(span.parent, []).append(span)
+    out: List[str] = []
+    for root in children.get(None, []):
+        total = max(root.duration, 1e-9)
+        trace_id = root.attrs.get("trace_id", "")
+        out.append(
+            f"{root.category} {root.name}  {trace_id}  {root.duration * 1e3:.1f} ms"
+        )
+        out.append(f"  {'start':>9} {'ms':>9}")
+
+        def _walk(span: Span, depth: int) -> None:
+            begin = int((span.start - root.start) / total * width)
+            length = max(1, int(span.duration / total * width))
+            bar = (" " * begin + "█" * length)[:width].ljust(width)
+            label = f"{'  ' * depth}{_label(span)}"
+            offset = (span.start - root.start) * 1e3
+            out.append(f"  {offset:9.1f} {span.duration * 1e3:9.1f}  |{bar}|  {label}")
+            for child in sorted(children.get(span.id, []), key=lambda s: s.start):
+                _walk(child, depth + 1)
+
+        _walk(root, 0)
+        for stall in recorder.stalls:
+            if root.start <= stall["start"] <= root.start + root.duration:
+                at = (stall["start"] - root.start) * 1e3
+                out.append(
+                    f"  ⚠️  event loop stalled {stall['duration'] * 1e3:.1f} ms"
+                    f" at +{at:.1f} ms"
+                )
+                out.extend(
+                    f"      {line}"
+                    for frame in stall["stack"][-4:]
+                    for line in frame.splitlines()
+                )
+        out.append("")
+    return "\n".join(out)
+
+
+def _label(span: Span) -> str:
+    if span.category == "step":
+        name = f"step {span.attrs.get('index', '')} {span.name}"
+    elif span.category == "llm" and span.name == "attempt":
+        attempt, model = span.attrs.get("attempt", ""), span.attrs.get("model", "")
+        name = f"llm attempt {attempt} {model}".rstrip()
+    elif span.category and span.category != span.name:
+        name = f"{span.category} {span.name}"
+    else:
+        name = span.name
+    return name + (f"  ({span.attrs['error']})" if "error" in span.attrs else "")
+
+
+def _tracks(spans: List[Span]) -> Dict[Span, int]:
+    """
+    Assign spans to tracks so that, on each track, slices either nest or do
+    not overlap. A span goes on its parent's track when nothing else is open
+    there below the parent, else on the first track where that holds.
+    """
+    by_id: Dict[Optional[int], Span] = {s.id: s for s in spans}
+    open_spans: List[List[Span]] = []
+    assigned: Dict[Span, int] = {}
+    for span in sorted(spans, key=lambda s: s.start):
+        end = span.start + span.duration
+        for stack in open_spans:
+            while stack and stack[-1].start + stack[-1].duration <= span.start:
+                stack.pop()
+        parent = by_id.get(span.parent)
+        candidates = list(range(len(open_spans)))
+        if parent is not None and parent in assigned:
+            candidates.insert(0, assigned[parent] - 1)
+        for i in candidates:
+            stack = open_spans[i]
+            top = stack[-1] if stack else None
+            if top is None or (
+                _is_ancestor(top, span, by_id) and top.start + top.duration >= end
+            ):
+                break
+        else:
+            open_spans.append([])
+            i = len(open_spans) - 1
+        open_spans[i].append(span)
+        assigned[span] = i + 1
+    return assigned
+
+
+def _is_ancestor(candidate: Span, span: Span, by_id: Dict[Optional[int], Span]) -> bool:
+    parent = by_id.get(span.parent)
+    while parent is not None:
+        if parent is candidate:
+            return True
+        parent = by_id.get(parent.parent)
+    return False
+
+
+def _us(seconds: float) -> float:
+    return round(seconds * 1e6, 1)
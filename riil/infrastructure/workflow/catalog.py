@@ -0,0 +1,164 @@
+# riil/infrastructure/workflow/catalog.py
+"""
+Indexed catalog of the workflows under a directory.
+
+Metadata and the validated spec of every file are kept in an on-disk JSON
+index next to the workflows. A refresh only re-parses files whose mtime/size
+changed, so listing or resolving a workflow by name does not parse YAML.
+"""
+
+import hashlib
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from riil.config.schema import WorkflowSpec
+from riil.infrastructure.workflow.compiler import CompiledWorkflow, required_inputs
+from riil.infrastructure.workflow.loader import (
+    compile_workflow_file,
+    content_digest,
+    parse_workflow_spec,
+)
+
+INDEX_FILENAME = ".riil-index.json"
+INDEX_VERSION = 1
+
+
+class WorkflowCatalog:
+    def __init__(self, root: Path, index_path: Optional[Path] = None):
+        self.root = root
+        self.index_path = index_path or root / INDEX_FILENAME
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._loaded = False
+
+    def refresh(self) -> List[Dict[str, Any]]:
+        """
+        Sync the index with the files on disk and return its entries sorted by
+        path. Files that fail to parse are listed with an `error`.
+        """
+        if not self._loaded:
+            self._entries = self._read_index()
+            self._loaded = True
+
+        changed = False
+        seen = set()
+        if self.root.exists():
+            for path in sorted(self.root.rglob("*.y*ml")):
+                if path.suffix not in (".yaml", ".yml"):
+                    continue
+                rel = path.relative_to(self.root).as_posix()
+                seen.add(rel)
+                stat = path.stat()
+                entry = self._entries.get(rel)
+                if (
+                    entry
+                    and entry["mtime_ns"] == stat.st_mtime_ns
+                    and entry["size"] == stat.st_size
+                ):
+                    continue
+                self._entries[rel] = self._index_file(path, rel, stat, entry)
+                changed = True
+
+        for rel in set(self._entries) - seen:
+            del self._entries[rel]
+            changed = True
+
+        if changed:
+            self._write_index()
+        return [self._entries[rel] for rel in sorted(self._entries)]
+
+    def find(self, name: str) -> Optional[Dict[str, Any]]:
+        """Entry for a workflow name (or its path relative to the root)."""
+        entries = self.refresh()
+        for entry in entries:
+            if entry["path"] == name or entry.get("name") == name:
+                return entry
+        return None
+
+    def compile(self, entry: Dict[str, Any]) -> CompiledWorkflow:
+        """
+        Compile an indexed workflow from its stored spec, without re-reading
+        YAML unless the file changed after it was indexed.
+        """
+        if entry.get("error"):
+            raise ValueError(
+                f"Failed to load workflow from {self.root / entry['path']}:"
+                f" {entry['error']}"
+            )
+        spec = WorkflowSpec.model_validate(entry["spec"])
+        return compile_workflow_file(
+            self.root / entry["path"],
+            spec=spec,
+            digest=entry["sha256"],
+            stamp=(entry["mtime_ns"], entry["size"]),
+        )
+
+    def _index_file(
+        self,
+        path: Path,
+        rel: str,
+        stat: os.stat_result,
+        previous: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        raw_text = path.read_text(encoding="utf-8")
+        digest = content_digest(raw_text)
+        entry: Dict[str, Any] = {
+            "path": rel,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": digest,
+        }
+        if previous and previous["sha256"] == digest:
+            return {**previous, **entry}
+        try:
+            spec = parse_workflow_spec(raw_text, path)
+            inputs = required_inputs(spec)
+        except ValueError as e:
+            entry["error"] = str(e)
+            return entry
+        entry.update(
+            {
+                "name": spec.name,
+                "description": spec.description,
+                "version": spec.version,
+                "tags": spec.tags,
+                "required_inputs": sorted(inputs),
+                "spec": spec.model_dump(mode="json"),
+            }
+        )
+        return entry
+
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        if (
+            data.get("version") != INDEX_VERSION
+            or data.get("schema") != _schema_fingerprint()
+        ):
+            return {}
+        return {entry["path"]: entry for entry in data.get("workflows", [])}
+
+    def _write_index(self) -> None:
+        data = {
+            "version": INDEX_VERSION,
+            "schema": _schema_fingerprint(),
+            "workflows": [self._entries[k] for k in sorted(self._entries)],
+        }
+        tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps(data, indent=1), encoding="utf-8")
+            os.replace(tmp, self.index_path)
+        except OSError:
+            # A read-only workflows dir still works, just without the index
+            pass
+
+
+@lru_cache(maxsize=None)
+def _schema_fingerprint() -> str:
+    """Changes whenever WorkflowSpec does, so stored specs are never stale."""
+    schema = json.dumps(WorkflowSpec.model_json_schema(), sort_keys=True)
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,212 @@
+# riil/infrastructure/workflow/checkpoints.py
+"""
+Checkpoint stores: in memory, or in a local SQLite file (the default for
+the CLI). Step outputs are serialized as JSON when saved and written by a
+background task in batches, off the event loop, so saving costs a step
+one json.dumps.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from riil.core.checkpoint import Checkpoint, CheckpointStore
+
+DEFAULT_CHECKPOINT_PATH = Path(".riil/checkpoints.sqlite")
+# Runs not updated for this long are deleted when a SQLite store is opened
+DEFAULT_MAX_AGE = 7 * 24 * 3600.0
+
+
+class MemoryCheckpointStore(CheckpointStore):
+    """Checkpoints for the life of the process; for tests and embedding."""
+
+    def __init__(self) -> None:
+        self._runs: Dict[str, Checkpoint] = {}
+
+    async def begin(
+        self, trace_id: str, workflow: str, fingerprint: str, inputs: Dict[str, Any]
+    ) -> None:
+        self._runs[trace_id] = Checkpoint(
+            trace_id, workflow, fingerprint, dict(inputs), {}, time.time()
+        )
+
+    def save(self, trace_id: str, step: int, output: Any) -> None:
+        run = self._runs.get(trace_id)
+        if run is not None:
+            run.outputs[step] = output
+            run.updated_at = time.time()
+
+    async def flush(self) -> None:
+        pass
+
+    async def load(self, trace_id: str) -> Optional[Checkpoint]:
+        run = self._runs.get(trace_id)
+        if run is None:
+            return None
+        return Checkpoint(
+            run.trace_id,
+            run.workflow,
+            run.fingerprint,
+            dict(run.inputs),
+            dict(run.outputs),
+            run.updated_at,
+        )
+
+    async def delete(self, trace_id: str) -> None:
+        self._runs.pop(trace_id, None)
+
+    async def gc(self, max_age: float) -> int:
+        cutoff = time.time() - max_age
+        stale = [t for t, run in self._runs.items() if run.updated_at < cutoff]
+        for trace_id in stale:
+            del self._runs[trace_id]
+        return len(stale)
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_CHECKPOINT_PATH,
+        max_age: Optional[float] = DEFAULT_MAX_AGE,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Losing the last write to a power cut only costs re-running that step
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "trace_id TEXT PRIMARY KEY, workflow TEXT NOT NULL,"
+            " fingerprint TEXT NOT NULL, "
+            "inputs TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outputs ("
+            "trace_id TEXT NOT NULL, step INTEGER NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (trace_id, step))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_updated ON runs (updated)")
+        self._pending: List[Tuple[str, int, str]] = []
+        self._writer: "Optional[asyncio.Future[None]]" = None
+        if max_age is not None:
+            self._gc(max_age)
+
+    async def begin(
+        self, trace_id: str, workflow: str, fingerprint: str, inputs: Dict[str, Any]
+    ) -> None:
+        data = json.dumps(inputs, ensure_ascii=False, default=str)
+        await asyncio.to_thread(self._begin, trace_id, workflow, fingerprint, data)
+
+    def save(self, trace_id: str, step: int, output: Any) -> None:
+        self._pending.append(
+            (trace_id, step, json.dumps(output, ensure_ascii=False, default=str))
+        )
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.ensure_future(self._write_pending())
+
+    async def flush(self) -> None:
+        if self._writer is not None:
+            await self._writer
+
+    async def load(self, trace_id: str) -> Optional[Checkpoint]:
+        await self.flush()
+        return await asyncio.to_thread(self._load, trace_id)
+
+    async def delete(self, trace_id: str) -> None:
+        await self.flush()
+        await asyncio.to_thread(self._delete, [trace_id])
+
+    async def gc(self, max_age: float) -> int:
+        await self.flush()
+        return await asyncio.to_thread(self._gc, max_age)
+
+    def runs(self) -> List[Dict[str, Any]]:
+        """Stored runs, most recently updated first, with their completed step count."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.trace_id, r.workflow, r.updated, COUNT(o.step) FROM runs r "
+                "LEFT JOIN outputs o ON o.trace_id = r.trace_id "
+                "GROUP BY r.trace_id ORDER BY r.updated DESC"
+            ).fetchall()
+        return [
+            {"trace_id": t, "workflow": w, "updated_at": u, "steps": n}
+            for t, w, u, n in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    async def _write_pending(self) -> None:
+        while self._pending:
+            batch, self._pending = self._pending, []
+            await asyncio.to_thread(self._write, batch)
+
+    def _write(self, batch: List[Tuple[str, int, str]]) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?)", batch
+            )
+            self._conn.executemany(
+                "UPDATE runs SET updated = ? WHERE trace_id = ?",
+                {(now, t) for t, _, _ in batch},
+            )
+
+    def _begin(
+        self, trace_id: str, workflow: str, fingerprint: str, inputs: str
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM outputs WHERE trace_id = ?", (trace_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)",
+                (trace_id, workflow, fingerprint, inputs, time.time()),
+            )
+
+    def _load(self, trace_id: str) -> Optional[Checkpoint]:
+        with self._lock:
+            run = self._conn.execute(
+                "SELECT workflow, fingerprint, inputs, updated FROM runs"
+                " WHERE trace_id = ?",
+                (trace_id,),
+            ).fetchone()
+            if run is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT step, value FROM outputs WHERE trace_id = ?", (trace_id,)
+            ).fetchall()
+        workflow, fingerprint, inputs, updated = run
+        outputs = {step: json.loads(value) for step, value in rows}
+        return Checkpoint(
+            trace_id, workflow, fingerprint, json.loads(inputs), outputs, updated
+        )
+
+    def _delete(self, trace_ids: List[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            keys = [(t,) for t in trace_ids]
+            self._conn.executemany("DELETE FROM outputs WHERE trace_id = ?", keys)
+            self._conn.executemany("DELETE FROM runs WHERE trace_id = ?", keys)
+
+    def _gc(self, max_age: float) -> int:
+        with self._lock:
+            stale = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT trace_id FROM runs WHERE updated < ?",
+                    (time.time() - max_age,),
+                )
+            ]
+        if stale:
+            self._delete(stale)
+        return len(stale)
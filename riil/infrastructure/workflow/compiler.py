@@ -0,0 +1,301 @@
+# riil/infrastructure/workflow/compiler.py
+"""
+Compiles validated workflow specs into an immutable, reusable form:
+prompt templates parsed once and provider factories resolved once.
+A compiled workflow builds fresh Workflow instances cheaply.
+"""
+
+import functools
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Set, Tuple
+
+from riil.config.schema import MapSpec, StepSpec, WorkflowSpec
+from riil.core.callback import Callback
+from riil.core.checkpoint import CheckpointStore
+from riil.domain.map import REDUCERS, MapStep, Reducer, WorkflowStep
+from riil.domain.prompt import PromptTemplate, extract_variables
+from riil.domain.step import Step
+from riil.domain.workflow import Workflow
+from riil.infrastructure.llms.resolver import get_step_factory
+from riil.infrastructure.rules.loader import RulePrefix, get_rule_index, rules_dir
+from riil.infrastructure.utils.plugins import load_target
+from riil.infrastructure.workflow.postprocess import PostprocessStep
+
+
+@dataclass(frozen=True)
+class CompiledMap:
+    spec: MapSpec
+    reducer: Callable[[], Reducer]
+
+    def wrap(self, item_step: Step, output_key: str) -> MapStep:
+        return MapStep(
+            item_step,
+            over=self.spec.over,
+            item_key=self.spec.as_,
+            output_key=output_key,
+            concurrency=self.spec.concurrency,
+            retries=self.spec.retries,
+            on_error=self.spec.on_error,
+            reducer=self.reducer,
+            ordered=self.spec.ordered,
+        )
+
+
+@dataclass(frozen=True)
+class CompiledStep:
+    index: int
+    provider: str
+    factory: Callable[[Dict[str, Any]], Step]
+    template: Optional[PromptTemplate]
+    config: Mapping[str, Any]
+    stream: bool = False
+    map: Optional[CompiledMap] = None
+    postprocess: Optional[Callable[[Any], Any]] = None
+    timeout: Optional[float] = None
+
+    def build(self) -> Step:
+        try:
+            step = self.factory({**self.config, "template": self.template})
+            if self.postprocess is not None:
+                # Applied per item in map steps, so CPU-bound hooks run in parallel
+                step = PostprocessStep(
+                    step, self.postprocess, self.config.get("offload")
+                )
+            if self.map is not None:
+                step = self.map.wrap(step, self.config["output_key"])
+        except Exception as e:
+            raise ValueError(
+                f"Failed to create step {self.index}"
+                f" with provider '{self.provider}': {str(e)}"
+            ) from e
+        if self.stream:
+            step.stream_events = True
+        if self.timeout is not None:
+            step.timeout = self.timeout
+        return step
+
+
+@dataclass(frozen=True)
+class CompiledWorkflow:
+    spec: WorkflowSpec
+    source: Optional[Path]
+    digest: str
+    steps: Tuple[CompiledStep, ...]
+    required_inputs: FrozenSet[str]
+    # Step outputs a run returns; None when the spec keeps the full context
+    outputs: Optional[FrozenSet[str]] = None
+
+    @property
+    def name(self) -> str:
+        return self.spec.name
+
+    def instantiate(
+        self,
+        callbacks: Optional[List[Callback]] = None,
+        checkpoints: Optional[CheckpointStore] = None,
+        keep_context: bool = False,
+    ) -> Workflow:
+        """
+        Build a new executable Workflow; compiled parts are shared. Unless
+        `keep_context`, its runs free intermediate outputs early and return
+        only `outputs`.
+        """
+        wf = Workflow(
+            self.spec.name,
+            callbacks=callbacks,
+            max_concurrency=self.spec.max_concurrency,
+            checkpoints=checkpoints,
+            timeout=self.spec.timeout,
+            outputs=None if keep_context else self.outputs,
+        )
+        for step in self.steps:
+            wf.add_step(step.build())
+        return wf
+
+
+def compile_spec(
+    spec: WorkflowSpec, source: Optional[Path] = None, digest: str = ""
+) -> CompiledWorkflow:
+    """
+    Validate step configs, parse prompts and resolve providers.
+    Raises ValueError with the offending step index.
+    """
+    steps = []
+    for idx, step_spec in enumerate(spec.steps):
+        if step_spec.map is not None and step_spec.map.workflow:
+            steps.append(_compile_sub_workflow_map(step_spec, source, idx))
+            continue
+        config = _build_step_config(step_spec, source, idx)
+        llm = step_spec.llm
+        assert llm is not None  # checked by _build_step_config
+        try:
+            factory = get_step_factory(llm.provider)
+            template = PromptTemplate(step_spec.prompt)
+            if step_spec.rules:
+                index = get_rule_index(rules_dir(source))
+                config["rules"] = RulePrefix(index, step_spec.rules)
+            compiled_map = (
+                _compile_map(step_spec.map) if step_spec.map is not None else None
+            )
+            postprocess = (
+                load_target(step_spec.postprocess) if step_spec.postprocess else None
+            )
+        except Exception as e:
+            raise ValueError(
+                f"Failed to create step {idx} with provider '{llm.provider}': {str(e)}"
+            ) from e
+        steps.append(
+            CompiledStep(
+                idx,
+                llm.provider,
+                factory,
+                template,
+                MappingProxyType(config),
+                step_spec.stream,
+                compiled_map,
+                postprocess,
+                step_spec.timeout,
+            )
+        )
+
+    required = required_inputs(spec)
+    return CompiledWorkflow(
+        spec, source, digest, tuple(steps), required, returned_outputs(spec, required)
+    )
+
+
+def required_inputs(spec: WorkflowSpec) -> FrozenSet[str]:
+    """Prompt variables that no earlier step produces, i.e. the workflow's inputs."""
+    produced: Set[str] = set()
+    required: Set[str] = set()
+    for step_spec in spec.steps:
+        reads = set(extract_variables(step_spec.prompt))
+        if step_spec.map is not None:
+            # The item variable is bound per item; the list itself is an input
+            reads = (reads - {step_spec.map.as_}) | {step_spec.map.over}
+        required.update(v for v in reads if v not in produced)
+        produced.add(step_spec.output_key)
+    return frozenset(required)
+
+
+def returned_outputs(
+    spec: WorkflowSpec, required: FrozenSet[str]
+) -> Optional[FrozenSet[str]]:
+    """
+    The step outputs a run returns: the final step's, `output` (which the
+    CLI and the server print) and the spec's `outputs`. None with `keep_context`.
+    """
+    produced = {step_spec.output_key for step_spec in spec.steps}
+    for key in spec.outputs:
+        if key not in produced and key not in required:
+            raise ValueError(
+                f"Output '{key}' is neither written by a step nor an input"
+            )
+    if spec.keep_context:
+        return None
+    final = {spec.steps[-1].output_key} if spec.steps else set()
+    return frozenset(final | {"output"} | set(spec.outputs))
+
+
+def _compile_map(map_spec: MapSpec) -> CompiledMap:
+    """Resolve the reducer: a built-in or "module:factory", with {type, **options}."""
+    reduce = map_spec.reduce
+    options = dict(reduce) if isinstance(reduce, dict) else {"type": reduce}
+    name = options.pop("type", "collect")
+    if name in REDUCERS:
+        factory = REDUCERS[name]
+    elif ":" in name:
+        factory = load_target(name)
+    else:
+        raise ValueError(
+            f"Unknown reducer: {name} (use {', '.join(REDUCERS)} or module:factory)"
+        )
+    reducer = functools.partial(factory, **options)
+    # Bad options fail now rather than on the first run
+    reducer()
+    return CompiledMap(map_spec, reducer)
+
+
+def _compile_sub_workflow_map(
+    step_spec: StepSpec, source: Optional[Path], idx: int
+) -> CompiledStep:
+    """A map step whose items each run another workflow file."""
+    # The loader imports this module
+    from riil.infrastructure.workflow.loader import compile_workflow_file
+
+    map_spec = step_spec.map
+    if map_spec is None or not map_spec.workflow:
+        raise ValueError(f"Step {idx} does not map a workflow file")
+    path = Path(map_spec.workflow)
+    if source is not None and not path.is_absolute():
+        path = source.parent / path
+    try:
+        compile_workflow_file(path)
+        compiled_map = _compile_map(map_spec)
+        postprocess = (
+            load_target(step_spec.postprocess) if step_spec.postprocess else None
+        )
+    except Exception as e:
+        raise ValueError(
+            f"Failed to create step {idx}"
+            f" mapping workflow '{map_spec.workflow}': {str(e)}"
+        ) from e
+
+    def factory(config: Dict[str, Any]) -> WorkflowStep:
+        # Looked up on every build, so edits to the sub-workflow are picked up
+        sub = compile_workflow_file(path)
+        return WorkflowStep(sub.instantiate(), input_keys=set(sub.required_inputs))
+
+    config = {"output_key": step_spec.output_key, "offload": step_spec.offload}
+    return CompiledStep(
+        idx,
+        "workflow",
+        factory,
+        None,
+        MappingProxyType(config),
+        step_spec.stream,
+        compiled_map,
+        postprocess,
+        step_spec.timeout,
+    )
+
+
+def _build_step_config(
+    step_spec: StepSpec, source_path: Optional[Path], step_index: int
+) -> Dict[str, Any]:
+    """
+    Build the configuration dictionary for resolve_step.
+    Extracts prompt, model, output_key, and provider-specific config.
+    """
+    if not step_spec.prompt or not step_spec.prompt.strip():
+        raise ValueError(
+            f"Step {step_index} in {source_path} is missing or empty 'prompt' field"
+        )
+
+    llm = step_spec.llm
+    if llm is None:
+        raise ValueError(f"Step {step_index} in {source_path} is missing 'llm'")
+
+    if not llm.provider:
+        raise ValueError(
+            f"Step {step_index} in {source_path} is missing 'llm.provider'"
+        )
+
+    if not llm.model:
+        raise ValueError(f"Step {step_index} in {source_path} is missing 'llm.model'")
+
+    config: Dict[str, Any] = {
+        "prompt": step_spec.prompt,
+        "model": llm.model,
+        "output_key": step_spec.output_key,
+        "config": llm.config,
+    }
+    if step_spec.output_schema:
+        config["output_schema"] = step_spec.output_schema
+        config["max_retries"] = step_spec.max_retries
+        config["max_output_chars"] = step_spec.max_output_chars
+    if step_spec.offload:
+        config["offload"] = step_spec.offload
+    return config
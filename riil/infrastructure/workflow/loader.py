@@ -2,16 +2,23 @@
 """
 Loads and validates workflows from YAML/JSON files.
 Maps configuration to executable Workflow objects.
+
+Compiled workflows are cached in memory by file mtime/size and content hash,
+so loading the same file again only costs a `stat`.
 """
 
+import hashlib
 from pathlib import Path
 import yaml
-from typing import Dict, Any
+from typing import Dict, Optional, Tuple
 from pydantic import ValidationError
 
-from riil.config.schema import WorkflowSpec, StepSpec
+from riil.config.schema import WorkflowSpec
 from riil.domain.workflow import Workflow
-from riil.infrastructure.llms.resolver import resolve_step
+from riil.infrastructure.workflow.compiler import CompiledWorkflow, compile_spec
+
+# resolved path -> ((mtime_ns, size), compiled)
+_compiled: Dict[str, Tuple[Tuple[int, int], CompiledWorkflow]] = {}
 
 
 def load_workflow_from_yaml(path: Path) -> Workflow:
@@ -26,59 +33,79 @@ def load_workflow_from_yaml(path: Path) -> Workflow:
         ValueError: If file is invalid, missing, or config is malformed
         IOError: If file cannot be read
     """
+    compiled = compile_workflow_file(path)
+    try:
+        return compiled.instantiate()
+    except Exception as e:
+        raise ValueError(f"Failed to load workflow from {path}: {str(e)}") from e
+
+
+def compile_workflow_file(
+    path: Path,
+    spec: Optional[WorkflowSpec] = None,
+    digest: str = "",
+    stamp: Optional[Tuple[int, int]] = None,
+) -> CompiledWorkflow:
+    """
+    Return the compiled form of a workflow file, reusing the cached one while
+    the file is unchanged. `spec`/`digest` may come from the catalog index to
+    skip re-parsing a file it has already validated; with the `stamp`
+    (mtime_ns, size) they were read at, they are ignored once the file has
+    changed since.
+    """
     if not path.exists():
         raise ValueError(f"Workflow file not found: {path}")
 
-    try:
-        raw_text = path.read_text(encoding="utf-8")
-        data = yaml.safe_load(raw_text)
-        if not data:
-            raise ValueError("YAML file is empty")
-
-        # Validate against schema
-        spec = WorkflowSpec.model_validate(data)
+    stat = path.stat()
+    current = (stat.st_mtime_ns, stat.st_size)
+    key = str(path.resolve())
+    cached = _compiled.get(key)
+    if cached is not None and cached[0] == current:
+        return cached[1]
+    if stamp is not None and stamp != current:
+        # Indexed before the last edit: read the file as it is now
+        spec = None
+
+    if spec is None:
+        try:
+            raw_text = path.read_text(encoding="utf-8")
+        except OSError as e:
+            raise ValueError(f"Failed to load workflow from {path}: {str(e)}") from e
+        digest = content_digest(raw_text)
+        # Touched but unchanged: keep the compiled workflow
+        if cached is not None and cached[1].digest == digest:
+            _compiled[key] = (current, cached[1])
+            return cached[1]
+        spec = parse_workflow_spec(raw_text, path)
 
-        # Create workflow
-        wf = Workflow(spec.name)
+    try:
+        compiled = compile_spec(spec, path, digest)
+    except ValueError as e:
+        raise ValueError(f"Failed to load workflow from {path}: {str(e)}") from e
 
-        # Load and add each step
-        for idx, step_spec in enumerate(spec.steps):
-            step_config = _build_step_config(step_spec, path, idx)
-            try:
-                llm_step = resolve_step(step_spec.llm.provider, step_config)
-                wf.add_step(llm_step)
-            except Exception as e:
-                raise ValueError(f"Failed to create step {idx} with provider '{step_spec.llm.provider}': {str(e)}") from e
+    _compiled[key] = (current, compiled)
+    return compiled
 
-        return wf
 
+def parse_workflow_spec(raw_text: str, path: Path) -> WorkflowSpec:
+    """Parse and validate YAML text against the WorkflowSpec schema."""
+    try:
+        data = yaml.safe_load(raw_text)
     except yaml.YAMLError as e:
         raise ValueError(f"Invalid YAML syntax in {path}: {str(e)}") from e
+    if not data:
+        raise ValueError(f"Failed to load workflow from {path}: YAML file is empty")
+
+    try:
+        return WorkflowSpec.model_validate(data)
     except ValidationError as e:
         raise ValueError(f"Workflow validation error in {path}: {e}") from e
-    except Exception as e:
-        if "Workflow file not found" not in str(e):
-            raise ValueError(f"Failed to load workflow from {path}: {str(e)}") from e
-        raise
-
 
-def _build_step_config(step_spec: StepSpec, source_path: Path, step_index: int) -> Dict[str, Any]:
-    """
-    Build the configuration dictionary for resolve_step.
-    Extracts prompt, model, output_key, and provider-specific config.
-    """
-    if not step_spec.prompt or not step_spec.prompt.strip():
-        raise ValueError(f"Step {step_index} in {source_path} is missing or empty 'prompt' field")
 
-    if not step_spec.llm.provider:
-        raise ValueError(f"Step {step_index} in {source_path} is missing 'llm.provider'")
+def content_digest(raw_text: str) -> str:
+    return hashlib.sha256(raw_text.encode("utf-8")).hexdigest()
 
-    if not step_spec.llm.model:
-        raise ValueError(f"Step {step_index} in {source_path} is missing 'llm.model'")
 
-    return {
-        "prompt": step_spec.prompt,
-        "model": step_spec.llm.model,
-        "output_key": step_spec.output_key,
-        "config": step_spec.llm.config
-    }
\ No newline at end of file
+def clear_workflow_cache() -> None:
+    """Drop every compiled workflow (e.g. after registering new providers)."""
+    _compiled.clear()
@@ -0,0 +1,32 @@
+# riil/infrastructure/workflow/postprocess.py
+"""
+Post-processing hooks: a synchronous `function(output) -> output` applied
+to a step's output, inline or in a shared worker pool (see
+riil.infrastructure.utils.offload) when the hook is CPU-bound.
+"""
+
+from typing import Any, Callable, Optional
+
+from riil.domain.step import Step
+from riil.domain.types import Inputs, Outputs
+from riil.infrastructure.utils.offload import call_hook
+
+
+class PostprocessStep(Step):
+    def __init__(
+        self, step: Step, hook: Callable[[Any], Any], offload: Optional[str] = None
+    ):
+        self.step = step
+        self.hook = hook
+        self.offload = offload
+        self.input_keys = step.input_keys
+        self.output_key = getattr(step, "output_key", "output")
+        self.prompt = getattr(step, "prompt", None)
+        self.model = getattr(step, "model", "")
+
+    async def run(self, inputs: Inputs) -> Outputs:
+        result = await self.step.run(inputs)
+        return {
+            **result,
+            "output": await call_hook(self.hook, result["output"], mode=self.offload),
+        }
@@ -3,18 +3,27 @@
 CLI interface for eko-py.
 Automatically loads .env file for local development.
 """
-from typing import List
+
+from typing import TYPE_CHECKING, Any, Awaitable, Dict, List, Optional, TypeVar
 
 import typer
 import asyncio
+import json
 import os
+import signal
+import sys
+import time
+import uuid
 from dotenv import load_dotenv  # ← Add this
 from pathlib import Path
 
-from riil.domain.workflow import Workflow
-from riil.infrastructure.llms.openai import OpenAIStep
-from riil.usecases.execute_workflow import execute_workflow
-from riil.infrastructure.workflow.loader import load_workflow_from_yaml
+# Engine modules are imported inside the commands that use them, so that
+# `riil --help` or `riil version` does not load openai, httpx or pydantic.
+# tests/test_interface/test_startup.py holds the import-time budget.
+if TYPE_CHECKING:
+    from riil.core.callback import Callback
+    from riil.infrastructure.workflow.compiler import CompiledWorkflow
+    from riil.usecases.execute_batch import BatchResult, BatchStats
 
 # Load .env file if it exists (development only)
 if os.path.exists(".env"):
@@ -22,21 +31,164 @@ if os.path.exists(".env"):
 
 app = typer.Typer()
 
+T = TypeVar("T")
+
+
+def _run(coro: Awaitable[T]) -> T:
+    """
+    Run a coroutine, then flush log sinks, close pooled LLM clients and stop
+    offload worker pools before the loop shuts down.
+    """
+
+    async def _main() -> T:
+        try:
+            return await coro
+        finally:
+            # Only modules the command loaded can hold anything open
+            sink = sys.modules.get("riil.infrastructure.callbacks.sink")
+            clients = sys.modules.get("riil.infrastructure.llms.clients")
+            cache = sys.modules.get("riil.infrastructure.llms.cache")
+            pools = sys.modules.get("riil.infrastructure.utils.offload")
+            if sink:
+                await sink.close_sinks()
+            if clients:
+                await clients.close_clients()
+            if cache:
+                cache.close_caches()
+            if pools:
+                pools.shutdown_offload()
+
+    return asyncio.run(_main())
+
+
+def _configure_cache(cache: Optional[bool], cache_path: Optional[Path]) -> None:
+    """Apply the global --cache/--no-cache and --cache-path flags."""
+    if (
+        cache is None
+        and cache_path is None
+        and "riil.infrastructure.llms.cache" not in sys.modules
+    ):
+        # Nothing to override, and nothing earlier in this process overrode it
+        return
+    from riil.infrastructure.llms.cache import configure_cache
+
+    if cache_path is not None and cache is None:
+        cache = True
+    configure_cache(cache, **({"path": str(cache_path)} if cache_path else {}))
+
+
+CACHE_OPTION = typer.Option(
+    None,
+    "--cache/--no-cache",
+    help="Cache LLM responses for all steps, or bypass the cache everywhere",
+)
+CACHE_PATH_OPTION = typer.Option(
+    None, help="SQLite file for the persistent response cache"
+)
+DIR_OPTION = typer.Option(
+    Path("workflows"), "--dir", help="Workflows directory used to resolve names"
+)
+METRICS_OPTION = typer.Option(
+    None, "--metrics", help="Write Prometheus metrics to this file when done"
+)
+CHECKPOINT_PATH_OPTION = typer.Option(
+    Path(".riil/checkpoints.sqlite"), help="SQLite file holding run checkpoints"
+)
+METRICS_PORT_OPTION = typer.Option(
+    None,
+    "--metrics-port",
+    help="Serve Prometheus metrics on localhost:PORT/metrics while running",
+)
+TIMEOUT_OPTION = typer.Option(
+    None,
+    "--timeout",
+    help="Seconds a run may take before it is cancelled"
+    " (default: the workflow's `timeout`)",
+)
+KEEP_CONTEXT_OPTION = typer.Option(
+    False,
+    "--keep-context",
+    help="Keep every step's output in the results instead of freeing intermediate ones",
+)
+
+
+def _callbacks(
+    metrics: Optional[Path], metrics_port: Optional[int]
+) -> List["Callback"]:
+    if not (metrics or metrics_port):
+        return []
+    from riil.infrastructure.callbacks.metrics import MetricsCallback
+
+    return [MetricsCallback()]
+
+
+async def _observed(
+    coro: Awaitable[T], metrics: Optional[Path], metrics_port: Optional[int]
+) -> T:
+    """Await `coro` while serving metrics, then write them out."""
+    if not (metrics or metrics_port):
+        return await coro
+    from riil.infrastructure.callbacks.metrics import serve_metrics, write_metrics
+
+    server = await serve_metrics(metrics_port) if metrics_port else None
+    try:
+        return await coro
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        if metrics:
+            write_metrics(str(metrics))
+
+
+def _parse_inputs(inputs: Optional[List[str]]) -> Dict[str, Any]:
+    """Parse key=value or --key=value arguments."""
+    parsed_inputs: Dict[str, Any] = {}
+    if inputs:
+        for item in inputs:
+            if "=" not in item:
+                typer.echo(f"❌ Invalid input format: {item}. Use key=value")
+                raise typer.Exit(1)
+            # Strip leading -- if present
+            if item.startswith("--"):
+                item = item[2:]
+            k, v = item.split("=", 1)
+            parsed_inputs[k] = v
+    return parsed_inputs
+
+
+def _compile_target(file: Path, dir: Path) -> "CompiledWorkflow":
+    """Compile a workflow given as a YAML path or as a name from the catalog."""
+    from riil.infrastructure.workflow.catalog import WorkflowCatalog
+    from riil.infrastructure.workflow.loader import compile_workflow_file
+
+    if file.exists():
+        return compile_workflow_file(file)
+    entry = WorkflowCatalog(dir).find(str(file))
+    if entry is None:
+        typer.echo(f"❌ Workflow not found: {file}")
+        raise typer.Exit(1)
+    return WorkflowCatalog(dir).compile(entry)
+
 
 @app.command()
-def run_joke(topic: str = "AI"):
+def run_joke(topic: str = "AI") -> None:
     """Run joke workflow."""
+    from riil.domain.workflow import Workflow
+    from riil.infrastructure.llms.openai import OpenAIStep
+    from riil.usecases.execute_workflow import execute_workflow
+
     wf = Workflow("joke")
     wf.add_step(OpenAIStep("Tell me a joke about {topic}", output_key="joke"))
     try:
-        result = asyncio.run(execute_workflow(wf, {"topic": topic}))
+        result = _run(execute_workflow(wf, {"topic": topic}))
         typer.echo("\n" + result["joke"] + "\n")
     except Exception as e:
         typer.echo(f"❌ Error: {str(e)}", err=True)
 
 
 @app.command()
-def version():
+def version() -> None:
     """Show version."""
     typer.echo("eko-py v0.1.0 (M1)")
 
@@ -44,75 +196,571 @@ def version():
 @app.command()
 def run(
     file: Path,
-    inputs: List[str] = typer.Argument(None, help="Inputs in key=value format")
-):
+    inputs: List[str] = typer.Argument(None, help="Inputs in key=value format"),
+    cache: Optional[bool] = CACHE_OPTION,
+    cache_path: Optional[Path] = CACHE_PATH_OPTION,
+    dir: Path = DIR_OPTION,
+    metrics: Optional[Path] = METRICS_OPTION,
+    metrics_port: Optional[int] = METRICS_PORT_OPTION,
+    checkpoint: bool = typer.Option(
+        False,
+        "--checkpoint",
+        help="Save each step's output so a failed run can be resumed",
+    ),
+    resume: Optional[str] = typer.Option(
+        None, "--resume", help="Finish a failed --checkpoint run, given its trace id"
+    ),
+    checkpoint_path: Path = CHECKPOINT_PATH_OPTION,
+    timeout: Optional[float] = TIMEOUT_OPTION,
+    keep_context: bool = KEEP_CONTEXT_OPTION,
+) -> None:
     """
-    Run a workflow from YAML file.
+    Run a workflow from a YAML file or by name.
     Accepts: key=value or --key=value
     """
-    if not file.exists():
-        typer.echo(f"❌ Workflow not found: {file}")
+    from riil.domain.workflow import StepTimeoutError
+    from riil.usecases.execute_workflow import execute_workflow
+
+    parsed_inputs = _parse_inputs(inputs)
+    _configure_cache(cache, cache_path)
+    store = None
+    trace_id = resume
+    try:
+        compiled = _compile_target(file, dir)
+        missing = sorted(compiled.required_inputs - set(parsed_inputs))
+        # A resumed run uses the inputs it was started with
+        if missing and not resume:
+            typer.echo(f"❌ Missing inputs: {', '.join(missing)}", err=True)
+            raise typer.Exit(1)
+        if checkpoint or resume:
+            from riil.infrastructure.workflow.checkpoints import SQLiteCheckpointStore
+
+            store = SQLiteCheckpointStore(checkpoint_path)
+            trace_id = trace_id or str(uuid.uuid4())
+        wf = compiled.instantiate(
+            _callbacks(metrics, metrics_port),
+            checkpoints=store,
+            keep_context=keep_context,
+        )
+        coro = (
+            wf.resume(resume, timeout)
+            if resume
+            else execute_workflow(wf, parsed_inputs, trace_id, timeout)
+        )
+        result = _run(_observed(coro, metrics, metrics_port))
+        typer.echo("\n" + result["output"] + "\n")
+    except typer.Exit:
+        raise
+    except StepTimeoutError as e:
+        typer.echo(f"⏱️ {str(e)}", err=True)
+        done = [
+            k for k in e.context if not k.startswith("__") and k not in parsed_inputs
+        ]
+        typer.echo(f"   Completed: {', '.join(done) or 'nothing'}", err=True)
+        if store is not None:
+            typer.echo(
+                f"💾 Completed steps are saved."
+                f" Resume with: riil run {file} --resume {trace_id}",
+                err=True,
+            )
         raise typer.Exit(1)
+    except Exception as e:
+        typer.echo(f"❌ Error: {str(e)}", err=True)
+        if store is not None:
+            typer.echo(
+                f"💾 Completed steps are saved."
+                f" Resume with: riil run {file} --resume {trace_id}",
+                err=True,
+            )
+        raise typer.Exit(1)
+    finally:
+        if store is not None:
+            store.close()
 
-    # Parse key=value or --key=value
-    parsed_inputs = {}
-    if inputs:
-        for item in inputs:
-            if "=" not in item:
-                typer.echo(f"❌ Invalid input format: {item}. Use key=value")
-                raise typer.Exit(1)
-            # Strip leading -- if present
-            if item.startswith("--"):
-                item = item[2:]
-            k, v = item.split("=", 1)
-            parsed_inputs[k] = v
 
+@app.command()
+def profile(
+    file: Path,
+    inputs: List[str] = typer.Argument(None, help="Inputs in key=value format"),
+    runs: int = typer.Option(1, help="Concurrent runs to record"),
+    stall_ms: float = typer.Option(
+        50.0, "--stall-ms", help="Report event-loop stalls longer than this"
+    ),
+    trace: Path = typer.Option(
+        Path(".riil/profile.json"),
+        "--trace",
+        help="Chrome trace file (open in Perfetto)",
+    ),
+    cache: Optional[bool] = CACHE_OPTION,
+    cache_path: Optional[Path] = CACHE_PATH_OPTION,
+    dir: Path = DIR_OPTION,
+) -> None:
+    """Profile a workflow: print a waterfall per run and write a Chrome trace."""
+    from riil.infrastructure.utils.profiler import chrome_trace, waterfall
+    from riil.usecases.profile_workflow import profile_workflow
+
+    parsed_inputs = _parse_inputs(inputs)
+    _configure_cache(cache, cache_path)
     try:
-        wf = load_workflow_from_yaml(file)
-        result = asyncio.run(execute_workflow(wf, parsed_inputs))
-        typer.echo("\n" + result["output"] + "\n")
+        compiled = _compile_target(file, dir)
+        missing = sorted(compiled.required_inputs - set(parsed_inputs))
+        if missing:
+            typer.echo(f"❌ Missing inputs: {', '.join(missing)}", err=True)
+            raise typer.Exit(1)
+        recorder = _run(
+            profile_workflow(
+                compiled.instantiate(), parsed_inputs, runs, stall_ms / 1000
+            )
+        )
+    except typer.Exit:
+        raise
     except Exception as e:
         typer.echo(f"❌ Error: {str(e)}", err=True)
         raise typer.Exit(1)
 
+    typer.echo(waterfall(recorder))
+    trace.parent.mkdir(parents=True, exist_ok=True)
+    trace.write_text(json.dumps(chrome_trace(recorder)), encoding="utf-8")
+    failed = sum(1 for s in recorder.spans if s.parent is None and "error" in s.attrs)
+    if failed:
+        typer.echo(f"❌ {failed} of {runs} runs failed", err=True)
+    if recorder.stalls:
+        typer.echo(f"⚠️  {len(recorder.stalls)} event-loop stalls over {stall_ms:g} ms")
+    typer.echo(f"✅ Trace written to {trace} (open in https://ui.perfetto.dev)")
+
+
+@app.command()
+def checkpoints(
+    checkpoint_path: Path = CHECKPOINT_PATH_OPTION,
+    prune: Optional[float] = typer.Option(
+        None, help="First delete runs not updated for this many hours"
+    ),
+) -> None:
+    """List checkpointed runs that can be resumed."""
+    if not checkpoint_path.exists():
+        typer.echo("💾 No checkpoints")
+        return
+    from riil.infrastructure.workflow.checkpoints import SQLiteCheckpointStore
+
+    store = SQLiteCheckpointStore(checkpoint_path)
+    try:
+        if prune is not None:
+            removed = _run(store.gc(prune * 3600))
+            typer.echo(f"🧹 Deleted {removed} old runs")
+        runs = store.runs()
+    finally:
+        store.close()
+    if not runs:
+        typer.echo("💾 No checkpoints")
+        return
+    typer.echo("💾 Resumable runs:")
+    for r in runs:
+        updated = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r["updated_at"]))
+        typer.echo(
+            f"  {r['trace_id']}  {r['workflow']}  {r['steps']} steps done"
+            f"  (updated {updated})"
+        )
+
+
+@app.command()
+def run_batch(
+    file: Path,
+    input: Optional[Path] = typer.Option(
+        None, "--input", "-i", help="JSONL input records (default: stdin)"
+    ),
+    output: Optional[Path] = typer.Option(
+        None, "--output", "-o", help="JSONL results file (default: stdout)"
+    ),
+    concurrency: int = typer.Option(8, help="Maximum workflow runs in flight"),
+    ordered: bool = typer.Option(
+        True, "--ordered/--unordered", help="Write results in input or completion order"
+    ),
+    progress: float = typer.Option(
+        5.0, help="Seconds between progress reports on stderr (0 to disable)"
+    ),
+    cache: Optional[bool] = CACHE_OPTION,
+    cache_path: Optional[Path] = CACHE_PATH_OPTION,
+    dir: Path = DIR_OPTION,
+    metrics: Optional[Path] = METRICS_OPTION,
+    metrics_port: Optional[int] = METRICS_PORT_OPTION,
+    timeout: Optional[float] = TIMEOUT_OPTION,
+    keep_context: bool = KEEP_CONTEXT_OPTION,
+) -> None:
+    """
+    Run a workflow once per JSONL input record.
+    The workflow is loaded once; failed records are reported, not fatal.
+    """
+    from riil.usecases.execute_batch import execute_batch, stream_jsonl
+
+    if input is not None and not input.exists():
+        typer.echo(f"❌ Input not found: {input}")
+        raise typer.Exit(1)
+    _configure_cache(cache, cache_path)
+
+    try:
+        wf = _compile_target(file, dir).instantiate(
+            _callbacks(metrics, metrics_port), keep_context=keep_context
+        )
+    except typer.Exit:
+        raise
+    except Exception as e:
+        typer.echo(f"❌ Error: {str(e)}", err=True)
+        raise typer.Exit(1)
+
+    src = input.open(encoding="utf-8") if input else sys.stdin
+    dst = output.open("w", encoding="utf-8") if output else sys.stdout
+
+    def _write(result: "BatchResult") -> None:
+        dst.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+
+    def _progress(stats: "BatchStats") -> None:
+        dst.flush()
+        typer.echo(f"⏱️ {stats.summary()}", err=True)
+
+    try:
+        stats = _run(
+            _observed(
+                execute_batch(
+                    wf,
+                    stream_jsonl(src),
+                    on_result=_write,
+                    concurrency=concurrency,
+                    ordered=ordered,
+                    on_progress=_progress if progress > 0 else None,
+                    progress_interval=progress,
+                    timeout=timeout,
+                ),
+                metrics,
+                metrics_port,
+            )
+        )
+    finally:
+        if input:
+            src.close()
+        if output:
+            dst.close()
+        else:
+            dst.flush()
+
+    if stats.failed:
+        typer.echo(f"❌ {stats.failed} of {stats.completed} records failed", err=True)
+        raise typer.Exit(1)
+
+
+@app.command()
+def run_offline(
+    file: Path,
+    input: Optional[Path] = typer.Option(
+        None,
+        "--input",
+        "-i",
+        help="JSONL input records (read once; ignored when resuming)",
+    ),
+    output: Optional[Path] = typer.Option(
+        None, "--output", "-o", help="JSONL results file (default: stdout)"
+    ),
+    work_dir: Path = typer.Option(
+        ...,
+        "--work-dir",
+        help="Job state and batch files; rerun with the same directory to resume",
+    ),
+    transport: str = typer.Option(
+        "openai", help="Batch transport: 'openai' or 'dir:PATH' for a local stand-in"
+    ),
+    poll_interval: float = typer.Option(
+        60.0, help="Seconds between batch status checks"
+    ),
+    dir: Path = DIR_OPTION,
+) -> None:
+    """
+    Run a workflow over JSONL records through the provider's batch API.
+    Slower than run-batch but cheaper; each step layer is one round of batches.
+    """
+    from riil.infrastructure.llms.batch import get_batch_transport
+    from riil.usecases.execute_batch import read_jsonl
+    from riil.usecases.execute_offline import execute_offline
+
+    if input is not None and not input.exists():
+        typer.echo(f"❌ Input not found: {input}")
+        raise typer.Exit(1)
+    try:
+        wf = _compile_target(file, dir).instantiate()
+        batch_transport = get_batch_transport(transport)
+    except typer.Exit:
+        raise
+    except Exception as e:
+        typer.echo(f"❌ Error: {str(e)}", err=True)
+        raise typer.Exit(1)
+
+    src = input.open(encoding="utf-8") if input else sys.stdin
+    dst = output.open("w", encoding="utf-8") if output else sys.stdout
+
+    def _write(result: "BatchResult") -> None:
+        dst.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+
+    try:
+        stats = _run(
+            execute_offline(
+                wf,
+                read_jsonl(src),
+                on_result=_write,
+                work_dir=work_dir,
+                transport=batch_transport,
+                poll_interval=poll_interval,
+                on_status=lambda message: typer.echo(f"📦 {message}", err=True),
+            )
+        )
+    except Exception as e:
+        typer.echo(f"❌ Error: {str(e)}", err=True)
+        raise typer.Exit(1)
+    finally:
+        if input:
+            src.close()
+        if output:
+            dst.close()
+        else:
+            dst.flush()
+
+    typer.echo(f"⏱️ {stats.summary()}", err=True)
+    if stats.failed:
+        typer.echo(f"❌ {stats.failed} of {stats.completed} records failed", err=True)
+        raise typer.Exit(1)
+
+
 @app.command()
 def stream(
     file: Path,
-    **inputs: str
-):
+    inputs: List[str] = typer.Argument(None, help="Inputs in key=value format"),
+    events: bool = typer.Option(
+        False, "--events", help="Also show intermediate step output on stderr"
+    ),
+    dir: Path = DIR_OPTION,
+    metrics: Optional[Path] = METRICS_OPTION,
+) -> None:
     """Stream a workflow's output token by token."""
-    if not file.exists():
-        typer.echo(f"❌ Workflow not found: {file}")
-        raise typer.Exit(1)
+    parsed_inputs = _parse_inputs(inputs)
     try:
-        wf = load_workflow_from_yaml(file)
+        wf = _compile_target(file, dir).instantiate(_callbacks(metrics, None))
         typer.echo("💬 Streaming response...\n")
-        async def _stream():
-            async for token in wf.stream(inputs):
-                print(token, end="", flush=True)
+        last = len(wf.steps) - 1
+
+        async def _stream() -> None:
+            async for event in wf.events(parsed_inputs):
+                if event["type"] == "token" and event["step"] == last:
+                    print(event["text"], end="", flush=True)
+                elif not events or event.get("step") == last:
+                    continue
+                elif event["type"] == "token":
+                    print(event["text"], end="", flush=True, file=sys.stderr)
+                elif event["type"] == "step_end":
+                    typer.echo(f"\n✅ {event['output_key']} done", err=True)
             print()
-        asyncio.run(_stream())
+
+        _run(_observed(_stream(), metrics, None))
+    except typer.Exit:
+        raise
+    except Exception as e:
+        typer.echo(f"❌ Error: {str(e)}", err=True)
+        raise typer.Exit(1)
+
+
+@app.command()
+def serve(
+    dir: Path = DIR_OPTION,
+    host: str = typer.Option("127.0.0.1", help="Address to listen on"),
+    port: int = typer.Option(8000, help="Port to listen on"),
+    concurrency: int = typer.Option(64, help="Maximum workflow runs in flight"),
+    queue: int = typer.Option(
+        256, help="Runs allowed to wait for a slot before answering 503"
+    ),
+    workflow_concurrency: Optional[int] = typer.Option(
+        None, help="Maximum runs in flight per workflow"
+    ),
+    reload_interval: float = typer.Option(
+        1.0, help="Seconds between checks for changed workflow files (0 to disable)"
+    ),
+    drain_timeout: float = typer.Option(
+        30.0, help="Seconds to let running requests finish on shutdown"
+    ),
+    timeout: Optional[float] = typer.Option(
+        None, "--timeout", help="Longest a request's run may take, in seconds"
+    ),
+    keep_context: bool = KEEP_CONTEXT_OPTION,
+    cache: Optional[bool] = CACHE_OPTION,
+    cache_path: Optional[Path] = CACHE_PATH_OPTION,
+) -> None:
+    """
+    Serve the workflows in a directory over HTTP, kept loaded between requests.
+    Stops on SIGINT/SIGTERM after draining running requests.
+    """
+    from riil.infrastructure.callbacks.metrics import MetricsCallback
+    from riil.interface.server import WorkflowServer
+
+    if not dir.exists():
+        typer.echo(f"❌ Workflows directory not found: {dir}")
+        raise typer.Exit(1)
+    _configure_cache(cache, cache_path)
+
+    async def _serve() -> None:
+        server = WorkflowServer(
+            dir,
+            max_concurrency=concurrency,
+            max_queue=queue,
+            workflow_concurrency=workflow_concurrency,
+            reload_interval=reload_interval,
+            callbacks=[MetricsCallback()],
+            request_timeout=timeout,
+            keep_context=keep_context,
+        )
+        await server.start(host, port)
+        typer.echo(
+            f"🚀 Serving {len(server.workflows)} workflows"
+            f" on http://{host}:{server.port}"
+        )
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+        typer.echo("🛑 Draining...")
+        await server.drain(drain_timeout)
+
+    try:
+        _run(_serve())
     except Exception as e:
         typer.echo(f"❌ Error: {str(e)}", err=True)
+        raise typer.Exit(1)
+
 
 @app.command()
-def list_workflows(
-    dir: Path = Path("workflows")
-):
+def list_workflows(dir: Path = Path("workflows")) -> None:
     """List all available workflows."""
+    from riil.infrastructure.workflow.catalog import WorkflowCatalog
+
     if not dir.exists():
         typer.echo("📁 No workflows/ directory")
         return
     typer.echo("📄 Available Workflows:")
-    for yml in sorted(dir.rglob("*.yaml")):
-        rel = yml.relative_to(dir.parent if dir.parent.exists() else Path("."))
-        typer.echo(f"  {rel}")
+    for entry in WorkflowCatalog(dir).refresh():
+        if entry.get("error"):
+            typer.echo(f"  ⚠️ {entry['path']}: {entry['error']}")
+            continue
+        tags = f" [{', '.join(entry['tags'])}]" if entry["tags"] else ""
+        inputs = ", ".join(entry["required_inputs"]) or "-"
+        typer.echo(f"  {entry['name']} v{entry['version']}{tags}  ({entry['path']})")
+        typer.echo(f"      inputs: {inputs}")
+
 
 @app.command()
-def import_workflow(
-    file: Path,
-    dest_dir: Path = Path("workflows/imported")
-):
+def stats(
+    file: Path = typer.Argument(
+        ..., help="Prometheus metrics file written by --metrics"
+    )
+) -> None:
+    """Summarize latency, TTFT, tokens, cache hits and errors per step and route."""
+    from riil.infrastructure.callbacks.metrics import (
+        parse_metrics,
+        summarize,
+        summarize_routes,
+    )
+
+    if not file.exists():
+        typer.echo(f"❌ File not found: {file}")
+        raise typer.Exit(1)
+    samples = parse_metrics(file.read_text(encoding="utf-8"))
+    rows = summarize(samples)
+    routes = summarize_routes(samples)
+    if not rows and not routes:
+        typer.echo("📊 No step metrics recorded")
+        return
+
+    def _ms(seconds: Optional[float]) -> str:
+        return "-" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+    if rows:
+        typer.echo("📊 Step metrics:")
+    for r in rows:
+        model = f" ({r['model']})" if r["model"] else ""
+        total = r["runs"] + r["errors"]
+        error_rate = r["errors"] / total if total else 0.0
+        hit_rate = r["cache_hits"] / r["runs"] if r["runs"] else 0.0
+        typer.echo(f"  {r['workflow']} › {r['step']}{model}")
+        typer.echo(
+            f"      runs {r['runs']}  errors {r['errors']} ({error_rate:.1%})"
+            f"  mean {_ms(r['mean'])}  p50 {_ms(r['p50'])}"
+            f"  p95 {_ms(r['p95'])}  ttft {_ms(r['ttft'])}"
+        )
+        typer.echo(
+            f"      tokens {r['prompt_tokens']} prompt"
+            f" / {r['completion_tokens']} completion"
+            f"  cache hits {r['cache_hits']} ({hit_rate:.1%})"
+        )
+
+    if routes:
+        typer.echo("🔀 Cascade routes:")
+    for r in routes:
+        reasons = ", ".join(f"{k} {v}" for k, v in sorted(r["reasons"].items()))
+        typer.echo(f"  {r['workflow']} › {r['step']} › {r['route']}")
+        typer.echo(
+            f"      attempts {r['attempts']}  accepted {r['accepted']}"
+            f" ({r['acceptance']:.1%})  rejected {r['rejected']}  errors {r['errors']}"
+            f"  mean {_ms(r['mean'])}  p95 {_ms(r['p95'])}"
+        )
+        if reasons:
+            typer.echo(f"      escalated by: {reasons}")
+
+
+@app.command()
+def bench(
+    only: Optional[str] = typer.Option(
+        None,
+        help="Comma-separated benchmarks to run"
+        " (load, overhead, concurrency, memory, ttft, offload)",
+    ),
+    quick: bool = typer.Option(
+        False, "--quick", help="Small workloads, for a smoke test"
+    ),
+    output: Path = typer.Option(
+        Path(".riil/bench.json"), "--output", "-o", help="JSON report file"
+    ),
+) -> None:
+    """Measure engine overhead against the fake LLM provider."""
+    from riil.usecases.benchmark import run_benchmarks
+
+    names = [n.strip() for n in only.split(",")] if only else None
+    try:
+        report = _run(run_benchmarks(names, quick=quick))
+    except ValueError as e:
+        typer.echo(f"❌ Error: {str(e)}", err=True)
+        raise typer.Exit(1)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    typer.echo(f"📊 riil {report['riil_version']} on Python {report['python']}")
+    for name, result in report["results"].items():
+        typer.echo(f"  {name}")
+        for key, value in result.items():
+            if isinstance(value, list):
+                for row in value:
+                    typer.echo(
+                        "      " + "  ".join(f"{k} {_fmt(v)}" for k, v in row.items())
+                    )
+            elif isinstance(value, dict):
+                typer.echo(
+                    f"      {key}: "
+                    + "  ".join(f"{k} {_fmt(v)}" for k, v in value.items())
+                )
+            else:
+                typer.echo(f"      {key}: {_fmt(value)}")
+    typer.echo(f"✅ Report written to {output}")
+
+
+def _fmt(value: Any) -> str:
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+
+@app.command()
+def import_workflow(file: Path, dest_dir: Path = Path("workflows/imported")) -> None:
     """Import a shared workflow."""
     if not file.exists():
         typer.echo(f"❌ File not found: {file}")
@@ -124,4 +772,4 @@ def import_workflow(
 
 
 if __name__ == "__main__":
-    app()
\ No newline at end of file
+    app()
@@ -0,0 +1,511 @@
+# riil/interface/server.py
+"""
+Long-lived HTTP server for running workflows.
+
+Workflows under a directory are compiled once and kept instantiated, so a
+request pays neither start-up, imports, YAML parsing nor client creation.
+The catalog is polled for changes and edited workflows are swapped in
+without dropping requests that are already running.
+
+    GET  /health                  status and load
+    GET  /workflows               loaded workflows and their inputs
+    GET  /metrics                 Prometheus metrics
+    POST /workflows/{name}/run    {"inputs": {...}, "stream": false, "timeout": 30}
+
+A run answers with `{"workflow", "output", "context"}`, or with a
+server-sent event stream of workflow events when `"stream": true` or the
+request accepts `text/event-stream`. The context holds the inputs and the
+workflow's `outputs`; with `keep_context`, every step's output. Runs
+beyond the concurrency limits queue; once the queue is full the server
+answers 503. A run that exceeds
+its timeout (the request's, capped by the server's) is cancelled and
+answers 504 with the step that ran out of time and the partial context.
+"""
+
+import asyncio
+import json
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from riil.core.callback import Callback
+from riil.domain.workflow import StepTimeoutError, Workflow
+from riil.infrastructure.callbacks.metrics import default_registry
+from riil.infrastructure.workflow.catalog import WorkflowCatalog
+from riil.infrastructure.workflow.compiler import CompiledWorkflow
+
+MAX_BODY_BYTES = 1 << 20
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class _Loaded:
+    __slots__ = ("compiled", "workflow", "path")
+
+    def __init__(self, compiled: CompiledWorkflow, workflow: Workflow, path: str):
+        self.compiled = compiled
+        self.workflow = workflow
+        self.path = path
+
+
+class WorkflowServer:
+    def __init__(
+        self,
+        root: Path,
+        max_concurrency: int = 64,
+        max_queue: int = 256,
+        workflow_concurrency: Optional[int] = None,
+        reload_interval: float = 1.0,
+        callbacks: Optional[List[Callback]] = None,
+        idle_timeout: float = 30.0,
+        request_timeout: Optional[float] = None,
+        keep_context: bool = False,
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must be >= 0")
+        if workflow_concurrency is not None and workflow_concurrency < 1:
+            raise ValueError("workflow_concurrency must be >= 1")
+        self.catalog = WorkflowCatalog(root)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.workflow_concurrency = workflow_concurrency
+        self.reload_interval = reload_interval
+        self.callbacks = callbacks or []
+        self.idle_timeout = idle_timeout
+        # Longest a run may take; requests can only ask for less
+        self.request_timeout = request_timeout
+        # Answer with every step's output rather than the workflow's outputs
+        self.keep_context = keep_context
+        self.workflows: Dict[str, _Loaded] = {}
+        self.running = 0
+        self.queued = 0
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._workflow_limits: Dict[str, asyncio.Semaphore] = {}
+        self._server: Optional[asyncio.Server] = None
+        self._watcher: "Optional[asyncio.Task[None]]" = None
+        self._draining = False
+        self._connections: "Set[asyncio.Task[Any]]" = set()
+        self._busy: "Set[asyncio.Task[Any]]" = set()
+
+    @property
+    def port(self) -> int:
+        if self._server is None:
+            raise RuntimeError("The server is not started")
+        return int(self._server.sockets[0].getsockname()[1])
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 8000
+    ) -> "WorkflowServer":
+        """Load the workflows and start listening."""
+        await self.reload()
+        self._server = await asyncio.start_server(self._serve, host, port)
+        if self.reload_interval > 0:
+            self._watcher = asyncio.create_task(self._watch())
+        return self
+
+    async def reload(self) -> List[str]:
+        """
+        Sync the loaded workflows with the catalog and return the names that
+        changed. A file that no longer loads keeps its previous version.
+        """
+        entries = await asyncio.to_thread(self.catalog.refresh)
+        loaded_by_path = {w.path: name for name, w in self.workflows.items()}
+        current: Dict[str, _Loaded] = {}
+        changed = []
+        for entry in entries:
+            previous_name = loaded_by_path.get(entry["path"])
+            previous = self.workflows.get(previous_name) if previous_name else None
+            if entry.get("error"):
+                _log(f"cannot load {entry['path']}: {entry['error']}")
+                if previous is not None:
+                    current[previous.compiled.name] = previous
+                continue
+            if previous is not None and previous.compiled.digest == entry["sha256"]:
+                current[previous.compiled.name] = previous
+                continue
+            try:
+                compiled = self.catalog.compile(entry)
+                loaded = _Loaded(
+                    compiled,
+                    compiled.instantiate(
+                        self.callbacks, keep_context=self.keep_context
+                    ),
+                    entry["path"],
+                )
+            except ValueError as e:
+                _log(str(e))
+                if previous is not None:
+                    current[previous.compiled.name] = previous
+                continue
+            current[compiled.name] = loaded
+            changed.append(compiled.name)
+        changed += [name for name in self.workflows if name not in current]
+        self.workflows = current
+        return changed
+
+    async def drain(self, timeout: float = 30.0) -> None:
+        """
+        Stop accepting connections, let running requests finish for up to
+        `timeout` seconds, then cancel whatever is left.
+        """
+        self._draining = True
+        if self._watcher is not None:
+            self._watcher.cancel()
+        if self._server is not None:
+            self._server.close()
+        # Idle keep-alive connections have nothing to finish
+        for task in self._connections - self._busy:
+            task.cancel()
+        pending = set(self._busy)
+        if pending:
+            _, pending = await asyncio.wait(pending, timeout=timeout)
+        for task in pending | self._connections:
+            task.cancel()
+        if self._connections:
+            await asyncio.wait(set(self._connections))
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "status": "draining" if self._draining else "ok",
+            "workflows": len(self.workflows),
+            "running": self.running,
+            "queued": self.queued,
+        }
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                changed = await self.reload()
+            except Exception as e:
+                _log(f"reload failed: {e}")
+                continue
+            if changed:
+                _log(f"reloaded {', '.join(sorted(changed))}")
+
+    @asynccontextmanager
+    async def _slot(self, name: str) -> AsyncIterator[None]:
+        """Admit a run: wait for the workflow's and the global limit, or 503."""
+        if self._draining:
+            raise HTTPError(503, "Server is shutting down")
+        if self.running + self.queued >= self.max_concurrency + self.max_queue:
+            raise HTTPError(503, "Server is at capacity")
+        self.queued += 1
+        admitted = False
+        try:
+            # The workflow's own limit first, so a busy workflow queues
+            # without holding global slots other workflows could use
+            async with self._workflow_limit(name), self._limit:
+                self.queued -= 1
+                self.running += 1
+                admitted = True
+                try:
+                    yield
+                finally:
+                    self.running -= 1
+        finally:
+            if not admitted:
+                self.queued -= 1
+
+    @asynccontextmanager
+    async def _workflow_limit(self, name: str) -> AsyncIterator[None]:
+        if self.workflow_concurrency is None:
+            yield
+            return
+        limit = self._workflow_limits.get(name)
+        if limit is None:
+            limit = self._workflow_limits[name] = asyncio.Semaphore(
+                self.workflow_concurrency
+            )
+        async with limit:
+            yield
+
+    # HTTP
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        task = asyncio.current_task()
+        # start_server runs each connection in its own task
+        assert task is not None
+        self._connections.add(task)
+        try:
+            while not self._draining:
+                request_line = await asyncio.wait_for(
+                    reader.readline(), self.idle_timeout
+                )
+                if not request_line.strip():
+                    break
+                # From the first byte of a request, drain lets it finish
+                self._busy.add(task)
+                try:
+                    try:
+                        request = await asyncio.wait_for(
+                            _read_request(reader, request_line), self.idle_timeout
+                        )
+                    except HTTPError as e:
+                        await _respond(
+                            writer, e.status, {"error": str(e)}, keep_alive=False
+                        )
+                        break
+                    keep_alive = await self._handle(writer, *request)
+                finally:
+                    self._busy.discard(task)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            if not self._draining:
+                raise
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _handle(
+        self,
+        writer: asyncio.StreamWriter,
+        method: str,
+        path: str,
+        headers: Dict[str, str],
+        body: bytes,
+    ) -> bool:
+        keep_alive = (
+            headers.get("connection", "").lower() != "close" and not self._draining
+        )
+        try:
+            parts = path.split("?")[0].strip("/").split("/")
+            if parts == ["health"]:
+                _allow(method, "GET")
+                await _respond(
+                    writer, 503 if self._draining else 200, self.stats(), keep_alive
+                )
+            elif parts == ["metrics"]:
+                _allow(method, "GET")
+                await _respond(
+                    writer,
+                    200,
+                    default_registry.render(),
+                    keep_alive,
+                    "text/plain; version=0.0.4",
+                )
+            elif parts == ["workflows"]:
+                _allow(method, "GET")
+                await _respond(
+                    writer,
+                    200,
+                    {
+                        "workflows": [
+                            {
+                                "name": name,
+                                "version": w.compiled.spec.version,
+                                "inputs": sorted(w.compiled.required_inputs),
+                            }
+                            for name, w in sorted(self.workflows.items())
+                        ]
+                    },
+                    keep_alive,
+                )
+            elif len(parts) == 3 and parts[0] == "workflows" and parts[2] == "run":
+                _allow(method, "POST")
+                return await self._run(writer, parts[1], headers, body, keep_alive)
+            else:
+                raise HTTPError(404, f"Not found: {path}")
+        except HTTPError as e:
+            headers_out = {"retry-after": "1"} if e.status == 503 else {}
+            await _respond(
+                writer, e.status, {"error": str(e)}, keep_alive, extra=headers_out
+            )
+        return keep_alive
+
+    async def _run(
+        self,
+        writer: asyncio.StreamWriter,
+        name: str,
+        headers: Dict[str, str],
+        body: bytes,
+        keep_alive: bool,
+    ) -> bool:
+        loaded = self.workflows.get(name)
+        if loaded is None:
+            raise HTTPError(404, f"Workflow not found: {name}")
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError as e:
+            raise HTTPError(400, f"Invalid JSON: {e}")
+        if not isinstance(request, dict) or not isinstance(
+            request.get("inputs", {}), dict
+        ):
+            raise HTTPError(400, 'Expected {"inputs": {...}}')
+        inputs = request.get("inputs", {})
+        missing = sorted(loaded.compiled.required_inputs - set(inputs))
+        if missing:
+            raise HTTPError(400, f"Missing inputs: {', '.join(missing)}")
+        stream = request.get("stream", "text/event-stream" in headers.get("accept", ""))
+        timeout = request.get("timeout")
+        if timeout is not None and (
+            isinstance(timeout, bool)
+            or not isinstance(timeout, (int, float))
+            or timeout <= 0
+        ):
+            raise HTTPError(400, "timeout must be a positive number of seconds")
+        if self.request_timeout is not None:
+            timeout = min(timeout or self.request_timeout, self.request_timeout)
+
+        async with self._slot(name):
+            if stream:
+                await self._stream(writer, loaded.workflow, inputs, timeout)
+                return False
+            try:
+                context = await loaded.workflow.run(inputs, timeout=timeout)
+            except StepTimeoutError as e:
+                await _respond(
+                    writer,
+                    504,
+                    {
+                        "error": str(e),
+                        "error_type": type(e).__name__,
+                        "step": e.output_key,
+                        "context": _public(e.context),
+                    },
+                    keep_alive,
+                )
+                return keep_alive
+            except Exception as e:
+                await _respond(
+                    writer,
+                    500,
+                    {"error": str(e), "error_type": type(e).__name__},
+                    keep_alive,
+                )
+                return keep_alive
+            await _respond(
+                writer,
+                200,
+                {
+                    "workflow": name,
+                    "output": context.get("output"),
+                    "context": _public(context),
+                },
+                keep_alive,
+            )
+            return keep_alive
+
+    async def _stream(
+        self,
+        writer: asyncio.StreamWriter,
+        workflow: Workflow,
+        inputs: Dict[str, Any],
+        timeout: Optional[float] = None,
+    ) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\ncontent-type: text/event-stream\r\n"
+            b"cache-control: no-cache\r\nconnection: close\r\n\r\n"
+        )
+        events = workflow.events(inputs, timeout=timeout)
+        try:
+            async for event in events:
+                if event["type"] == "workflow_end":
+                    event = {
+                        "type": "workflow_end",
+                        "output": event["context"].get("output"),
+                        "context": _public(event["context"]),
+                    }
+                writer.write(_sse(event))
+                # A client that went away cancels the run here
+                await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception as e:
+            error = {"type": "error", "error": str(e), "error_type": type(e).__name__}
+            if isinstance(e, StepTimeoutError):
+                error["step"] = e.output_key
+            writer.write(_sse(error))
+            await writer.drain()
+        finally:
+            await events.aclose()
+
+
+def _allow(method: str, allowed: str) -> None:
+    if method != allowed:
+        raise HTTPError(405, f"Use {allowed}")
+
+
+def _public(context: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in context.items() if not k.startswith("__")}
+
+
+def _sse(event: Dict[str, Any]) -> bytes:
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    return f"event: {event['type']}\ndata: {data}\n\n".encode()
+
+
+async def _read_request(
+    reader: asyncio.StreamReader, request_line: bytes
+) -> Tuple[str, str, Dict[str, str], bytes]:
+    """(method, path, headers, body) of the request starting with `request_line`."""
+    parts = request_line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise HTTPError(400, "Malformed request line")
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "Invalid content-length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"Body exceeds {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return parts[0].upper(), parts[1], headers, body
+
+
+async def _respond(
+    writer: asyncio.StreamWriter,
+    status: int,
+    body: Any,
+    keep_alive: bool,
+    content_type: str = "application/json",
+    extra: Optional[Dict[str, str]] = None,
+) -> None:
+    data = (
+        body.encode()
+        if isinstance(body, str)
+        else json.dumps(body, ensure_ascii=False, default=str).encode()
+    )
+    head = [
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}",
+        f"content-type: {content_type}",
+        f"content-length: {len(data)}",
+        f"connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    head += [f"{k}: {v}" for k, v in (extra or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+    await writer.drain()
+
+
+def _log(message: str) -> None:
+    print(f"riil serve: {message}", file=sys.stderr)
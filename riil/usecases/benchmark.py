@@ -0,0 +1,320 @@
+# riil/usecases/benchmark.py
+"""
+Use case: Measure what riil itself costs, using the fake provider.
+
+Each benchmark returns plain numbers; `run_benchmarks` collects them with
+details of the environment into one JSON-serializable report, so results
+can be stored and compared across commits. `quick` shrinks every workload
+for smoke tests; its numbers are noisy.
+"""
+
+import asyncio
+import json
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import yaml
+
+from riil.domain.workflow import Workflow
+from riil.infrastructure.callbacks.metrics import MetricsCallback, MetricsRegistry
+from riil.infrastructure.llms.fake import FakeLLMStep
+from riil.infrastructure.llms.ratelimit import reset_schedulers
+from riil.infrastructure.llms.retry import reset_latency_stats
+from riil.infrastructure.utils.json_repair import parse_json
+from riil.infrastructure.utils.offload import get_executor, offload, pool_size
+from riil.infrastructure.workflow.catalog import WorkflowCatalog
+from riil.infrastructure.workflow.loader import (
+    clear_workflow_cache,
+    compile_workflow_file,
+)
+from riil.infrastructure.workflow.postprocess import PostprocessStep
+from riil.usecases.execute_batch import execute_batch
+
+Report = Dict[str, Any]
+
+
+def chain(steps: int, **fake_options: Any) -> Workflow:
+    """A workflow of `steps` fake steps, each reading the previous one's output."""
+    wf = Workflow("bench-chain")
+    for i in range(steps):
+        source = "{topic}" if i == 0 else "{k%d}" % (i - 1)
+        key = "output" if i == steps - 1 else f"k{i}"
+        wf.add_step(
+            FakeLLMStep(
+                f"step {i}: {source}", output_key=key, response=f"r{i}", **fake_options
+            )
+        )
+    return wf
+
+
+async def bench_load(quick: bool = False) -> Report:
+    """Workflow load time: cold and cached compile, instantiate, catalog lookup."""
+    repeat = 20 if quick else 200
+    spec = {
+        "name": "bench-load",
+        "steps": [
+            {
+                "prompt": (
+                    f"Step {i} about {{{{topic}}}} and {{{{k{i - 1}}}}}"
+                    if i
+                    else "About {{topic}}"
+                ),
+                "llm": {"provider": "fake", "model": "fake", "config": {"latency": 0}},
+                "output_key": f"k{i}",
+            }
+            for i in range(10)
+        ],
+    }
+    with tempfile.TemporaryDirectory() as root:
+        path = Path(root) / "bench.yaml"
+        path.write_text(yaml.safe_dump(spec, sort_keys=False), encoding="utf-8")
+
+        def cold() -> None:
+            clear_workflow_cache()
+            compile_workflow_file(path)
+
+        compiled = compile_workflow_file(path)
+        catalog = WorkflowCatalog(Path(root))
+        catalog.find("bench-load")
+        return {
+            "steps": len(spec["steps"]),
+            "cold_compile_us": _median_us(cold, repeat),
+            "cached_compile_us": _median_us(
+                lambda: compile_workflow_file(path), repeat
+            ),
+            "instantiate_us": _median_us(compiled.instantiate, repeat),
+            "catalog_find_us": _median_us(lambda: catalog.find("bench-load"), repeat),
+        }
+
+
+async def bench_overhead(quick: bool = False) -> Report:
+    """Engine time per step with zero LLM latency, without and with callbacks."""
+    steps, runs = 10, (20 if quick else 300)
+    # The first step of chain(1), typed as the fake LLM step it is
+    raw = FakeLLMStep("step 0: {topic}", response="r0", latency=0)
+    messages = [{"role": "user", "content": "step 0: x"}]
+    started = time.perf_counter()
+    for _ in range(runs * steps):
+        await raw.complete(messages)
+    raw_us = (time.perf_counter() - started) / (runs * steps) * 1e6
+
+    per_step = {}
+    for label, callbacks in (
+        ("no_callbacks", 0),
+        ("1_callback", 1),
+        ("4_callbacks", 4),
+    ):
+        wf = chain(steps, latency=0)
+        wf.callbacks = [MetricsCallback(MetricsRegistry()) for _ in range(callbacks)]
+        await wf.run({"topic": "warm-up"})
+        started = time.perf_counter()
+        for i in range(runs):
+            await wf.run({"topic": str(i)})
+        per_step[label] = (time.perf_counter() - started) / (runs * steps) * 1e6
+    return {
+        "steps": steps,
+        "runs": runs,
+        "provider_us": raw_us,
+        "per_step_us": per_step,
+        "engine_overhead_us": {k: v - raw_us for k, v in per_step.items()},
+    }
+
+
+async def bench_concurrency(quick: bool = False, latency: float = 0.05) -> Report:
+    """Throughput against concurrency for a one-step workflow with fixed latency."""
+    levels = [1, 8, 64] if quick else [1, 4, 16, 64, 256, 1024]
+    latency = 0.01 if quick else latency
+    rows = []
+    for level in levels:
+        wf = chain(1, latency=latency)
+        records = level * (3 if quick else 10)
+        started = time.perf_counter()
+        stats = await execute_batch(
+            wf,
+            ({"topic": str(i)} for i in range(records)),
+            lambda r: None,
+            concurrency=level,
+        )
+        elapsed = time.perf_counter() - started
+        throughput = stats.succeeded / elapsed
+        rows.append(
+            {
+                "concurrency": level,
+                "runs": records,
+                "runs_per_second": throughput,
+                "efficiency": throughput / (level / latency),
+            }
+        )
+    return {"latency_s": latency, "levels": rows}
+
+
+async def bench_memory(quick: bool = False) -> Report:
+    """Heap held per workflow run in flight, measured with tracemalloc."""
+    in_flight = 50 if quick else 500
+    latency = 0.05 if quick else 0.2
+    wf = chain(3, latency=latency)
+    await wf.run({"topic": "warm-up"})
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tasks = [
+            asyncio.ensure_future(wf.run({"topic": str(i)})) for i in range(in_flight)
+        ]
+        # Every run is now waiting on its first step
+        await asyncio.sleep(latency / 2)
+        held = tracemalloc.get_traced_memory()[0] - baseline
+        await asyncio.gather(*tasks)
+    finally:
+        tracemalloc.stop()
+    return {"in_flight": in_flight, "steps": 3, "bytes_per_run": held / in_flight}
+
+
+async def bench_ttft(quick: bool = False) -> Report:
+    """Time to first streamed token against the provider's configured TTFT."""
+    runs = 10 if quick else 100
+    ttft = 0.01 if quick else 0.05
+    wf = chain(2, latency=0)
+    # Only the streamed final step has a TTFT and token rate
+    wf.steps[-1] = FakeLLMStep(
+        "step 1: {k0}", ttft=ttft, latency=0, response_tokens=20, tokens_per_second=1000
+    )
+    samples = []
+    for i in range(runs):
+        started = time.perf_counter()
+        stream = wf.stream({"topic": str(i)})
+        await stream.__anext__()
+        samples.append(time.perf_counter() - started)
+        await stream.aclose()
+    samples.sort()
+    p50 = samples[len(samples) // 2]
+    return {
+        "runs": runs,
+        "configured_ttft_s": ttft,
+        "p50_s": p50,
+        "p95_s": samples[int(0.95 * (len(samples) - 1))],
+        "overhead_p50_us": (p50 - ttft) * 1e6,
+    }
+
+
+def repair_completion(text: str) -> int:
+    """A CPU-bound post-processing hook: repair and parse a long, truncated reply."""
+    return len(parse_json(text))
+
+
+async def bench_offload(quick: bool = False) -> Report:
+    """Event-loop lag while CPU-bound hooks run inline, in threads and in processes."""
+    runs = 8 if quick else 32
+    rows = 1000 if quick else 4000
+    # Cut mid-record, as a completion that hit max_tokens would be
+    completion = json.dumps(
+        [{"id": i, "text": "lorem ipsum " * 4} for i in range(rows)]
+    )[:-7]
+    # Spawning workers is a one-off cost, not what is measured
+    await asyncio.gather(
+        *(offload(len, "", mode="process") for _ in range(pool_size("process")))
+    )
+    get_executor("thread")
+
+    results = []
+    for mode in ("inline", "thread", "process"):
+        wf = Workflow("bench-offload")
+        wf.add_step(
+            PostprocessStep(
+                FakeLLMStep("{topic}", response=completion, latency=0.01),
+                repair_completion,
+                mode,
+            )
+        )
+        lags: List[float] = []
+        done = asyncio.Event()
+
+        async def _tick() -> None:
+            # How late a 1 ms timer fires: the delay every in-flight request sees
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - started - 0.001)
+
+        ticker = asyncio.ensure_future(_tick())
+        started = time.perf_counter()
+        await asyncio.gather(*(wf.run({"topic": str(i)}) for i in range(runs)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await ticker
+        lags.sort()
+        results.append(
+            {
+                "mode": mode,
+                "wall_s": elapsed,
+                "lag_p50_ms": lags[len(lags) // 2] * 1e3,
+                "lag_p99_ms": lags[int(0.99 * (len(lags) - 1))] * 1e3,
+                "lag_max_ms": lags[-1] * 1e3,
+            }
+        )
+    return {
+        "runs": runs,
+        "completion_chars": len(completion),
+        "processes": pool_size("process"),
+        "modes": results,
+    }
+
+
+BENCHMARKS: Dict[str, Callable[[bool], Awaitable[Report]]] = {
+    "load": bench_load,
+    "overhead": bench_overhead,
+    "concurrency": bench_concurrency,
+    "memory": bench_memory,
+    "ttft": bench_ttft,
+    "offload": bench_offload,
+}
+
+
+async def run_benchmarks(
+    names: Optional[List[str]] = None, quick: bool = False
+) -> Report:
+    """Run the named benchmarks (default: all) and return the report."""
+    names = names or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise ValueError(
+            f"Unknown benchmarks: {', '.join(unknown)}"
+            f" (available: {', '.join(BENCHMARKS)})"
+        )
+    results = {}
+    for name in names:
+        # Each benchmark starts without schedulers or latency history from the last
+        reset_schedulers()
+        reset_latency_stats()
+        results[name] = await BENCHMARKS[name](quick)
+    return {
+        "riil_version": _version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "quick": quick,
+        "results": results,
+    }
+
+
+def _median_us(fn: Callable[[], Any], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1e6
+
+
+def _version() -> str:
+    try:
+        from importlib.metadata import version
+
+        return version("riil-ai")
+    except Exception:
+        return "unknown"
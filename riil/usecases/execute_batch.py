@@ -0,0 +1,233 @@
+# riil/usecases/execute_batch.py
+"""
+Use case: Execute one workflow over a stream of input records.
+"""
+
+import asyncio
+import inspect
+import json
+import time
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Set,
+    TextIO,
+    Union,
+)
+
+from riil.domain.workflow import StepTimeoutError, Workflow
+from riil.usecases.execute_workflow import execute_workflow
+
+BatchResult = Dict[str, Any]
+# on_result / on_progress handlers may be sync or async
+Handler = Callable[..., Union[None, Awaitable[None]]]
+
+
+class BatchStats:
+    """Running counters for a batch job."""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    @property
+    def completed(self) -> int:
+        return self.succeeded + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self) -> float:
+        """Completed records per second."""
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.completed} done ({self.succeeded} ok, {self.failed} failed) "
+            f"in {self.elapsed:.1f}s, {self.throughput:.1f} rec/s"
+        )
+
+
+def read_jsonl(stream: TextIO) -> Iterator[Any]:
+    """
+    Lazily read JSONL records. Blank lines are skipped; a line that fails to
+    parse is yielded as the exception so the batch can report it and go on.
+    """
+    for line in stream:
+        if line.strip():
+            yield _parse_line(line)
+
+
+async def stream_jsonl(stream: TextIO) -> AsyncIterator[Any]:
+    """
+    `read_jsonl` for streams that may block, such as stdin fed by a slow
+    producer: each line is read in a worker thread so the event loop keeps
+    running the records already in flight.
+    """
+    while True:
+        line = await asyncio.to_thread(stream.readline)
+        if not line:
+            return
+        if line.strip():
+            yield _parse_line(line)
+
+
+def _parse_line(line: str) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON: {e}")
+
+
+async def execute_batch(
+    workflow: Workflow,
+    records: Union[Iterable[Any], AsyncIterable[Any]],
+    on_result: Handler,
+    concurrency: int = 8,
+    ordered: bool = True,
+    on_progress: Optional[Handler] = None,
+    progress_interval: float = 5.0,
+    timeout: Optional[float] = None,
+) -> BatchStats:
+    """
+    Run `workflow` once per record with at most `concurrency` runs in flight.
+
+    Each record produces one result passed to `on_result` (sync or async):
+    `{"index", "ok": True, "output"}` or `{"index", "ok": False, "error",
+    "error_type", "input"}`. With `ordered`, results are emitted in input
+    order; otherwise as they complete. Records (a sync or async iterable)
+    are pulled lazily and the reorder buffer is bounded, so memory does not
+    grow with the input size.
+    `timeout` bounds each run; a timed-out record's result names the step.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be >= 1")
+
+    stats = BatchStats()
+    # How far admission may run ahead of the oldest unemitted record
+    window = concurrency * 4 if ordered else concurrency
+    running: "Set[asyncio.Future[BatchResult]]" = set()
+    finished: Dict[int, BatchResult] = {}
+    next_emit = 0
+    last_progress = time.monotonic()
+
+    async def _call(fn: Handler, arg: Any) -> None:
+        ret = fn(arg)
+        if inspect.isawaitable(ret):
+            await ret
+
+    async def _emit(result: BatchResult) -> None:
+        nonlocal last_progress
+        if result["ok"]:
+            stats.succeeded += 1
+        else:
+            stats.failed += 1
+        await _call(on_result, result)
+        if on_progress and time.monotonic() - last_progress >= progress_interval:
+            last_progress = time.monotonic()
+            await _call(on_progress, stats)
+
+    async def _drain(pending: "Optional[asyncio.Future[Any]]" = None) -> None:
+        nonlocal next_emit
+        # With `pending`, also return once it is done
+        waiting = running if pending is None else running | {pending}
+        done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task is pending:
+                continue
+            running.discard(task)
+            result = task.result()
+            if ordered:
+                finished[result["index"]] = result
+            else:
+                await _emit(result)
+        while next_emit in finished:
+            await _emit(finished.pop(next_emit))
+            next_emit += 1
+
+    async def _admit(index: int, record: Any) -> None:
+        while len(running) >= concurrency or (ordered and index - next_emit >= window):
+            await _drain()
+        running.add(
+            asyncio.ensure_future(_run_record(workflow, index, record, timeout))
+        )
+        stats.submitted += 1
+
+    async def _pull(source: AsyncIterator[Any]) -> Any:
+        # Keep emitting results while the next record is on its way
+        pending = asyncio.ensure_future(_next(source))
+        try:
+            while running and not pending.done():
+                await _drain(pending)
+            return await pending
+        finally:
+            pending.cancel()
+
+    try:
+        if isinstance(records, AsyncIterable):
+            source = records.__aiter__()
+            index = 0
+            while True:
+                try:
+                    record = await _pull(source)
+                except StopAsyncIteration:
+                    break
+                await _admit(index, record)
+                index += 1
+        else:
+            for index, record in enumerate(records):
+                await _admit(index, record)
+        while running:
+            await _drain()
+    finally:
+        # Cancel in-flight runs and let them unwind before returning or raising
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    if on_progress:
+        await _call(on_progress, stats)
+    return stats
+
+
+async def _next(source: AsyncIterator[Any]) -> Any:
+    return await source.__anext__()
+
+
+async def _run_record(
+    workflow: Workflow, index: int, record: Any, timeout: Optional[float] = None
+) -> BatchResult:
+    if isinstance(record, Exception):
+        return _failure(index, None, record)
+    if not isinstance(record, dict):
+        return _failure(index, record, ValueError("Record must be a JSON object"))
+    try:
+        output = await execute_workflow(workflow, record, timeout=timeout)
+    except StepTimeoutError as e:
+        return {**_failure(index, record, e), "step": e.output_key}
+    except Exception as e:
+        return _failure(index, record, e)
+    return {"index": index, "ok": True, "output": output}
+
+
+def _failure(index: int, record: Any, error: Exception) -> BatchResult:
+    return {
+        "index": index,
+        "ok": False,
+        "error": str(error),
+        "error_type": error.__class__.__name__,
+        "input": record,
+    }
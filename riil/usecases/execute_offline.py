@@ -0,0 +1,433 @@
+# riil/usecases/execute_offline.py
+"""
+Use case: Execute one workflow over a large input through a provider's
+batch API, trading latency for cost and throughput.
+
+Records advance one step layer at a time. For each layer, the requests of
+every pending record are written to batch files and submitted; when the
+batches finish, their results are merged into the records' contexts and
+the next layer starts. Steps whose provider has no batch API run locally
+while the layer's requests are written.
+
+All job state lives in a SQLite file in the work directory, so memory does
+not grow with the input, and a stopped job resumes where it left off
+without resubmitting batches that were already sent.
+"""
+
+import asyncio
+import inspect
+import json
+import sqlite3
+from pathlib import Path
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from riil.domain.workflow import Workflow, build_layers
+from riil.infrastructure.llms.batch import BatchTransport
+from riil.usecases.execute_batch import BatchResult, BatchStats
+
+STATE_FILENAME = "job.sqlite"
+# OpenAI accepts up to 50,000 requests and 200 MB per batch file
+DEFAULT_MAX_REQUESTS = 50_000
+DEFAULT_MAX_BYTES = 190 * 2**20
+# Records read, written or merged per database round trip
+_CHUNK = 1000
+
+# custom_id, output, error, error_type
+_ResultRow = Tuple[str, Optional[str], Optional[str], Optional[str]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS records (
+    idx INTEGER PRIMARY KEY, input TEXT, context TEXT, error TEXT, error_type TEXT
+);
+CREATE TABLE IF NOT EXISTS batches (
+    layer INTEGER NOT NULL, part INTEGER NOT NULL, file TEXT NOT NULL,
+    batch_id TEXT, done INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (layer, part)
+);
+CREATE TABLE IF NOT EXISTS results (
+    custom_id TEXT PRIMARY KEY, output TEXT, error TEXT, error_type TEXT
+);
+"""
+
+
+class OfflineJob:
+    def __init__(
+        self,
+        workflow: Workflow,
+        work_dir: Path,
+        transport: BatchTransport,
+        poll_interval: float = 60.0,
+        max_requests_per_file: int = DEFAULT_MAX_REQUESTS,
+        max_file_bytes: int = DEFAULT_MAX_BYTES,
+        on_status: Optional[Callable[[str], Any]] = None,
+    ):
+        self.workflow = workflow
+        self.work_dir = Path(work_dir)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.transport = transport
+        self.poll_interval = poll_interval
+        self.max_requests_per_file = max_requests_per_file
+        self.max_file_bytes = max_file_bytes
+        self.on_status = on_status
+        self.layers = build_layers(workflow.steps)
+        self._db = sqlite3.connect(str(self.work_dir / STATE_FILENAME))
+        self._db.executescript(_SCHEMA)
+        self._check_workflow()
+
+    def close(self) -> None:
+        self._db.close()
+
+    async def run(self, records: Iterable[Any]) -> None:
+        """Load `records` (ignored on resume) and advance them through all layers."""
+        if self._meta("loaded") is None:
+            self._load(records)
+        layer = int(self._meta("layer") or 0)
+        while layer < len(self.layers):
+            await self._run_layer(layer)
+            layer += 1
+
+    def results(self) -> Iterator[BatchResult]:
+        """Final results in input order, in the same shape as execute_batch."""
+        for idx, raw_input, context, error, error_type in self._select_records(
+            with_errors=True
+        ):
+            if error is None:
+                yield {"index": idx, "ok": True, "output": json.loads(context)}
+            else:
+                record = json.loads(raw_input) if raw_input is not None else None
+                yield {
+                    "index": idx,
+                    "ok": False,
+                    "error": error,
+                    "error_type": error_type,
+                    "input": record,
+                }
+
+    # Layers
+
+    async def _run_layer(self, layer: int) -> None:
+        label = f"layer {layer + 1}/{len(self.layers)}"
+        if self._meta(f"prepared:{layer}") is None:
+            await self._prepare(layer)
+        pending = self._db.execute(
+            "SELECT part, file, batch_id FROM batches"
+            " WHERE layer = ? AND done = 0 ORDER BY part",
+            (layer,),
+        ).fetchall()
+        if pending:
+            await self._status(f"{label}: waiting for {len(pending)} batch(es)")
+            await asyncio.gather(*(self._finish_batch(layer, *row) for row in pending))
+        self._merge(layer)
+        await self._status(f"{label}: done")
+
+    async def _prepare(self, layer: int) -> None:
+        """Write the layer's batch files; steps without a batch API run now."""
+        steps = [(i, self.workflow.steps[i]) for i in self.layers[layer]]
+        writer = _BatchFileWriter(
+            self.work_dir, layer, self.max_requests_per_file, self.max_file_bytes
+        )
+        try:
+            for chunk in _chunks(self._select_records()):
+                local: List[_ResultRow] = []
+                for idx, _, context, _, _ in chunk:
+                    inputs = json.loads(context)
+                    for i, step in steps:
+                        custom_id = f"{idx}:{i}"
+                        try:
+                            request = _batch_request(step, inputs)
+                            if request is not None:
+                                writer.write({"custom_id": custom_id, **request})
+                                continue
+                            result = await step.run(inputs)
+                            local.append(
+                                (custom_id, _dumps(result["output"]), None, None)
+                            )
+                        except Exception as e:
+                            local.append((custom_id, None, str(e), type(e).__name__))
+                with self._db:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", local
+                    )
+        finally:
+            files = writer.close()
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO batches (layer, part, file) VALUES (?, ?, ?)",
+                [(layer, part, str(path)) for part, path in enumerate(files)],
+            )
+            self._set_meta(f"prepared:{layer}", str(len(files)))
+
+    async def _finish_batch(
+        self, layer: int, part: int, file: str, batch_id: Optional[str]
+    ) -> None:
+        if batch_id is None:
+            batch_id = await self.transport.submit(Path(file))
+            with self._db:
+                self._db.execute(
+                    "UPDATE batches SET batch_id = ? WHERE layer = ? AND part = ?",
+                    (batch_id, layer, part),
+                )
+        while not await self.transport.poll(batch_id):
+            await asyncio.sleep(self.poll_interval)
+        dest = self.work_dir / f"results-{layer}-{part}.jsonl"
+        await self.transport.download(batch_id, dest)
+        with self._db:
+            with open(dest, encoding="utf-8") as f:
+                for chunk in _chunks(line for line in f if line.strip()):
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                        [self._parse_result(line) for line in chunk],
+                    )
+            self._db.execute(
+                "UPDATE batches SET done = 1 WHERE layer = ? AND part = ?",
+                (layer, part),
+            )
+
+    def _parse_result(self, line: str) -> _ResultRow:
+        result = json.loads(line)
+        custom_id = result["custom_id"]
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            error = (
+                result.get("error") or (response.get("body") or {}).get("error") or {}
+            )
+            message = error.get("message") if isinstance(error, dict) else str(error)
+            return (
+                custom_id,
+                None,
+                message or f"HTTP {response.get('status_code')}",
+                "BatchRequestError",
+            )
+        step = self.workflow.steps[int(custom_id.split(":")[1])]
+        try:
+            output = getattr(step, "batch_output")(response["body"])
+            return custom_id, _dumps(output), None, None
+        except Exception as e:
+            return custom_id, None, str(e), type(e).__name__
+
+    def _merge(self, layer: int) -> None:
+        """Apply the layer's results to the records' contexts, in step order."""
+        steps = [
+            (i, getattr(self.workflow.steps[i], "output_key", "output"))
+            for i in self.layers[layer]
+        ]
+        with self._db:
+            for chunk in _chunks(self._select_records()):
+                ids = [f"{row[0]}:{i}" for row in chunk for i, _ in steps]
+                found: Dict[str, Tuple[Any, ...]] = {}
+                for batch in _chunks(iter(ids), 500):
+                    marks = ",".join("?" * len(batch))
+                    found.update(
+                        (row[0], row[1:])
+                        for row in self._db.execute(
+                            f"SELECT * FROM results WHERE custom_id IN ({marks})", batch
+                        )
+                    )
+                updates: List[Tuple[Any, ...]] = []
+                for idx, _, context, _, _ in chunk:
+                    ctx = json.loads(context)
+                    error: Optional[Tuple[Any, Any]] = None
+                    for i, output_key in steps:
+                        output, message, error_type = found.get(
+                            f"{idx}:{i}",
+                            (None, f"No result for step {i}", "BatchRequestError"),
+                        )
+                        if message is not None:
+                            error = (message, error_type)
+                            break
+                        ctx[output_key] = json.loads(output)
+                    if error is None:
+                        updates.append((_dumps(ctx), None, None, idx))
+                    else:
+                        updates.append((context, *error, idx))
+                self._db.executemany(
+                    "UPDATE records SET context = ?, error = ?, error_type = ?"
+                    " WHERE idx = ?",
+                    updates,
+                )
+            self._db.execute("DELETE FROM results")
+            self._set_meta("layer", str(layer + 1))
+
+    # State
+
+    def _load(self, records: Iterable[Any]) -> None:
+        with self._db:
+            for chunk in _chunks(enumerate(records)):
+                rows: List[Tuple[Any, ...]] = []
+                for idx, record in chunk:
+                    if isinstance(record, Exception):
+                        rows.append(
+                            (idx, None, None, str(record), type(record).__name__)
+                        )
+                    elif not isinstance(record, dict):
+                        rows.append(
+                            (
+                                idx,
+                                _dumps(record),
+                                None,
+                                "Record must be a JSON object",
+                                "ValueError",
+                            )
+                        )
+                    else:
+                        rows.append((idx, _dumps(record), _dumps(record), None, None))
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)", rows
+                )
+            self._set_meta("loaded", "1")
+
+    def _select_records(self, with_errors: bool = False) -> Iterator[Tuple[Any, ...]]:
+        """Records by index, fetched a page at a time so updates can interleave."""
+        last = -1
+        while True:
+            rows = self._db.execute(
+                "SELECT idx, input, context, error, error_type FROM records"
+                " WHERE idx > ?"
+                + ("" if with_errors else " AND error IS NULL")
+                + " ORDER BY idx LIMIT ?",
+                (last, _CHUNK),
+            ).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1][0]
+
+    def _check_workflow(self) -> None:
+        fingerprint = _dumps(
+            [
+                [
+                    type(s).__name__,
+                    getattr(s, "output_key", "output"),
+                    getattr(s, "prompt", None),
+                ]
+                for s in self.workflow.steps
+            ]
+        )
+        stored = self._meta("workflow")
+        if stored is None:
+            with self._db:
+                self._set_meta("workflow", fingerprint)
+        elif stored != fingerprint:
+            raise ValueError(
+                f"{self.work_dir} holds a job for a different workflow;"
+                " use a new work directory"
+            )
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._db.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    async def _status(self, message: str) -> None:
+        if self.on_status is not None:
+            ret = self.on_status(message)
+            if inspect.isawaitable(ret):
+                await ret
+
+
+class _BatchFileWriter:
+    """Writes requests-<layer>-<part>.jsonl files, rolling over at the limits."""
+
+    def __init__(self, work_dir: Path, layer: int, max_requests: int, max_bytes: int):
+        self.work_dir = work_dir
+        self.layer = layer
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.files: List[Path] = []
+        self._file: Optional[BinaryIO] = None
+        self._count = 0
+        self._bytes = 0
+
+    def write(self, request: Dict[str, Any]) -> None:
+        line = (_dumps(request) + "\n").encode("utf-8")
+        if (
+            self._file is None
+            or self._count >= self.max_requests
+            or self._bytes + len(line) > self.max_bytes
+        ):
+            self._file = self._roll()
+        self._file.write(line)
+        self._count += 1
+        self._bytes += len(line)
+
+    def close(self) -> List[Path]:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return self.files
+
+    def _roll(self) -> BinaryIO:
+        self.close()
+        path = self.work_dir / f"requests-{self.layer}-{len(self.files)}.jsonl"
+        self.files.append(path)
+        self._count = self._bytes = 0
+        return open(path, "wb")
+
+
+async def execute_offline(
+    workflow: Workflow,
+    records: Iterable[Any],
+    on_result: Callable[[BatchResult], Any],
+    work_dir: Path,
+    transport: BatchTransport,
+    poll_interval: float = 60.0,
+    on_status: Optional[Callable[[str], Any]] = None,
+    **options: Any,
+) -> BatchStats:
+    """
+    Run `workflow` once per record through batch files, then pass each
+    result to `on_result` in input order. Calling it again with the same
+    `work_dir` resumes the job; `records` are only read the first time.
+    """
+    job = OfflineJob(
+        workflow, work_dir, transport, poll_interval, on_status=on_status, **options
+    )
+    stats = BatchStats()
+    try:
+        await job.run(records)
+        for result in job.results():
+            stats.submitted += 1
+            if result["ok"]:
+                stats.succeeded += 1
+            else:
+                stats.failed += 1
+            ret = on_result(result)
+            if inspect.isawaitable(ret):
+                await ret
+    finally:
+        job.close()
+    return stats
+
+
+def _batch_request(step: Any, inputs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    batch_request = getattr(step, "batch_request", None)
+    return batch_request(inputs) if batch_request is not None else None
+
+
+def _chunks(items: Iterator[Any], size: int = _CHUNK) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
@@ -3,13 +3,20 @@
 Use case: Execute a workflow with inputs.
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from riil.domain.workflow import Workflow
 
 
-async def execute_workflow(workflow: Workflow, inputs: Dict[str, Any]) -> Dict[str, Any]:
+async def execute_workflow(
+    workflow: Workflow,
+    inputs: Dict[str, Any],
+    trace_id: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
     """
     Execute a workflow and return the final context.
     Can be extended with logging, observability, etc.
+    With a checkpoint store on the workflow, `trace_id` names the run so
+    it can be resumed. `timeout` bounds the run (see StepTimeoutError).
     """
-    return await workflow.run(inputs)
+    return await workflow.run(inputs, trace_id=trace_id, timeout=timeout)
@@ -0,0 +1,34 @@
+# riil/usecases/profile_workflow.py
+"""
+Use case: Run a workflow with span recording and stall detection on, for
+`riil profile`.
+"""
+
+import asyncio
+from typing import Any, Dict
+
+from riil.core.profiling import Recorder, recording
+from riil.domain.workflow import Workflow
+from riil.infrastructure.utils.profiler import StallMonitor
+from riil.usecases.execute_workflow import execute_workflow
+
+
+async def profile_workflow(
+    workflow: Workflow,
+    inputs: Dict[str, Any],
+    runs: int = 1,
+    stall_threshold: float = 0.05,
+) -> Recorder:
+    """
+    Run `workflow` `runs` times concurrently and return the recording.
+    Failed runs are recorded too: their spans carry an `error` attribute.
+    """
+    if runs < 1:
+        raise ValueError("runs must be >= 1")
+    with recording() as recorder:
+        async with StallMonitor(recorder, stall_threshold):
+            await asyncio.gather(
+                *(execute_workflow(workflow, dict(inputs)) for _ in range(runs)),
+                return_exceptions=True
+            )
+    return recorder
@@ -1,8 +1,27 @@
 # tests/conftest.py
 """pytest fixtures."""
+
 import pytest
+import pytest_asyncio
+
+from riil.infrastructure.llms.clients import close_clients
+from riil.infrastructure.llms.ratelimit import reset_schedulers
+from riil.infrastructure.llms.retry import reset_latency_stats
+from tests.stub_server import StubLLMServer
 
 
 @pytest.fixture
 def sample_inputs():
     return {"topic": "Python"}
+
+
+@pytest_asyncio.fixture
+async def stub_llm_server(monkeypatch):
+    """Local OpenAI-compatible server; pooled clients are closed afterwards."""
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    server = await StubLLMServer().start()
+    yield server
+    await close_clients()
+    reset_schedulers()
+    reset_latency_stats()
+    await server.stop()
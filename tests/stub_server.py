@@ -0,0 +1,129 @@
+# tests/stub_server.py
+"""
+Minimal OpenAI-compatible HTTP server for tests.
+Counts TCP connections and requests so tests can assert on pooling.
+"""
+
+import asyncio
+import json
+
+
+def chat_completion(content, model="stub", prompt_tokens=10, completion_tokens=5):
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def chat_chunk(text, model="stub"):
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": model,
+        "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}],
+    }
+
+
+async def echo_handler(payload):
+    """Reply with the last message content; streamed word by word when asked."""
+    content = f"echo: {payload['messages'][-1]['content']}"
+    if payload.get("stream"):
+        words = content.split(" ")
+        return 200, {}, [w if i == 0 else " " + w for i, w in enumerate(words)]
+    return 200, {}, chat_completion(content, payload.get("model", "stub"))
+
+
+class StubLLMServer:
+    """
+    `handler(payload)` is an async callable returning (status, headers, body).
+    A list body is sent as a server-sent event stream of content deltas,
+    `chunk_delay` seconds apart.
+    """
+
+    def __init__(self, handler=echo_handler):
+        self.handler = handler
+        self.chunk_delay = 0.0
+        self.connections = 0
+        self.requests = []
+        self._server = None
+
+    @property
+    def base_url(self):
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/v1"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                payload = json.loads(body) if body else {}
+                self.requests.append(payload)
+
+                status, extra, response = await self.handler(payload)
+                if isinstance(response, list):
+                    await self._send_stream(
+                        writer, response, payload.get("model", "stub")
+                    )
+                    continue
+                data = json.dumps(response).encode()
+                head = [
+                    f"HTTP/1.1 {status} Stub",
+                    "content-type: application/json",
+                    f"content-length: {len(data)}",
+                ]
+                head += [f"{k}: {v}" for k, v in extra.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send_stream(self, writer, deltas, model):
+        writer.write(
+            b"HTTP/1.1 200 Stub\r\ncontent-type: text/event-stream\r\n"
+            b"transfer-encoding: chunked\r\n\r\n"
+        )
+        events = [f"data: {json.dumps(chat_chunk(d, model))}\n\n" for d in deltas]
+        for event in events + ["data: [DONE]\n\n"]:
+            data = event.encode()
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
@@ -0,0 +1,161 @@
+# tests/test_domain/test_map.py
+"""Test map steps: bounded fan-out, streaming reduce and partial failures."""
+
+import asyncio
+
+import pytest
+
+from riil.domain.map import JoinReducer, MapStep, Reducer
+from riil.domain.step import Step
+from riil.domain.workflow import Workflow
+
+
+class ItemStep(Step):
+    """Upper-cases `item` after a delay shrinking with the index; tracks concurrency."""
+
+    def __init__(self, failures=None):
+        self.input_keys = {"item", "suffix"}
+        self.output_key = "output"
+        self.failures = dict(failures or {})
+        self.running = 0
+        self.peak = 0
+
+    async def run(self, inputs):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(0.001 * (5 - inputs["__map_index"] % 5))
+            if self.failures.get(inputs["item"], 0) > 0:
+                self.failures[inputs["item"]] -= 1
+                raise RuntimeError(f"bad {inputs['item']}")
+            return {"output": inputs["item"].upper() + inputs.get("suffix", "")}
+        finally:
+            self.running -= 1
+
+
+class RecordingReducer(Reducer):
+    def __init__(self, seen):
+        self.seen = seen
+
+    async def add(self, index, output):
+        self.seen.append(index)
+
+    def result(self):
+        return len(self.seen)
+
+
+@pytest.mark.asyncio
+async def test_results_are_in_item_order_within_the_concurrency_limit():
+    item = ItemStep()
+    step = MapStep(item, over="words", output_key="upper", concurrency=3)
+    assert step.input_keys == {"words", "suffix"}
+
+    wf = Workflow("map")
+    wf.add_step(step)
+    result = await wf.run({"words": [f"w{i}" for i in range(20)], "suffix": "!"})
+    assert result["upper"] == [f"W{i}!" for i in range(20)]
+    assert item.peak == 3
+
+
+@pytest.mark.asyncio
+async def test_reducer_sees_items_as_they_complete():
+    seen = []
+    step = MapStep(
+        ItemStep(), over="words", concurrency=4, reducer=lambda: RecordingReducer(seen)
+    )
+
+    class Lazy:
+        """Iterated lazily, never materialized."""
+
+        def __iter__(self):
+            return (f"w{i}" for i in range(1000))
+
+    result = await step.run({"words": Lazy()})
+    assert result["output"] == 1000
+    assert sorted(seen) == list(range(1000))
+    assert seen != sorted(seen)
+
+
+class SlowFirstStep(Step):
+    """Item 0 waits until every other item has been delivered."""
+
+    def __init__(self, seen, total):
+        self.input_keys = {"item"}
+        self.seen = seen
+        self.total = total
+
+    async def run(self, inputs):
+        if inputs["__map_index"] == 0:
+            while len(self.seen) < self.total - 1:
+                await asyncio.sleep(0.001)
+        return {"output": inputs["item"]}
+
+
+@pytest.mark.asyncio
+async def test_slow_item_does_not_hold_back_the_others():
+    seen = []
+    step = MapStep(
+        SlowFirstStep(seen, 50),
+        over="words",
+        concurrency=2,
+        reducer=lambda: RecordingReducer(seen),
+    )
+    result = await asyncio.wait_for(step.run({"words": list(range(50))}), timeout=5)
+    assert result["output"] == 50
+    assert seen[-1] == 0
+
+    # Collect still lines results up with the items
+    collected = await MapStep(ItemStep(), over="words", concurrency=4).run(
+        {"words": ["a", "b", "c", "d", "e"]}
+    )
+    assert collected["output"] == ["A", "B", "C", "D", "E"]
+
+
+@pytest.mark.asyncio
+async def test_ordered_delivery_is_opt_in():
+    seen = []
+    step = MapStep(
+        ItemStep(),
+        over="words",
+        concurrency=4,
+        ordered=True,
+        reducer=lambda: RecordingReducer(seen),
+    )
+    await step.run({"words": [f"w{i}" for i in range(20)]})
+    assert seen == list(range(20))
+
+
+@pytest.mark.asyncio
+async def test_skip_retry_and_fail_fast():
+    words = ["a", "b", "c", "d"]
+
+    skipped = await MapStep(ItemStep({"b": 5}), over="words", on_error="skip").run(
+        {"words": words}
+    )
+    assert skipped["output"] == ["A", None, "C", "D"]
+    assert skipped["failed"] == 1
+    assert skipped["errors"] == [
+        {"index": 1, "error": "bad b", "error_type": "RuntimeError"}
+    ]
+
+    joined = await MapStep(
+        ItemStep({"b": 5}),
+        over="words",
+        on_error="skip",
+        reducer=lambda: JoinReducer(","),
+    ).run({"words": words})
+    assert joined["output"] == "A,C,D"
+
+    retried = await MapStep(
+        ItemStep({"b": 2}), over="words", retries=2, retry_delay=0
+    ).run({"words": words})
+    assert retried["output"] == ["A", "B", "C", "D"]
+
+    with pytest.raises(RuntimeError, match="bad c"):
+        await MapStep(ItemStep({"c": 1}), over="words").run({"words": words})
+
+
+@pytest.mark.asyncio
+async def test_map_needs_a_list():
+    with pytest.raises(ValueError, match="needs a list in 'words'"):
+        await MapStep(ItemStep(), over="words").run({"words": "not a list"})
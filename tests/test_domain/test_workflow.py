@@ -1,8 +1,18 @@
 # tests/test_domain/test_workflow.py
 """Test Workflow class."""
+
+import asyncio
 import pytest
-from riil.domain.workflow import Workflow
+import weakref
+from riil.domain.workflow import (
+    StepTimeoutError,
+    Workflow,
+    build_dependencies,
+    build_layers,
+    build_readers,
+)
 from riil.domain.step import Step
+from riil.core.callback import Callback
 
 
 class MockStep(Step):
@@ -28,7 +38,312 @@ async def test_workflow_maintains_context():
     class ContextStep(Step):
         async def run(self, inputs):
             return {"output": inputs.get("topic", "none")}
+
     wf = Workflow("ctx")
     wf.add_step(ContextStep())
     result = await wf.run({"topic": "test"})
     assert result["output"] == "test"
+
+
+class KeyedStep(Step):
+    """Step that declares what it reads and records how many run at once."""
+
+    def __init__(self, reads, output_key, tracker, delay=0.01):
+        self.input_keys = set(reads)
+        self.output_key = output_key
+        self.tracker = tracker
+        self.delay = delay
+
+    async def run(self, inputs):
+        self.tracker["active"] += 1
+        self.tracker["peak"] = max(self.tracker["peak"], self.tracker["active"])
+        await asyncio.sleep(self.delay)
+        self.tracker["active"] -= 1
+        value = "+".join(str(inputs[k]) for k in sorted(self.input_keys))
+        return {"output": f"{self.output_key}({value})"}
+
+
+@pytest.mark.asyncio
+async def test_independent_steps_run_concurrently():
+    tracker = {"active": 0, "peak": 0}
+    wf = Workflow("fan")
+    wf.add_step(KeyedStep(["topic"], "a", tracker))
+    wf.add_step(KeyedStep(["topic"], "b", tracker))
+    wf.add_step(KeyedStep(["a", "b"], "c", tracker))
+    result = await wf.run({"topic": "x"})
+    assert tracker["peak"] == 2
+    assert result["c"] == "c(a(x)+b(x))"
+    assert list(result)[-3:] == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_max_concurrency_caps_parallel_steps():
+    tracker = {"active": 0, "peak": 0}
+    wf = Workflow("capped", max_concurrency=1)
+    for key in ("a", "b", "c"):
+        wf.add_step(KeyedStep(["topic"], key, tracker))
+    await wf.run({"topic": "x"})
+    assert tracker["peak"] == 1
+
+
+@pytest.mark.asyncio
+async def test_steps_without_input_keys_are_barriers():
+    tracker = {"active": 0, "peak": 0}
+    wf = Workflow("barrier")
+    wf.add_step(KeyedStep(["topic"], "a", tracker))
+    wf.add_step(MockStep("middle"))
+    wf.add_step(KeyedStep(["topic"], "b", tracker))
+    result = await wf.run({"topic": "x"})
+    assert tracker["peak"] == 1
+    assert result["output"] == "middle"
+
+
+def test_build_dependencies_orders_conflicting_writes():
+    tracker = {"active": 0, "peak": 0}
+    steps = [
+        KeyedStep(["topic"], "a", tracker),
+        KeyedStep(["a"], "topic", tracker),
+        KeyedStep([], "a", tracker),
+    ]
+    assert build_dependencies(steps) == [set(), {0}, {0, 1}]
+
+
+def test_build_layers_groups_independent_steps():
+    tracker = {"active": 0, "peak": 0}
+    steps = [
+        KeyedStep(["topic"], "a", tracker),
+        KeyedStep(["topic"], "b", tracker),
+        KeyedStep(["a", "b"], "c", tracker),
+        KeyedStep(["a"], "d", tracker),
+    ]
+    assert build_layers(steps) == [[0, 1], [2, 3]]
+
+
+@pytest.mark.asyncio
+async def test_failing_step_cancels_siblings():
+    class FailStep(Step):
+        input_keys = set()
+        output_key = "boom"
+
+        async def run(self, inputs):
+            raise RuntimeError("boom")
+
+    tracker = {"active": 0, "peak": 0}
+    wf = Workflow("fail")
+    wf.add_step(KeyedStep([], "slow", tracker, delay=10))
+    wf.add_step(FailStep())
+    with pytest.raises(RuntimeError, match="boom"):
+        await wf.run({})
+    assert tracker["active"] == 1  # slow step was cancelled mid-sleep
+
+
+class TokenStep(Step):
+    """Streams its output word by word."""
+
+    def __init__(self, reads, output_key, text, stream_events=False):
+        self.input_keys = set(reads)
+        self.output_key = output_key
+        self.text = text
+        self.stream_events = stream_events
+
+    async def run(self, inputs):
+        return {"output": self.text}
+
+    async def stream(self, inputs):
+        for word in self.text.split(" "):
+            await asyncio.sleep(0)
+            yield word + " "
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_final_step_tokens_and_fills_context():
+    wf = Workflow("stream")
+    wf.add_step(TokenStep(["topic"], "draft", "not streamed"))
+    wf.add_step(TokenStep(["draft"], "output", "one two three"))
+    tokens = [t async for t in wf.stream({"topic": "x"})]
+    assert tokens == ["one ", "two ", "three "]
+
+    events = [e async for e in wf.events({"topic": "x"})]
+    assert [e["step"] for e in events if e["type"] == "token"] == [1, 1, 1]
+    assert events[-1]["type"] == "workflow_end"
+    assert events[-1]["context"]["draft"] == "not streamed"
+    assert events[-1]["context"]["output"] == "one two three "
+
+
+@pytest.mark.asyncio
+async def test_stream_events_flag_streams_intermediate_steps():
+    wf = Workflow("stream")
+    wf.add_step(TokenStep([], "draft", "a b", stream_events=True))
+    wf.add_step(TokenStep(["draft"], "output", "c"))
+    events = [e async for e in wf.events({})]
+    assert [(e["type"], e.get("text")) for e in events[:4]] == [
+        ("token", "a "),
+        ("token", "b "),
+        ("step_end", None),
+        ("token", "c "),
+    ]
+
+
+class SleepyStep(Step):
+    def __init__(self, reads, output_key, delay, timeout=None, error=None):
+        self.input_keys = {reads}
+        self.reads = reads
+        self.output_key = output_key
+        self.delay = delay
+        self.timeout = timeout
+        self.error = error
+        self.cancelled = False
+
+    async def run(self, inputs):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return {"output": f"{inputs[self.reads]}>{self.output_key}"}
+
+
+@pytest.mark.asyncio
+async def test_step_timeout_cancels_the_step_and_reports_partial_context():
+    slow = SleepyStep("a", "b", delay=5, timeout=0.05)
+    wf = (
+        Workflow("t")
+        .add_step(SleepyStep("topic", "a", 0.01))
+        .add_step(slow)
+        .add_step(SleepyStep("b", "c", 0))
+    )
+    with pytest.raises(StepTimeoutError) as info:
+        await wf.run({"topic": "x"})
+    assert (info.value.step, info.value.output_key, info.value.budget) == (
+        1,
+        "b",
+        "step",
+    )
+    assert info.value.context["a"] == "x>a"
+    assert "b" not in info.value.context
+    assert slow.cancelled
+
+
+@pytest.mark.asyncio
+async def test_run_deadline_bounds_every_step():
+    wf = (
+        Workflow("t", timeout=10)
+        .add_step(SleepyStep("topic", "a", 0.02))
+        .add_step(SleepyStep("a", "b", 5, timeout=3))
+    )
+    started = asyncio.get_running_loop().time()
+    with pytest.raises(StepTimeoutError) as info:
+        await wf.run({"topic": "x"}, timeout=0.1)
+    assert (info.value.output_key, info.value.budget) == ("b", "workflow")
+    assert asyncio.get_running_loop().time() - started < 0.5
+
+    # A step's own TimeoutError is an error, not a blown budget
+    wf = Workflow("t").add_step(
+        SleepyStep("topic", "a", 0, timeout=1, error=TimeoutError("upstream"))
+    )
+    with pytest.raises(TimeoutError, match="upstream") as info:
+        await wf.run({"topic": "x"})
+    assert not isinstance(info.value, StepTimeoutError)
+
+
+@pytest.mark.asyncio
+async def test_run_timing_stamps_reach_callbacks_but_not_the_caller():
+    class Recorder(Callback):
+        async def on_step_start(self, step, inputs, context):
+            pass
+
+        async def on_step_end(self, step, outputs, context):
+            pass
+
+        async def on_error(self, step, error, context):
+            pass
+
+        async def on_workflow_end(self, workflow, outputs):
+            self.seen = dict(outputs)
+
+    recorder = Recorder()
+    wf = Workflow("t", callbacks=[recorder], timeout=5)
+    wf.add_step(SleepyStep("topic", "a", 0))
+    result = await wf.run({"topic": "x"})
+    assert "__started_at" in recorder.seen and "__deadline" in recorder.seen
+    assert "__started_at" not in result and "__deadline" not in result
+    assert result["a"] == "x>a"
+    assert "__trace_id" in result
+
+    wf = Workflow("t", timeout=5)
+    wf.add_step(SleepyStep("topic", "a", 5, timeout=0.01))
+    with pytest.raises(StepTimeoutError) as info:
+        await wf.run({"topic": "x"})
+    assert not {"__started_at", "__deadline"} & info.value.context.keys()
+
+
+class Blob:
+    """A stand-in for a large output, observable through a weakref."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class BlobStep(Step):
+    """Reads `reads`; records its keys and whether `watched` values are alive."""
+
+    def __init__(self, reads, output_key, seen, watched=()):
+        self.input_keys = None if reads is None else set(reads)
+        self.output_key = output_key
+        self.seen = seen
+        self.watched = watched
+
+    async def run(self, inputs):
+        self.seen[self.output_key] = {
+            "keys": {k for k in inputs if not k.startswith("__")},
+            "alive": [ref() is not None for ref in self.watched],
+        }
+        return {"output": Blob(self.output_key)}
+
+
+def test_build_readers_follows_overwrites_and_barriers():
+    seen = {}
+    steps = [
+        BlobStep(["topic"], "a", seen),
+        BlobStep(["a"], "b", seen),
+        BlobStep(["a", "b"], "a", seen),
+        BlobStep(None, "c", seen),
+        BlobStep(["a"], "d", seen),
+    ]
+    assert build_readers(steps) == [[1, 2], [2, 3], [3, 4], [], []]
+
+
+@pytest.mark.asyncio
+async def test_dead_outputs_are_freed_as_soon_as_nothing_reads_them():
+    seen = {}
+    watched = []
+
+    class Tracked(BlobStep):
+        async def run(self, inputs):
+            result = await super().run(inputs)
+            watched.append(weakref.ref(result["output"]))
+            return result
+
+    wf = Workflow("chain", outputs={"c"})
+    wf.add_step(Tracked(["topic"], "a", seen))
+    wf.add_step(Tracked(["a"], "b", seen))
+    wf.add_step(BlobStep(["b"], "c", seen, watched))
+    result = await wf.run({"topic": "x"})
+
+    # Step c only gets what it reads, and a was released once b finished
+    assert seen["c"] == {"keys": {"b"}, "alive": [False, True]}
+    assert {k for k in result if not k.startswith("__")} == {"topic", "c"}
+
+
+@pytest.mark.asyncio
+async def test_full_context_is_kept_without_outputs():
+    seen = {}
+    wf = Workflow("chain")
+    wf.add_step(BlobStep(["topic"], "a", seen))
+    wf.add_step(BlobStep(["a"], "b", seen))
+    wf.add_step(BlobStep(None, "c", seen))
+    result = await wf.run({"topic": "x"})
+    assert seen["b"]["keys"] == {"topic", "a"}
+    assert {"a", "b", "c"} <= set(result)
@@ -0,0 +1,96 @@
+# tests/test_infrastructure/test_cache.py
+"""Test the two-tier LLM response cache."""
+
+import time
+import pytest
+from riil.infrastructure.llms import cache as llm_cache
+from riil.infrastructure.llms.cache import MemoryCache, ResponseCache, SQLiteCache
+from riil.infrastructure.llms.openai import OpenAIStep
+
+
+@pytest.fixture(autouse=True)
+def _reset_cache_config():
+    yield
+    llm_cache.configure_cache(None)
+    llm_cache.close_caches()
+
+
+def test_memory_tier_evicts_least_recently_used():
+    mem = MemoryCache(max_entries=2)
+    mem.set("a", 1)
+    mem.set("b", 2)
+    mem.get("a")
+    assert mem.set("c", 3) == 1
+    assert mem.get("b") is None
+    assert mem.get("a") == 1
+
+
+def test_ttl_expires_entries(tmp_path):
+    mem = MemoryCache(ttl=0.01)
+    disk = SQLiteCache(tmp_path / "c.sqlite", ttl=0.01)
+    mem.set("k", 1)
+    disk.set("k", {"content": "x"})
+    time.sleep(0.02)
+    assert mem.get("k") is None
+    assert disk.get("k") is None
+
+
+def test_disk_tier_evicts_by_size(tmp_path):
+    disk = SQLiteCache(tmp_path / "c.sqlite", max_bytes=40)
+    disk.set("a", {"content": "a" * 10})
+    disk.set("b", {"content": "b" * 10})
+    assert disk.get("a") is None
+    assert disk.get("b")[1] == {"content": "b" * 10}
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_restart(tmp_path):
+    first = ResponseCache(path=tmp_path / "c.sqlite")
+    await first.set("k", {"content": "hello"})
+    first.close()
+
+    second = ResponseCache(path=tmp_path / "c.sqlite")
+    assert await second.get("k") == {"content": "hello"}
+    assert await second.get("k") == {"content": "hello"}
+    assert await second.get("missing") is None
+    assert second.stats.disk_hits == 1
+    assert second.stats.memory_hits == 1
+    assert second.stats.misses == 1
+    second.close()
+
+
+@pytest.mark.asyncio
+async def test_step_cache_saves_round_trips(stub_llm_server):
+    options = {"base_url": stub_llm_server.base_url}
+    step = OpenAIStep("Joke about {topic}", client_options=options, cache=True)
+    first = await step.run({"topic": "cats"})
+    second = await step.run({"topic": "cats"})
+    await step.run({"topic": "dogs"})
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert second["output"] == first["output"]
+    assert len(stub_llm_server.requests) == 2
+    assert llm_cache.cache_stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_sampled_and_globally_bypassed_requests_skip_cache(stub_llm_server):
+    options = {"base_url": stub_llm_server.base_url}
+    sampled = OpenAIStep(
+        "x", client_options=options, params={"temperature": 0.9}, cache=True
+    )
+    await sampled.run({})
+    await sampled.run({})
+    assert len(stub_llm_server.requests) == 2
+    assert stub_llm_server.requests[0]["temperature"] == 0.9
+
+    llm_cache.configure_cache(False)
+    step = OpenAIStep("y", client_options=options, cache=True)
+    await step.run({})
+    await step.run({})
+    assert len(stub_llm_server.requests) == 4
+
+
+def test_unknown_cache_option_rejected(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    with pytest.raises(ValueError, match="Unknown cache options: size"):
+        OpenAIStep("x", cache={"size": 3})
@@ -0,0 +1,129 @@
+# tests/test_infrastructure/test_callbacks.py
+"""Test the structured JSON callback and its event sink."""
+
+import gzip
+import io
+import json
+import time
+import pytest
+from riil.domain.step import Step
+from riil.domain.workflow import Workflow
+from riil.infrastructure.callbacks.resolver import resolve_callback
+from riil.infrastructure.callbacks.sink import (
+    EventSink,
+    close_sinks,
+    validate_sink_options,
+)
+from riil.infrastructure.callbacks.structured import StructuredJSONCallback
+
+
+class EchoStep(Step):
+    output_key = "echo"
+    input_keys = {"topic"}
+
+    async def run(self, inputs):
+        return {"output": inputs["topic"], "output_key": self.output_key}
+
+
+class SlowStream:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, data):
+        time.sleep(0.05)
+        self.lines.extend(data.splitlines())
+
+    def flush(self):
+        pass
+
+
+def read_ndjson(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.mark.asyncio
+async def test_workflow_events_are_written_as_ndjson(tmp_path):
+    path = tmp_path / "events.ndjson"
+    wf = Workflow(
+        "log",
+        callbacks=[resolve_callback({"type": "json", "config": {"path": str(path)}})],
+    )
+    wf.add_step(EchoStep())
+    await wf.run({"topic": "Python"})
+    await close_sinks()
+
+    records = read_ndjson(path)
+    assert [r["event"] for r in records] == ["step.start", "step.end"]
+    assert records[1]["outputs"]["output"] == "Python"
+
+
+@pytest.mark.asyncio
+async def test_files_rotate_and_compress(tmp_path):
+    path = tmp_path / "events.ndjson"
+    sink = EventSink(
+        path=str(path), max_bytes=200, backups=2, gzip=True, flush_interval=0
+    )
+    for i in range(20):
+        await sink.emit({"event": "tick", "i": i, "pad": "x" * 40})
+        await sink.flush()
+    await sink.close()
+
+    assert path.stat().st_size <= 200
+    with gzip.open(f"{path}.1.gz", "rt") as f:
+        assert json.loads(f.readline())["event"] == "tick"
+    assert (tmp_path / "events.ndjson.2.gz").exists()
+    assert not (tmp_path / "events.ndjson.3.gz").exists()
+
+
+@pytest.mark.asyncio
+async def test_drop_policy_never_blocks_and_reports_drops():
+    stream = SlowStream()
+    sink = EventSink(stream=stream, queue_size=2, flush_interval=0)
+    started = time.monotonic()
+    for i in range(50):
+        await sink.emit({"event": "tick", "i": i})
+    assert time.monotonic() - started < 0.05
+    await sink.close()
+
+    assert sink.dropped > 0
+    records = [json.loads(line) for line in stream.lines]
+    assert (
+        sum(r.get("count", 0) for r in records if r["event"] == "log.dropped")
+        == sink.dropped
+    )
+    assert (
+        len(records) - sum(r["event"] == "log.dropped" for r in records)
+        == 50 - sink.dropped
+    )
+
+
+@pytest.mark.asyncio
+async def test_block_policy_keeps_every_event():
+    stream = SlowStream()
+    callback = StructuredJSONCallback(
+        EventSink(stream=stream, queue_size=2, policy="block", flush_interval=0)
+    )
+    for _ in range(5):
+        await callback.on_step_start(EchoStep(), {"topic": "x"}, {})
+    await callback.sink.close()
+    assert len(stream.lines) == 5
+    assert callback.sink.dropped == 0
+
+
+def test_invalid_sink_options():
+    with pytest.raises(ValueError):
+        validate_sink_options({"policy": "shed"})
+    with pytest.raises(ValueError):
+        validate_sink_options({"rotate": True})
+
+
+@pytest.mark.asyncio
+async def test_records_are_snapshotted_when_emitted():
+    stream = io.StringIO()
+    sink = EventSink(stream=stream, flush_interval=0.01)
+    nested = {"items": [1]}
+    await sink.emit({"event": "step.end", "outputs": nested})
+    # A later step mutating shared context must not show in the logged record
+    nested["items"].append(2)
+    await sink.close()
+    assert json.loads(stream.getvalue())["outputs"] == {"items": [1]}
@@ -0,0 +1,137 @@
+# tests/test_infrastructure/test_cascade.py
+"""Test cascade routing between models."""
+
+import pytest
+import yaml
+
+from riil.infrastructure.callbacks.metrics import (
+    default_registry,
+    parse_metrics,
+    summarize_routes,
+)
+from riil.infrastructure.llms.cascade import CascadeStep, create_cascade_step
+from riil.infrastructure.workflow import loader
+from riil.infrastructure.workflow.loader import load_workflow_from_yaml
+
+
+def score(output, inputs):
+    return 1.0 if "big" in output else 0.0
+
+
+def cascade(accept, strict=False, small=None):
+    return create_cascade_step(
+        {
+            "prompt": "Answer {question}",
+            "model": "small-then-big",
+            "output_key": "answer",
+            "config": {
+                "provider": "fake",
+                "latency": 0,
+                "routes": [
+                    {
+                        "model": "small",
+                        "name": "small",
+                        "config": small or {"response": "meh"},
+                    },
+                    {
+                        "model": "big",
+                        "name": "big",
+                        "config": {"response": "a big and careful answer"},
+                    },
+                ],
+                "accept": accept,
+                "strict": strict,
+            },
+        }
+    )
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    default_registry.reset()
+    yield default_registry
+    default_registry.reset()
+
+
+@pytest.mark.asyncio
+async def test_escalates_when_a_check_rejects():
+    result = await cascade([{"check": "min_length", "chars": 10}]).run(
+        {"question": "q"}
+    )
+    assert result["output"] == "a big and careful answer"
+    assert (result["route"], result["escalations"]) == ("big", 1)
+
+
+@pytest.mark.asyncio
+async def test_cheap_route_serves_when_accepted():
+    result = await cascade([{"check": "max_length", "chars": 10}]).run(
+        {"question": "q"}
+    )
+    assert (result["output"], result["route"]) == ("meh", "small")
+
+
+@pytest.mark.asyncio
+async def test_escalates_on_route_errors_and_scorer():
+    failing = {"response": "meh", "error_rate": 1.0, "retry": {"max_attempts": 1}}
+    step = cascade(
+        [{"check": "scorer", "function": f"{__name__}:score", "threshold": 0.5}],
+        small=failing,
+    )
+    assert (await step.run({"question": "q"}))["route"] == "big"
+
+
+@pytest.mark.asyncio
+async def test_last_answer_is_kept_unless_strict():
+    never = [{"check": "regex", "pattern": "^impossible$"}]
+    assert (await cascade(never).run({"question": "q"}))["route"] == "big"
+    with pytest.raises(ValueError, match="No route"):
+        await cascade(never, strict=True).run({"question": "q"})
+
+
+def test_unknown_check_is_a_config_error():
+    with pytest.raises(ValueError, match="Unknown acceptance check: vibes"):
+        cascade(["vibes"])
+
+
+@pytest.mark.asyncio
+async def test_yaml_cascade_records_route_acceptance(tmp_path, metrics):
+    loader.clear_workflow_cache()
+    path = tmp_path / "wf.yaml"
+    path.write_text(
+        yaml.safe_dump(
+            {
+                "name": "routed",
+                "steps": [
+                    {
+                        "prompt": "Answer {{question}}",
+                        "output_key": "answer",
+                        "llm": {
+                            "provider": "cascade",
+                            "model": "small-then-big",
+                            "config": {
+                                "provider": "fake",
+                                "latency": 0,
+                                "routes": [
+                                    {"model": "small", "config": {"response": "meh"}},
+                                    {"model": "big"},
+                                ],
+                                "accept": [{"check": "min_length", "chars": 10}],
+                            },
+                        },
+                    }
+                ],
+            }
+        )
+    )
+    wf = load_workflow_from_yaml(path)
+    assert isinstance(wf.steps[0], CascadeStep)
+    for q in ("one", "two"):
+        result = await wf.run({"question": q})
+        assert result["answer"] == f"echo: Answer {q}"
+
+    rows = summarize_routes(parse_metrics(metrics.render()))
+    assert [(r["route"], r["attempts"], r["accepted"], r["reasons"]) for r in rows] == [
+        ("fake:big", 2, 2, {}),
+        ("fake:small", 2, 0, {"min_length": 2}),
+    ]
+    assert rows[1]["workflow"] == "routed"
@@ -0,0 +1,117 @@
+# tests/test_infrastructure/test_checkpoints.py
+"""Test step checkpoints and resuming failed runs."""
+
+import time
+
+import pytest
+
+from riil.domain.step import Step
+from riil.domain.workflow import Workflow
+from riil.infrastructure.workflow.checkpoints import (
+    MemoryCheckpointStore,
+    SQLiteCheckpointStore,
+)
+
+
+class CountingStep(Step):
+    """Appends to its input; fails while `fail` is set."""
+
+    def __init__(self, reads, output_key, calls, fail=False):
+        self.input_keys = {reads}
+        self.reads = reads
+        self.output_key = output_key
+        self.calls = calls
+        self.fail = fail
+
+    async def run(self, inputs):
+        self.calls.append(self.output_key)
+        if self.fail:
+            raise RuntimeError(f"{self.output_key} failed")
+        return {"output": f"{inputs[self.reads]}>{self.output_key}"}
+
+
+def chain(store, calls, failing=None):
+    wf = Workflow("chain", checkpoints=store)
+    for i, key in enumerate(["a", "b", "c", "d"]):
+        wf.add_step(
+            CountingStep(
+                "topic" if i == 0 else "abcd"[i - 1], key, calls, fail=key == failing
+            )
+        )
+    return wf
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "make_store", [MemoryCheckpointStore, lambda: SQLiteCheckpointStore(":memory:")]
+)
+async def test_resume_skips_completed_steps(make_store):
+    store = make_store()
+    calls = []
+    with pytest.raises(RuntimeError, match="c failed"):
+        await chain(store, calls, failing="c").run({"topic": "x"}, trace_id="run-1")
+    assert calls == ["a", "b", "c"]
+    assert sorted((await store.load("run-1")).outputs) == [0, 1]
+
+    calls.clear()
+    result = await chain(store, calls).resume("run-1")
+    assert calls == ["c", "d"]
+    assert result["d"] == "x>a>b>c>d"
+    # A finished run leaves nothing behind
+    assert await store.load("run-1") is None
+
+
+@pytest.mark.asyncio
+async def test_checkpoints_survive_the_process(tmp_path):
+    path = tmp_path / "checkpoints.sqlite"
+    store = SQLiteCheckpointStore(path)
+    with pytest.raises(RuntimeError):
+        await chain(store, [], failing="b").run({"topic": "x"}, trace_id="run-1")
+    store.close()
+
+    store = SQLiteCheckpointStore(path)
+    assert [r["steps"] for r in store.runs()] == [1]
+    calls = []
+    assert (await chain(store, calls).resume("run-1"))["d"] == "x>a>b>c>d"
+    assert calls == ["b", "c", "d"]
+
+
+@pytest.mark.asyncio
+async def test_resume_rejects_a_changed_workflow():
+    store = MemoryCheckpointStore()
+    with pytest.raises(RuntimeError):
+        await chain(store, [], failing="b").run({"topic": "x"}, trace_id="run-1")
+    changed = chain(store, [])
+    changed.steps[0].output_key = "renamed"
+    with pytest.raises(ValueError, match="different version"):
+        await changed.resume("run-1")
+    with pytest.raises(ValueError, match="No checkpoint"):
+        await changed.resume("unknown")
+
+
+@pytest.mark.asyncio
+async def test_gc_deletes_stale_runs(tmp_path):
+    store = SQLiteCheckpointStore(tmp_path / "checkpoints.sqlite")
+    await store.begin("old", "wf", "f", {})
+    await store.begin("new", "wf", "f", {})
+    store._conn.execute(
+        "UPDATE runs SET updated = ? WHERE trace_id = 'old'", (time.time() - 7200,)
+    )
+    assert await store.gc(3600) == 1
+    assert [r["trace_id"] for r in store.runs()] == ["new"]
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_saves_do_not_wait_for_the_disk(tmp_path):
+    store = SQLiteCheckpointStore(tmp_path / "checkpoints.sqlite")
+    await store.begin("run", "wf", "f", {})
+    started = time.perf_counter()
+    for i in range(200):
+        store.save("run", i, {"text": "x" * 1000})
+    queued = time.perf_counter() - started
+    await store.flush()
+    assert len((await store.load("run")).outputs) == 200
+    # Queuing is a json.dumps per step; the writes happen in a thread
+    assert queued < 0.05
+    store.close()
@@ -0,0 +1,61 @@
+# tests/test_infrastructure/test_clients.py
+"""Test the shared LLM client registry."""
+
+import pytest
+from riil.infrastructure.llms import clients
+from riil.infrastructure.llms import openai as openai_step
+from riil.infrastructure.llms.openai import OpenAIStep
+
+
+@pytest.mark.asyncio
+async def test_steps_share_one_client_and_connection(stub_llm_server):
+    options = {"base_url": stub_llm_server.base_url}
+    first = OpenAIStep("Say {topic}", client_options=options)
+    second = OpenAIStep("Repeat {topic}", client_options=options)
+
+    assert first.client is second.client
+    for step in (first, second, first):
+        result = await step.run({"topic": "hi"})
+    assert result["output"] == "echo: Say hi"
+    assert len(stub_llm_server.requests) == 3
+    assert stub_llm_server.connections == 1
+
+
+@pytest.mark.asyncio
+async def test_different_options_get_separate_clients(stub_llm_server):
+    a = OpenAIStep("x", client_options={"base_url": stub_llm_server.base_url})
+    b = OpenAIStep(
+        "x", client_options={"base_url": stub_llm_server.base_url, "max_connections": 5}
+    )
+    assert a.client is not b.client
+    assert clients.client_count() == 2
+    await clients.close_clients()
+    assert clients.client_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_step_resolves_its_client_once(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    lookups = []
+    real = openai_step.get_openai_client
+
+    def counting(api_key, **options):
+        lookups.append(api_key)
+        return real(api_key, **options)
+
+    monkeypatch.setattr(openai_step, "get_openai_client", counting)
+    step = OpenAIStep("x")
+    assert step.client is step.client
+    assert len(lookups) == 1
+
+    # A pool shut down by close_clients() is replaced on next use
+    await clients.close_clients()
+    assert not step.client.is_closed()
+    assert len(lookups) == 2
+    await clients.close_clients()
+
+
+def test_unknown_client_option_rejected(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    with pytest.raises(ValueError, match="Unknown client options: pool"):
+        OpenAIStep("x", client_options={"pool": 3})
@@ -0,0 +1,73 @@
+# tests/test_infrastructure/test_fake.py
+"""Test the fake LLM provider."""
+
+import random
+import time
+
+import pytest
+from riil.infrastructure.llms.errors import LLMServerError
+from riil.infrastructure.llms.fake import FakeLLMStep, LatencyModel
+from riil.infrastructure.llms.resolver import get_step_factory
+
+
+@pytest.mark.asyncio
+async def test_streams_chunks_at_the_token_rate():
+    step = FakeLLMStep(
+        "Hi {name}", response_tokens=6, chunk_tokens=2, tokens_per_second=100, ttft=0.02
+    )
+    started = time.monotonic()
+    chunks = [c async for c in step.stream({"name": "x"})]
+    assert chunks == ["tok0 tok1", " tok2 tok3", " tok4 tok5"]
+    # ttft, then two more chunks of two tokens at 100 tokens/s
+    assert time.monotonic() - started >= 0.06
+
+
+@pytest.mark.asyncio
+async def test_injected_errors_are_reproducible():
+    def make_step():
+        return FakeLLMStep("Q {n}", error_rate=0.5, seed=7, retry={"max_attempts": 1})
+
+    async def run_all(step):
+        results = []
+        for n in range(20):
+            try:
+                await step.run({"n": n})
+                results.append(True)
+            except LLMServerError:
+                results.append(False)
+        return results
+
+    first = await run_all(make_step())
+    assert first == await run_all(make_step())
+    assert 0 < first.count(False) < 20
+
+
+@pytest.mark.asyncio
+async def test_retries_recover_from_injected_errors():
+    step = FakeLLMStep(
+        "Q {n}", error_rate=0.5, seed=1, retry={"max_attempts": 10, "base_delay": 0}
+    )
+    results = [await step.run({"n": n}) for n in range(10)]
+    assert [r["output"] for r in results] == [f"echo: Q {n}" for n in range(10)]
+
+
+def test_latency_distributions():
+    rng = random.Random(0)
+    samples = [
+        LatencyModel({"distribution": "lognormal", "mean": 0.5, "stddev": 0.2}).sample(
+            rng
+        )
+        for _ in range(5000)
+    ]
+    assert abs(sum(samples) / len(samples) - 0.5) < 0.02
+    assert LatencyModel(0.3).sample(rng) == 0.3
+    with pytest.raises(ValueError):
+        LatencyModel({"distribution": "pareto"})
+
+
+def test_factory_is_registered():
+    step = get_step_factory("fake")(
+        {"prompt": "Hi", "config": {"latency": 0.1, "temperature": 0}}
+    )
+    assert step.latency.mean == 0.1
+    assert step.params == {"temperature": 0}
@@ -0,0 +1,92 @@
+# tests/test_infrastructure/test_json_repair.py
+"""Test the repairing JSON parser."""
+
+import json
+import pytest
+from riil.infrastructure.utils.json_repair import (
+    JSONRepairParser,
+    parse_json,
+    repair_json,
+)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"n": 42, "ok": true, "s": ""}', {"n": 42, "ok": True, "s": ""}),
+        ('```json\n{"joke": "Why?"}\n```', {"joke": "Why?"}),
+        (
+            "Sure: {'a': 'it\"s', b: True, c: None,} Enjoy!",
+            {"a": 'it"s', "b": True, "c": None},
+        ),
+        ('{"a": [1, 2, 3,],}', {"a": [1, 2, 3]}),
+        ('{"a": 1 "b": {"c": 2} "d": [1 2]}', {"a": 1, "b": {"c": 2}, "d": [1, 2]}),
+        ('{"status": ok, "url": http://x.io}', {"status": "ok", "url": "http://x.io"}),
+        ('{"a": [1, {"b": "x"', {"a": [1, {"b": "x"}]}),
+        ('{"a": "unterminated', {"a": "unterminated"}),
+        ('{"a": 1, "b":', {"a": 1}),
+        ('{"a": fal', {"a": False}),
+        ('{"a": -1.5e', {"a": -1.5}),
+        ('{"a": [1, 2}', {"a": [1, 2]}),
+        ('{"s": "\\u00e9\\n\\ud83d\\ude00 \\q"}', {"s": "é\n😀 q"}),
+        ('See [docs] then {"a": 1}', {"a": 1}),
+        ('Note [1]: ... {"a": 1}', {"a": 1}),
+        ("Here: [1, 2] and [3]", [1, 2]),
+        ("Items: [a, b]", ["a", "b"]),
+        ('Found [{"a": 1}, {b: 2}] {"c": 3}', [{"a": 1}, {"b": 2}]),
+        ("The list [1, 2", [1, 2]),
+    ],
+)
+def test_repairs(text, expected):
+    assert parse_json(text) == expected
+    assert json.loads(repair_json(text)) == expected
+
+
+def test_no_json_raises():
+    with pytest.raises(ValueError):
+        repair_json("I cannot help with that.")
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 16])
+def test_incremental_matches_whole_input(size):
+    text = (
+        '```json\n{\'title\': "A \\"quoted\\" \\u00e9", '
+        'items: [1, 2.5, {"k": null}], done: tru'
+    )
+    parser = JSONRepairParser()
+    for i in range(0, len(text), size):
+        parser.feed(text[i : i + size])
+    assert parser.close() == parse_json(text)
+
+
+@pytest.mark.parametrize("size", [1, 3, 100])
+def test_brackets_in_prose_do_not_reach_the_listener(size):
+    events = []
+    parser = JSONRepairParser(events.append)
+    text = 'See [docs] and [1] then {"a": 1}'
+    for i in range(0, len(text), size):
+        parser.feed(text[i : i + size])
+    assert parser.close() == {"a": 1}
+    assert events[0] == ("open", (), "object")
+
+
+def test_listener_sees_keys_and_completed_values():
+    events = []
+    parser = JSONRepairParser(events.append)
+    parser.feed('{"a": [1, {"b": 2}], "c": "z"} trailing text')
+    assert parser.done
+    parser.close()
+    assert events == [
+        ("open", (), "object"),
+        ("key", ("a",)),
+        ("open", ("a",), "array"),
+        ("value", ("a", 0), 1),
+        ("open", ("a", 1), "object"),
+        ("key", ("a", 1, "b")),
+        ("value", ("a", 1, "b"), 2),
+        ("value", ("a", 1), {"b": 2}),
+        ("value", ("a",), [1, {"b": 2}]),
+        ("key", ("c",)),
+        ("value", ("c",), "z"),
+        ("value", (), {"a": [1, {"b": 2}], "c": "z"}),
+    ]
@@ -0,0 +1,102 @@
+# tests/test_infrastructure/test_metrics.py
+"""Test the metrics callback and Prometheus export."""
+
+import httpx
+import pytest
+from riil.domain.step import Step
+from riil.domain.workflow import Workflow
+from riil.infrastructure.callbacks.metrics import (
+    MetricsCallback,
+    MetricsRegistry,
+    parse_metrics,
+    serve_metrics,
+    summarize,
+)
+from riil.infrastructure.llms.openai import OpenAIStep
+
+
+class FailingStep(Step):
+    output_key = "broken"
+    input_keys = set()
+
+    async def run(self, inputs):
+        raise RuntimeError("boom")
+
+
+@pytest.mark.asyncio
+async def test_llm_steps_record_latency_tokens_and_ttft(stub_llm_server):
+    registry = MetricsRegistry()
+    wf = Workflow("metrics", callbacks=[MetricsCallback(registry)])
+    options = {"base_url": stub_llm_server.base_url}
+    wf.add_step(
+        OpenAIStep(
+            "About {topic}", model="m1", output_key="draft", client_options=options
+        )
+    )
+    wf.add_step(
+        OpenAIStep(
+            "Polish {draft}", model="m2", output_key="output", client_options=options
+        )
+    )
+
+    await wf.run({"topic": "Python"})
+    async for _ in wf.stream({"topic": "Python"}):
+        pass
+
+    rows = {r["step"]: r for r in summarize(parse_metrics(registry.render()))}
+    assert rows["draft"]["runs"] == 2 and rows["draft"]["model"] == "m1"
+    assert (
+        rows["draft"]["prompt_tokens"] == 20
+        and rows["draft"]["completion_tokens"] == 10
+    )
+    assert rows["draft"]["ttft"] is None
+    # Only the final step streams
+    assert rows["output"]["ttft"] is not None
+    assert rows["output"]["p95"] is not None
+    # Streams carry no usage: only the non-streamed run counts tokens
+    assert rows["output"]["prompt_tokens"] == 10
+    assert (
+        registry.histograms["riil_workflow_duration_seconds"][
+            (("workflow", "metrics"),)
+        ].count
+        == 2
+    )
+
+
+@pytest.mark.asyncio
+async def test_errors_are_counted_by_type():
+    registry = MetricsRegistry()
+    wf = Workflow("failing", callbacks=[MetricsCallback(registry)])
+    wf.add_step(FailingStep())
+    with pytest.raises(RuntimeError):
+        await wf.run({})
+
+    [row] = summarize(parse_metrics(registry.render()))
+    assert (row["runs"], row["errors"]) == (0, 1)
+    assert 'error_type="RuntimeError"' in registry.render()
+
+
+def test_render_escapes_label_values():
+    registry = MetricsRegistry()
+    registry.inc("riil_step_errors_total", (("workflow", 'say "hi"\\'),))
+    [(name, labels, value)] = parse_metrics(registry.render())
+    assert labels == {"workflow": 'say "hi"\\'}
+    assert value == 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    registry = MetricsRegistry()
+    registry.observe("riil_step_duration_seconds", (("step", "a"),), 0.2)
+    server = await serve_metrics(0, registry=registry)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(f"http://127.0.0.1:{port}/metrics")
+            missing = await client.get(f"http://127.0.0.1:{port}/")
+    finally:
+        server.close()
+        await server.wait_closed()
+    assert response.status_code == 200
+    assert 'riil_step_duration_seconds_bucket{step="a",le="0.25"} 1' in response.text
+    assert missing.status_code == 404
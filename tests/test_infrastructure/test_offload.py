@@ -0,0 +1,74 @@
+# tests/test_infrastructure/test_offload.py
+"""Test offloading CPU-bound hooks and structured validation to worker pools."""
+
+import os
+import threading
+
+import pytest
+
+from riil.infrastructure.llms.errors import SchemaViolationError
+from riil.infrastructure.llms.structured import (
+    model_from_spec,
+    portable_schema,
+    validate_value,
+)
+from riil.infrastructure.utils import offload as pools
+from riil.infrastructure.workflow.loader import load_workflow_from_yaml
+
+
+def where(value):
+    return value, os.getpid(), threading.current_thread().name
+
+
+@pytest.fixture(autouse=True)
+def small_pools():
+    pools.configure_offload(processes=1, threads=2)
+    yield
+    pools.configure_offload()
+
+
+@pytest.mark.asyncio
+async def test_hooks_run_where_they_are_marked():
+    value, pid, _ = await pools.offload(where, "x", mode="process")
+    assert value == "x" and pid != os.getpid()
+    _, pid, thread = await pools.offload(where, "x", mode="thread")
+    assert pid == os.getpid() and thread.startswith("riil-offload")
+
+    marked = pools.cpu_bound("thread")(lambda v: threading.current_thread().name)
+    assert (await pools.call_hook(marked, 1)).startswith("riil-offload")
+    assert (
+        await pools.call_hook(marked, 1, mode="inline")
+        == threading.current_thread().name
+    )
+    with pytest.raises(ValueError, match="Unknown offload mode"):
+        pools.cpu_bound("gpu")
+
+
+@pytest.mark.asyncio
+async def test_runtime_schemas_validate_in_a_worker_process():
+    schema = portable_schema(
+        model_from_spec("joke_schema", {"joke": "str", "rating": "int?"})
+    )
+    assert await pools.offload(validate_value, schema, {"joke": "knock knock"}) == {
+        "joke": "knock knock",
+        "rating": None,
+    }
+    with pytest.raises(SchemaViolationError, match="rating"):
+        await pools.offload(validate_value, schema, {"joke": "x", "rating": "high"})
+
+
+@pytest.mark.asyncio
+async def test_postprocess_hook_from_yaml(tmp_path):
+    path = tmp_path / "post.yaml"
+    path.write_text(
+        "name: post\n"
+        "steps:\n"
+        "  - prompt: 'Say {{word}}'\n"
+        "    llm: {provider: fake, model: fake, config: {response: 'a b c'}}\n"
+        "    postprocess: 'builtins:len'\n"
+        "    offload: process\n"
+    )
+    assert (await load_workflow_from_yaml(path).run({"word": "hi"}))["output"] == 5
+    path.write_text(path.read_text().replace("builtins:len", "builtins:no_such_hook"))
+    with pytest.raises(ValueError, match="no_such_hook"):
+        load_workflow_from_yaml(path)
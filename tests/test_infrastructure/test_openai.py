@@ -1,9 +1,14 @@
 # tests/test_infrastructure/test_openai.py
 """Test OpenAIStep with schema and repair."""
+
+import asyncio
+
 import pytest
-from unittest.mock import AsyncMock, patch
 from pydantic import BaseModel
+from riil.domain.workflow import StepTimeoutError, Workflow
+from riil.infrastructure.llms.base import LLM
 from riil.infrastructure.llms.openai import OpenAIStep
+from tests.stub_server import chat_completion
 
 
 class TestSchema(BaseModel):
@@ -11,31 +16,79 @@ class TestSchema(BaseModel):
     value: int
 
 
+def replying(content):
+    async def handler(payload):
+        return 200, {}, [content] if payload.get("stream") else chat_completion(content)
+
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_openai_step_with_schema_valid(stub_llm_server):
+    stub_llm_server.handler = replying('{"name": "test", "value": 42}')
+    step = OpenAIStep(
+        "test",
+        output_schema=TestSchema,
+        client_options={"base_url": stub_llm_server.base_url},
+    )
+    result = await step.run({})
+    assert result["output"]["name"] == "test"
+    assert result["output"]["value"] == 42
+    assert result["repaired"] is False
+
+
 @pytest.mark.asyncio
-@patch("openai.AsyncOpenAI")
-async def test_openai_step_with_schema_valid(mock_client):
-    mock_response = AsyncMock()
-    mock_response.choices[0].message.content = '{"name": "test", "value": 42}'
-    mock_client.return_value.chat.completions.create.return_value = mock_response
+async def test_openai_step_repair_json(stub_llm_server):
+    stub_llm_server.handler = replying('{"name": "test", "value": 42')
+    step = OpenAIStep(
+        "test",
+        output_schema=TestSchema,
+        max_retries=1,
+        client_options={"base_url": stub_llm_server.base_url},
+    )
+    result = await step.run({})
+    assert "repaired" in result
+    assert result["repaired"] is True
+    assert result["output"] == {"name": "test", "value": 42}
+
 
-    with patch.dict("os.environ", {"OPENAI_API_KEY": "sk-test"}):
-        step = OpenAIStep("test", output_schema=TestSchema)
-        result = await step.run({})
-        assert result["output"]["name"] == "test"
-        assert result["output"]["value"] == 42
+@pytest.mark.asyncio
+async def test_openai_step_streams_tokens(stub_llm_server):
+    step = OpenAIStep(
+        "Say {topic}", client_options={"base_url": stub_llm_server.base_url}
+    )
+    tokens = [t async for t in step.stream({"topic": "hello world"})]
+    assert tokens == ["echo:", " Say", " hello", " world"]
+    assert stub_llm_server.requests[0]["stream"] is True
 
 
 @pytest.mark.asyncio
-@patch("openai.AsyncOpenAI")
-async def test_openai_step_repair_json(mock_client):
-    mock_response = AsyncMock()
-    mock_response.choices[0].message.content = '{"name": "test", "value": 42'
-    mock_client.return_value.chat.completions.create.side_effect = [
-        mock_response,  # first call: malformed
-        mock_response,  # retry
-    ]
-
-    with patch.dict("os.environ", {"OPENAI_API_KEY": "sk-test"}):
-        step = OpenAIStep("test", output_schema=TestSchema, max_retries=1)
-        result = await step.run({})
-        assert "repaired" in result
+async def test_timed_out_request_frees_its_connection(stub_llm_server):
+    release = asyncio.Event()
+
+    async def hang_once(payload):
+        if len(stub_llm_server.requests) == 1:
+            await release.wait()
+        return 200, {}, chat_completion("done")
+
+    stub_llm_server.handler = hang_once
+    step = OpenAIStep(
+        "test",
+        client_options={"base_url": stub_llm_server.base_url, "max_connections": 1},
+    )
+    step.timeout = 0.1
+    wf = Workflow("hung").add_step(step)
+    with pytest.raises(StepTimeoutError):
+        await wf.run({})
+    # With the only pooled connection still held, this would wait forever
+    result = await asyncio.wait_for(wf.run({}), 2)
+    assert result["output"] == "done"
+    release.set()
+
+
+def test_request_params_are_per_step(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    first, second = OpenAIStep("Hi"), OpenAIStep("Hi")
+    first.params["temperature"] = 0.7
+    assert second.params == {}
+    assert "params" not in LLM.__dict__
@@ -0,0 +1,58 @@
+# tests/test_infrastructure/test_plugins.py
+"""Test lazy provider and callback discovery."""
+
+from importlib.metadata import EntryPoint
+
+import pytest
+
+from riil.infrastructure.callbacks import resolver as callbacks
+from riil.infrastructure.llms import resolver as providers
+from riil.infrastructure.utils import plugins
+
+
+@pytest.fixture
+def entry_points(monkeypatch):
+    """Pretend an installed package declares riil.providers/riil.callbacks plugins."""
+    declared = {}
+    monkeypatch.setattr(plugins, "_entry_points", lambda group: declared.get(group, []))
+    monkeypatch.setattr(providers, "_step_factories", {})
+    monkeypatch.setattr(callbacks, "_callback_factories", {})
+    return declared
+
+
+def test_builtin_providers_resolve_without_registration(entry_points):
+    from riil.infrastructure.llms.fake import create_fake_step
+
+    assert providers.get_step_factory("fake") is create_fake_step
+    assert "openai" in providers.available_providers()
+
+
+def test_entry_point_provider_is_loaded_by_name(entry_points):
+    entry_points["riil.providers"] = [
+        EntryPoint(
+            "echo", "riil.infrastructure.llms.fake:create_fake_step", "riil.providers"
+        )
+    ]
+    assert "echo" in providers.available_providers()
+    step = providers.resolve_step("echo", {"prompt": "Hi"})
+    assert step.provider == "fake"
+
+
+def test_registered_factory_wins_over_builtin(entry_points):
+    factory = lambda config: None  # noqa: E731
+    providers.register_step_type("fake", factory)
+    assert providers.get_step_factory("fake") is factory
+
+
+def test_unknown_names_raise(entry_points):
+    with pytest.raises(ValueError, match="Unknown provider: nope"):
+        providers.get_step_factory("nope")
+    with pytest.raises(ValueError, match="Unknown callback type: nope"):
+        callbacks.resolve_callback({"type": "nope"})
+
+
+def test_builtin_callbacks_resolve_lazily(entry_points):
+    from riil.infrastructure.callbacks.metrics import MetricsCallback
+
+    assert isinstance(callbacks.resolve_callback({"type": "metrics"}), MetricsCallback)
+    assert callbacks.available_callbacks() == ["json", "metrics"]
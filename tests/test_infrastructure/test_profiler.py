@@ -0,0 +1,100 @@
+# tests/test_infrastructure/test_profiler.py
+"""Test span recording, stall detection and trace export."""
+
+import json
+import time
+
+import pytest
+
+from riil.core import profiling
+from riil.core.profiling import recording
+from riil.domain.step import Step
+from riil.domain.workflow import Workflow
+from riil.infrastructure.callbacks.metrics import MetricsCallback, MetricsRegistry
+from riil.infrastructure.llms.fake import FakeLLMStep
+from riil.infrastructure.utils.profiler import StallMonitor, chrome_trace, waterfall
+from riil.usecases.profile_workflow import profile_workflow
+
+
+class BlockingStep(Step):
+    input_keys = {"topic"}
+    output_key = "blocked"
+
+    async def run(self, inputs):
+        hold_the_loop()
+        return {"output": "done"}
+
+
+def hold_the_loop():
+    time.sleep(0.15)
+
+
+def fan_out():
+    wf = Workflow("fan-out", callbacks=[MetricsCallback(MetricsRegistry())])
+    for key, latency in (("a", 0.03), ("b", 0.02)):
+        wf.add_step(
+            FakeLLMStep(
+                "{topic}", output_key=key, response=key, latency=latency, coalesce=False
+            )
+        )
+    return wf.add_step(
+        FakeLLMStep("{a} {b}", output_key="output", latency=0.01, coalesce=False)
+    )
+
+
+@pytest.mark.asyncio
+async def test_span_tree_covers_steps_callbacks_and_requests():
+    assert profiling.span("x") is profiling._NOOP and profiling.start_span("x") is None
+    with recording() as recorder:
+        await fan_out().run({"topic": "cats"})
+
+    by_id = {s.id: s for s in recorder.spans}
+    paths = {
+        tuple(reversed([p.name for p in _ancestry(s, by_id)])) for s in recorder.spans
+    }
+    assert ("fan-out", "a", "attempt", "request") in paths
+    assert ("fan-out", "output", "on_step_end") in paths
+    assert ("fan-out", "on_workflow_start") in paths
+    assert all(s.end is not None for s in recorder.spans)
+    # Nothing leaks into later runs
+    assert profiling.span("x") is profiling._NOOP
+
+
+@pytest.mark.asyncio
+async def test_stalls_are_reported_with_the_blocking_stack():
+    wf = Workflow("stall").add_step(BlockingStep())
+    recorder = await profile_workflow(wf, {"topic": "x"}, stall_threshold=0.05)
+    assert len(recorder.stalls) == 1
+    assert recorder.stalls[0]["duration"] >= 0.1
+    assert "hold_the_loop" in "".join(recorder.stalls[0]["stack"])
+    assert "event loop stalled" in waterfall(recorder)
+
+
+@pytest.mark.asyncio
+async def test_chrome_trace_tracks_nest():
+    recorder = await profile_workflow(fan_out(), {"topic": "cats"}, runs=2)
+    trace = json.loads(json.dumps(chrome_trace(recorder)))
+    slices = [e for e in trace["traceEvents"] if e["ph"] == "X" and e["cat"] != "stall"]
+    assert len(slices) == len(recorder.spans)
+    tracks = {}
+    for e in slices:
+        tracks.setdefault(e["tid"], []).append((e["ts"], e["ts"] + e["dur"]))
+    for intervals in tracks.values():
+        # On one track, two slices are nested or disjoint
+        for s1, e1 in intervals:
+            for s2, e2 in intervals:
+                assert (
+                    e1 <= s2
+                    or e2 <= s1
+                    or (s1 <= s2 and e2 <= e1)
+                    or (s2 <= s1 and e1 <= e2)
+                )
+    text = waterfall(recorder)
+    assert sum(line.startswith("workflow fan-out") for line in text.splitlines()) == 2
+    assert "step 2 output" in text and "llm attempt 1 fake" in text
+
+
+def _ancestry(span, by_id):
+    while span is not None:
+        yield span
+        span = by_id.get(span.parent)
@@ -0,0 +1,103 @@
+# tests/test_infrastructure/test_ratelimit.py
+"""Test per-model rate limiting and adaptive concurrency."""
+
+import asyncio
+import time
+import pytest
+from riil.infrastructure.llms.errors import parse_retry_after
+from riil.infrastructure.llms.openai import OpenAIStep
+from riil.infrastructure.llms.ratelimit import (
+    ModelScheduler,
+    TokenBucket,
+    get_scheduler,
+)
+from tests.stub_server import chat_completion
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_reservations_queue_in_order():
+    clock = FakeClock()
+    bucket = TokenBucket(
+        per_minute=120, burst_seconds=1, clock=clock
+    )  # 2/s, capacity 2
+    assert [bucket.reserve(1) for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    clock.now = 1.0
+    assert bucket.reserve(1) == 0.5
+
+
+def test_reconcile_refunds_overestimated_tokens():
+    clock = FakeClock()
+    scheduler = ModelScheduler(tpm=6000, clock=clock)  # 100 tokens/s
+    assert scheduler.tokens.reserve(100) == 0.0
+    scheduler.in_flight = 1
+    scheduler.release(100, actual_tokens=20)
+    assert scheduler.tokens.tokens == 80
+
+
+def test_throttling_halves_concurrency_and_success_restores_it():
+    scheduler = ModelScheduler(max_concurrency=8)
+    scheduler.in_flight = 1
+    scheduler.release(10, throttled=True, retry_after=0)
+    assert scheduler.limit == 4
+    for _ in range(40):
+        scheduler.in_flight = 1
+        scheduler.release(10)
+    assert scheduler.limit == 8
+
+
+def test_parse_retry_after_headers():
+    assert parse_retry_after({"retry-after-ms": "250"}) == 0.25
+    assert parse_retry_after({"retry-after": "2"}) == 2.0
+    assert parse_retry_after({}) is None
+
+
+@pytest.mark.asyncio
+async def test_requests_survive_a_simulated_quota(stub_llm_server):
+    # Fake provider: at most 3 requests per 100ms window, 429 beyond that
+    window = []
+
+    async def quota(payload):
+        now = time.monotonic()
+        window[:] = [t for t in window if now - t < 0.1]
+        if len(window) >= 3:
+            return (
+                429,
+                {"retry-after-ms": "100"},
+                {"error": {"message": "Rate limit", "type": "requests"}},
+            )
+        window.append(now)
+        await asyncio.sleep(0.01)
+        return 200, {}, chat_completion(payload["messages"][0]["content"])
+
+    stub_llm_server.handler = quota
+    step = OpenAIStep(
+        "Item {n}",
+        client_options={"base_url": stub_llm_server.base_url},
+        rate_limit={"max_retries": 10},
+    )
+    results = await asyncio.gather(*(step.run({"n": i}) for i in range(12)))
+    assert [r["output"] for r in results] == [f"Item {i}" for i in range(12)]
+
+    scheduler = get_scheduler(step.scheduler_key)
+    assert scheduler.throttled > 0
+    assert scheduler.limit is not None and scheduler.limit < 12
+    assert scheduler.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_rpm_budget_paces_requests(stub_llm_server):
+    step = OpenAIStep(
+        "Item {n}",
+        client_options={"base_url": stub_llm_server.base_url},
+        rate_limit={"rpm": 1200},  # 20/s with a 1s burst
+    )
+    started = time.monotonic()
+    await asyncio.gather(*(step.run({"n": i}) for i in range(25)))
+    assert time.monotonic() - started >= 0.2
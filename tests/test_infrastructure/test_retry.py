@@ -0,0 +1,172 @@
+# tests/test_infrastructure/test_retry.py
+"""Test retry policies and hedged requests."""
+
+import asyncio
+import pytest
+from riil.infrastructure.llms.errors import (
+    LLMServerError,
+    LLMTimeoutError,
+    RateLimitedError,
+)
+from riil.infrastructure.llms.openai import OpenAIStep
+from riil.infrastructure.llms.retry import (
+    HedgePolicy,
+    LatencyTracker,
+    RetryPolicy,
+    get_latency_tracker,
+    hedge_counters,
+)
+from tests.stub_server import chat_completion
+
+
+def test_backoff_is_jittered_and_capped():
+    policy = RetryPolicy(base_delay=1.0, max_delay=3.0)
+    for attempt in range(1, 6):
+        delay = policy.backoff(attempt)
+        assert 0 <= delay <= min(3.0, 2 ** (attempt - 1))
+
+
+def test_should_retry_respects_error_kinds_and_attempts():
+    policy = RetryPolicy(max_attempts=2)
+    assert policy.should_retry(LLMServerError("boom", 502), 1)
+    assert not policy.should_retry(LLMServerError("boom", 502), 2)
+    assert not policy.should_retry(ValueError("bad request"), 1)
+    # 429s are left to the scheduler unless asked for
+    assert not policy.should_retry(RateLimitedError("slow down"), 1)
+    assert RetryPolicy(retry_on=["rate_limit"]).should_retry(
+        RateLimitedError("slow down"), 1
+    )
+
+
+def test_invalid_options_are_rejected():
+    with pytest.raises(ValueError):
+        RetryPolicy.from_config({"attempts": 3})
+    with pytest.raises(ValueError):
+        RetryPolicy.from_config({"retry_on": ["teapot"]})
+    assert RetryPolicy.from_config(None) is None
+    assert RetryPolicy.from_config(True).max_attempts == 3
+    assert HedgePolicy.from_config(None) is None
+    assert HedgePolicy.from_config(True).percentile == 95
+
+
+def test_latency_tracker_percentile_over_sliding_window():
+    tracker = LatencyTracker(window=10)
+    for ms in range(1, 21):
+        tracker.record(ms / 1000)
+    assert len(tracker) == 10
+    assert tracker.percentile(50) == 0.016
+    assert tracker.percentile(99) == 0.020
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_retried(stub_llm_server):
+    calls = []
+
+    async def flaky(payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            return 503, {}, {"error": {"message": "overloaded", "type": "server"}}
+        return 200, {}, chat_completion("recovered")
+
+    stub_llm_server.handler = flaky
+    step = OpenAIStep(
+        "Hi",
+        client_options={"base_url": stub_llm_server.base_url},
+        retry={"base_delay": 0.01},
+    )
+    result = await step.run({})
+    assert result["output"] == "recovered"
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_requests_make_one_attempt_unless_retry_is_configured(stub_llm_server):
+    calls = []
+
+    async def failing(payload):
+        calls.append(payload)
+        return 503, {}, {"error": {"message": "overloaded", "type": "server"}}
+
+    stub_llm_server.handler = failing
+    step = OpenAIStep("Hi", client_options={"base_url": stub_llm_server.base_url})
+    assert step.retry_policy is None
+    with pytest.raises(LLMServerError):
+        await step.run({})
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_attempt_timeout_retries_stalled_requests(stub_llm_server):
+    calls = []
+
+    async def stall_once(payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            await asyncio.sleep(5)
+        return 200, {}, chat_completion("fast")
+
+    stub_llm_server.handler = stall_once
+    step = OpenAIStep(
+        "Hi",
+        client_options={"base_url": stub_llm_server.base_url},
+        retry={"attempt_timeout": 0.2, "base_delay": 0.01},
+    )
+    result = await step.run({})
+    assert result["output"] == "fast"
+
+    step.retry_policy = RetryPolicy(max_attempts=1, attempt_timeout=0.2)
+    calls.clear()
+    with pytest.raises(LLMTimeoutError):
+        await step.run({"unused": 1})
+
+
+@pytest.mark.asyncio
+async def test_slow_request_is_hedged(stub_llm_server):
+    calls = []
+
+    async def slow_first(payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            await asyncio.sleep(5)
+        return 200, {}, chat_completion("hedged")
+
+    stub_llm_server.handler = slow_first
+    step = OpenAIStep(
+        "Hi",
+        client_options={"base_url": stub_llm_server.base_url},
+        hedge={"min_samples": 5, "min_delay": 0.05},
+    )
+    tracker = get_latency_tracker(step.scheduler_key)
+    for _ in range(5):
+        tracker.record(0.01)
+
+    result = await asyncio.wait_for(step.run({}), timeout=2)
+    assert result["output"] == "hedged"
+    assert len(calls) == 2
+    assert hedge_counters(step.scheduler_key) == {"issued": 1, "won": 1}
+
+
+@pytest.mark.asyncio
+async def test_losing_hedge_is_unwound_before_returning(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    step = OpenAIStep("Hi", hedge={"min_samples": 5, "min_delay": 0.01})
+    tracker = get_latency_tracker(step.scheduler_key)
+    for _ in range(5):
+        tracker.record(0.001)
+    sent = []
+    released = []
+
+    async def send(messages, tracker):
+        sent.append(1)
+        if len(sent) == 2:
+            return "hedged"
+        try:
+            await asyncio.sleep(5)
+        finally:
+            # e.g. closing the HTTP stream
+            await asyncio.sleep(0)
+            released.append(True)
+
+    monkeypatch.setattr(step, "_timed_send", send)
+    assert await step._hedged([{"role": "user", "content": "Hi"}]) == "hedged"
+    assert released == [True]
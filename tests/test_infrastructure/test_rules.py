@@ -0,0 +1,135 @@
+# tests/test_infrastructure/test_rules.py
+"""Test rule loading and the rules system-message prefix."""
+
+import os
+
+import pytest
+
+from riil.infrastructure.rules import loader as rules_loader
+from riil.infrastructure.rules.loader import (
+    RuleIndex,
+    RulePrefix,
+    parse_rule,
+    reset_rule_indexes,
+)
+from riil.infrastructure.workflow import loader
+from riil.infrastructure.workflow.loader import load_workflow_from_yaml
+from tests.stub_server import chat_completion
+
+FUNNY = """# funny.md
+name: funny
+role: comedian
+tone: playful
+
+Keep it short.
+"""
+
+WORKFLOW = """
+name: rules
+steps:
+  - prompt: "Tell a joke about {{{{topic}}}}"
+    rules: [{rules}]
+    llm:
+      provider: openai
+      model: stub
+      config: {{client: {{base_url: "{base_url}"}}}}
+"""
+
+
+@pytest.fixture
+def rules_dir(tmp_path, monkeypatch):
+    root = tmp_path / "rules"
+    root.mkdir()
+    (root / "funny.md").write_text(FUNNY)
+    monkeypatch.setenv("RIIL_RULES_DIR", str(root))
+    reset_rule_indexes()
+    loader.clear_workflow_cache()
+    yield root
+    reset_rule_indexes()
+
+
+def test_parse_rule_reads_fields_and_body():
+    rule = parse_rule(FUNNY, "fallback")
+    assert rule.name == "funny"
+    assert rule.fields == (("name", "funny"), ("role", "comedian"), ("tone", "playful"))
+    assert rule.render() == "Role: comedian\nTone: playful\nKeep it short."
+    assert parse_rule("role: critic", "strict").name == "strict"
+
+
+def test_index_memoizes_until_a_rule_file_changes(rules_dir):
+    index = RuleIndex(rules_dir)
+    first = index.render(["funny"])
+    assert index.render(["funny"]) is first
+
+    (rules_dir / "funny.md").write_text(FUNNY.replace("playful", "deadpan"))
+    # Changes are picked up on the next check, not on every request
+    assert index.render(["funny"]) is first
+    index.refresh(force=True)
+    assert "Tone: deadpan" in index.render(["funny"])
+
+    os.remove(rules_dir / "funny.md")
+    index.refresh(force=True)
+    with pytest.raises(ValueError, match="Unknown rule: funny"):
+        index.render(["funny"])
+
+
+def test_unknown_rule_fails_compilation(rules_dir, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    path = rules_dir.parent / "wf.yaml"
+    path.write_text(WORKFLOW.format(rules="missing", base_url="http://localhost"))
+    with pytest.raises(ValueError, match="step 0.*Unknown rule: missing"):
+        load_workflow_from_yaml(path)
+
+
+def test_rules_dir_is_found_from_the_workflow_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.delenv("RIIL_RULES_DIR", raising=False)
+    project = tmp_path / "project"
+    (project / "config" / "rules").mkdir(parents=True)
+    (project / "config" / "rules" / "funny.md").write_text(FUNNY)
+    path = project / "workflows" / "shared" / "wf.yaml"
+    path.parent.mkdir(parents=True)
+    path.write_text(WORKFLOW.format(rules="funny", base_url="http://localhost"))
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+    reset_rule_indexes()
+    loader.clear_workflow_cache()
+
+    assert rules_loader.rules_dir(path) == project.resolve() / "config" / "rules"
+    prefix = load_workflow_from_yaml(path).steps[0].rules
+    assert prefix.text() == "Role: comedian\nTone: playful\nKeep it short."
+
+    # $RIIL_RULES_DIR still overrides the lookup
+    override = tmp_path / "override"
+    override.mkdir()
+    monkeypatch.setenv("RIIL_RULES_DIR", str(override))
+    assert rules_loader.rules_dir(path) == override
+    reset_rule_indexes()
+
+
+@pytest.mark.asyncio
+async def test_rules_are_a_byte_identical_system_prefix(rules_dir, stub_llm_server):
+    sent = []
+
+    async def handler(payload):
+        sent.append(payload["messages"])
+        return 200, {}, chat_completion("ok")
+
+    stub_llm_server.handler = handler
+    path = rules_dir.parent / "wf.yaml"
+    path.write_text(WORKFLOW.format(rules="funny", base_url=stub_llm_server.base_url))
+    for topic in ("cats", "dogs"):
+        await load_workflow_from_yaml(path).run({"topic": topic})
+
+    assert [m[0] for m in sent] == [
+        {"role": "system", "content": "Role: comedian\nTone: playful\nKeep it short."}
+    ] * 2
+    assert [m[1]["content"] for m in sent] == [
+        "Tell a joke about cats",
+        "Tell a joke about dogs",
+    ]
+
+    prefix = load_workflow_from_yaml(path).steps[0].rules
+    assert isinstance(prefix, RulePrefix)
+    assert load_workflow_from_yaml(path).steps[0].rules is prefix
@@ -0,0 +1,132 @@
+# tests/test_infrastructure/test_singleflight.py
+"""Test coalescing of identical in-flight LLM requests."""
+
+import asyncio
+import pytest
+from riil.infrastructure.llms.openai import OpenAIStep
+from riil.infrastructure.llms.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(flight.do("k", fetch) for _ in range(10)))
+    assert results == ["result"] * 10
+    assert len(calls) == 1
+    assert (flight.leaders, flight.coalesced) == (1, 9)
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(
+        *(flight.do("k", fail) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_others():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        return "ok"
+
+    first = asyncio.ensure_future(flight.do("k", fetch))
+    second = asyncio.ensure_future(flight.do("k", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await second == "ok"
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_shared_call_cancelled_when_last_waiter_leaves():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    cancelled = []
+
+    async def fetch():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    waiter = asyncio.ensure_future(flight.do("k", fetch))
+    await started.wait()
+    waiter.cancel()
+    await asyncio.sleep(0.01)
+    assert cancelled == [True]
+
+
+@pytest.mark.asyncio
+async def test_new_caller_does_not_join_a_call_being_cancelled():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def fetch():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            # Slow cleanup, e.g. closing a stream
+            await asyncio.sleep(0.02)
+            raise
+        return "stale"
+
+    waiter = asyncio.ensure_future(flight.do("k", fetch))
+    await started.wait()
+    waiter.cancel()
+    await asyncio.sleep(0)
+
+    async def fresh():
+        return "fresh"
+
+    assert await flight.do("k", fresh) == "fresh"
+    assert flight.leaders == 2
+    await asyncio.gather(waiter, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_identical_step_requests_are_coalesced(stub_llm_server):
+    async def slow_echo(payload):
+        await asyncio.sleep(0.05)
+        return (
+            200,
+            {},
+            {
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": "hi"}}
+                ]
+            },
+        )
+
+    stub_llm_server.handler = slow_echo
+    options = {"base_url": stub_llm_server.base_url}
+    steps = [OpenAIStep("Same {topic}", client_options=options) for _ in range(5)]
+    results = await asyncio.gather(*(s.run({"topic": "prompt"}) for s in steps))
+    assert [r["output"] for r in results] == ["hi"] * 5
+    assert len(stub_llm_server.requests) == 1
+
+    off = OpenAIStep("Same {topic}", client_options=options, coalesce=False)
+    await asyncio.gather(off.run({"topic": "prompt"}), off.run({"topic": "prompt"}))
+    assert len(stub_llm_server.requests) == 3
@@ -0,0 +1,114 @@
+# tests/test_infrastructure/test_structured.py
+"""Test streaming structured-output validation."""
+
+import time
+
+import pytest
+from pydantic import BaseModel, ConfigDict
+
+from riil.domain.workflow import Workflow
+from riil.infrastructure.llms.errors import SchemaViolationError
+from riil.infrastructure.llms.openai import OpenAIStep
+from riil.infrastructure.llms.structured import StreamingValidator, model_from_spec
+
+
+class Joke(BaseModel):
+    setup: str
+    rating: int
+
+
+class StrictJoke(Joke):
+    model_config = ConfigDict(extra="forbid")
+
+
+def streaming(*replies):
+    """Handler streaming each reply in turn, a few characters per chunk."""
+    replies = list(replies)
+
+    async def handler(payload):
+        text = replies.pop(0) if len(replies) > 1 else replies[0]
+        return 200, {}, [text[i : i + 4] for i in range(0, len(text), 4)]
+
+    return handler
+
+
+def joke_step(server, **kwargs):
+    return OpenAIStep(
+        "Tell a joke",
+        output_key="joke",
+        output_schema=Joke,
+        client_options={"base_url": server.base_url},
+        **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_wrong_type_aborts_the_stream_early(stub_llm_server):
+    stub_llm_server.handler = streaming(
+        '{"rating": "high", "setup": "' + "x" * 400 + '"}'
+    )
+    stub_llm_server.chunk_delay = 0.01
+    started = time.monotonic()
+    with pytest.raises(SchemaViolationError, match="rating"):
+        await joke_step(stub_llm_server, max_retries=0).run({})
+    # The full stream would take over a second
+    assert time.monotonic() - started < 0.5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("offload", [None, "thread"])
+async def test_violation_is_retried_with_the_error(stub_llm_server, offload):
+    stub_llm_server.handler = streaming(
+        '{"setup": "a", "rating": "ten"}', '{"setup": "a", "rating": 10}'
+    )
+    result = await joke_step(stub_llm_server, offload=offload).run({})
+    assert result["output"] == {"setup": "a", "rating": 10}
+    assert result["attempts"] == 2
+    retry_prompt = stub_llm_server.requests[1]["messages"][-1]["content"]
+    assert "rating" in retry_prompt
+    assert stub_llm_server.requests[0]["messages"][0]["role"] == "system"
+
+
+@pytest.mark.asyncio
+async def test_fields_are_emitted_as_they_complete(stub_llm_server):
+    stub_llm_server.handler = streaming('Sure! {"setup": "Why?", "rating": 7}')
+    wf = Workflow("jokes").add_step(joke_step(stub_llm_server))
+    events = [e async for e in wf.events({})]
+    fields = [(e["name"], e["value"]) for e in events if e["type"] == "field"]
+    assert fields == [("setup", "Why?"), ("rating", 7)]
+    assert events[-1]["context"]["joke"] == {"setup": "Why?", "rating": 7}
+
+
+def test_unknown_field_only_violates_when_forbidden():
+    StreamingValidator(Joke).feed('{"extra": 1, ')
+    with pytest.raises(SchemaViolationError, match="extra"):
+        StreamingValidator(StrictJoke).feed('{"extra": 1, ')
+
+
+def test_early_field_checks_follow_the_model_config():
+    class Coercing(BaseModel):
+        model_config = ConfigDict(coerce_numbers_to_str=True)
+        setup: str
+
+    class Strict(BaseModel):
+        model_config = ConfigDict(strict=True)
+        rating: int
+
+    validator = StreamingValidator(Coercing)
+    validator.feed('{"setup": 42}')
+    assert validator.finish().model_dump() == {"setup": "42"}
+    with pytest.raises(SchemaViolationError, match="rating"):
+        StreamingValidator(Strict).feed('{"rating": "7", ')
+
+
+def test_output_length_cap():
+    validator = StreamingValidator(Joke, max_chars=20)
+    with pytest.raises(SchemaViolationError, match="20 characters"):
+        validator.feed('{"setup": "' + "x" * 30)
+
+
+def test_model_from_spec():
+    model = model_from_spec("Out", {"title": "str", "score": "float?"})
+    assert model(title="t").score is None
+    with pytest.raises(ValueError):
+        model_from_spec("Out", {"title": "string"})
@@ -0,0 +1,185 @@
+# tests/test_infrastructure/test_workflow_loader.py
+"""Test compiled workflow caching and the workflow catalog."""
+
+import os
+import pytest
+import yaml
+from riil.infrastructure.llms.openai import OpenAIStep
+from riil.infrastructure.workflow import loader
+from riil.infrastructure.workflow.catalog import WorkflowCatalog
+from riil.infrastructure.workflow.loader import (
+    compile_workflow_file,
+    load_workflow_from_yaml,
+)
+
+JOKE = """
+name: joke-agent
+version: 1.2.0
+tags: [fun]
+steps:
+  - prompt: "Tell me a {{style}} joke about {{topic}}"
+    llm: {provider: openai, model: gpt-4o-mini}
+    output_key: joke
+  - prompt: "Make it one sentence: {{joke}}"
+    llm: {provider: openai, model: gpt-4o-mini}
+"""
+
+
+@pytest.fixture
+def workflow_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    loader.clear_workflow_cache()
+    (tmp_path / "joke.yaml").write_text(JOKE)
+    return tmp_path
+
+
+def test_compiled_workflow_is_reused_until_file_changes(workflow_dir):
+    path = workflow_dir / "joke.yaml"
+    first = compile_workflow_file(path)
+    assert compile_workflow_file(path) is first
+    assert first.required_inputs == {"style", "topic"}
+
+    # Touching without changing content keeps the compiled form
+    os.utime(path, ns=(1, 1))
+    assert compile_workflow_file(path) is first
+
+    path.write_text(JOKE.replace("1.2.0", "1.3.0"))
+    assert compile_workflow_file(path).spec.version == "1.3.0"
+
+
+def test_instances_share_parsed_templates(workflow_dir):
+    first = load_workflow_from_yaml(workflow_dir / "joke.yaml")
+    second = load_workflow_from_yaml(workflow_dir / "joke.yaml")
+    assert first is not second
+    assert isinstance(first.steps[0], OpenAIStep)
+    assert first.steps[0].template is second.steps[0].template
+    assert (
+        first.steps[0].template.render({"style": "dry", "topic": "cats"})
+        == "Tell me a dry joke about cats"
+    )
+    assert first.steps[1].input_keys == {"joke"}
+
+
+def test_catalog_index_avoids_reparsing(workflow_dir, monkeypatch):
+    entries = WorkflowCatalog(workflow_dir).refresh()
+    assert entries[0]["name"] == "joke-agent"
+    assert entries[0]["required_inputs"] == ["style", "topic"]
+
+    def _fail(_):
+        raise AssertionError("YAML parsed again")
+
+    monkeypatch.setattr(yaml, "safe_load", _fail)
+    loader.clear_workflow_cache()
+    catalog = WorkflowCatalog(workflow_dir)
+    entry = catalog.find("joke-agent")
+    assert entry["tags"] == ["fun"]
+    assert catalog.compile(entry).instantiate().name == "joke-agent"
+
+
+def test_catalog_does_not_cache_a_spec_indexed_before_an_edit(workflow_dir):
+    path = workflow_dir / "joke.yaml"
+    catalog = WorkflowCatalog(workflow_dir)
+    entry = catalog.find("joke-agent")
+    path.write_text(JOKE.replace("joke-agent", "pun-agent") + "# edited\n")
+
+    assert catalog.compile(entry).name == "pun-agent"
+    assert compile_workflow_file(path).name == "pun-agent"
+
+
+def test_catalog_reports_broken_files(workflow_dir):
+    (workflow_dir / "broken.yaml").write_text("name: broken\n")
+    entries = {e["path"]: e for e in WorkflowCatalog(workflow_dir).refresh()}
+    assert "validation error" in entries["broken.yaml"]["error"]
+    assert "error" not in entries["joke.yaml"]
+
+
+MAP = """
+name: summarize
+outputs: [summaries]
+steps:
+  - prompt: "Summarize {{chunk}} for {{audience}}"
+    llm: {provider: fake, model: fake, config: {ttft: 0, tokens_per_second: 100000}}
+    map:
+      {over: chunks, as: chunk, concurrency: 2, reduce: {type: join, separator: " | "}}
+    output_key: summaries
+  - map: {over: chunks, workflow: item.yaml, on_error: skip, reduce: count}
+    output_key: counted
+"""
+
+ITEM = """
+name: item
+steps:
+  - prompt: "Shout {{item}}"
+    llm: {provider: fake, model: fake, config: {ttft: 0, tokens_per_second: 100000}}
+"""
+
+
+@pytest.mark.asyncio
+async def test_map_steps_from_yaml(workflow_dir):
+    (workflow_dir / "map.yaml").write_text(MAP)
+    (workflow_dir / "item.yaml").write_text(ITEM)
+    compiled = compile_workflow_file(workflow_dir / "map.yaml")
+    assert compiled.required_inputs == {"chunks", "audience"}
+
+    result = await compiled.instantiate().run(
+        {"chunks": ["a", "b", "c"], "audience": "kids"}
+    )
+    assert result["summaries"] == " | ".join(
+        f"echo: Summarize {c} for kids" for c in "abc"
+    )
+    assert result["counted"] == {"succeeded": 3, "skipped": 0}
+
+
+def test_map_step_errors(workflow_dir):
+    (workflow_dir / "bad.yaml").write_text(MAP.replace("type: join", "type: median"))
+    with pytest.raises(ValueError, match="Unknown reducer: median"):
+        compile_workflow_file(workflow_dir / "bad.yaml")
+    (workflow_dir / "nollm.yaml").write_text(
+        "name: x\nsteps:\n  - prompt: hi\n    map: {over: xs}\n"
+    )
+    with pytest.raises(ValueError, match="`llm` is required"):
+        compile_workflow_file(workflow_dir / "nollm.yaml")
+
+
+CHAIN = """
+name: chain
+steps:
+  - prompt: "Draft {{topic}}"
+    llm: {provider: fake, model: fake, config: {ttft: 0, tokens_per_second: 100000}}
+    output_key: draft
+  - prompt: "Edit {{draft}}"
+    llm: {provider: fake, model: fake, config: {ttft: 0, tokens_per_second: 100000}}
+    output_key: edited
+  - prompt: "Polish {{edited}}"
+    llm: {provider: fake, model: fake, config: {ttft: 0, tokens_per_second: 100000}}
+"""
+
+
+@pytest.mark.asyncio
+async def test_runs_return_only_the_workflow_outputs(workflow_dir):
+    (workflow_dir / "chain.yaml").write_text(CHAIN)
+    compiled = compile_workflow_file(workflow_dir / "chain.yaml")
+    assert compiled.outputs == {"output"}
+
+    result = await compiled.instantiate().run({"topic": "owls"})
+    assert {k for k in result if not k.startswith("__")} == {"topic", "output"}
+    assert result["output"] == "echo: Polish echo: Edit echo: Draft owls"
+
+    full = await compiled.instantiate(keep_context=True).run({"topic": "owls"})
+    assert full["draft"] == "echo: Draft owls"
+
+    (workflow_dir / "chain.yaml").write_text(
+        CHAIN.replace("name: chain", "name: chain\noutputs: [draft]")
+    )
+    result = (
+        await compile_workflow_file(workflow_dir / "chain.yaml")
+        .instantiate()
+        .run({"topic": "owls"})
+    )
+    assert "draft" in result and "edited" not in result
+
+    (workflow_dir / "chain.yaml").write_text(
+        CHAIN.replace("name: chain", "name: chain\noutputs: [drfat]")
+    )
+    with pytest.raises(ValueError, match="Output 'drfat'"):
+        compile_workflow_file(workflow_dir / "chain.yaml")
@@ -0,0 +1,177 @@
+# tests/test_interface/test_server.py
+"""Test the workflow HTTP server."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from riil.infrastructure.workflow import loader
+from riil.interface.server import WorkflowServer
+from tests.stub_server import chat_completion
+
+ECHO = """
+name: echo
+version: {version}
+steps:
+  - prompt: "Say {{{{topic}}}}"
+    llm:
+      provider: openai
+      model: stub
+      config: {{client: {{base_url: "{base_url}"}}}}
+"""
+
+
+def slow_handler(delay):
+    async def handler(payload):
+        await asyncio.sleep(delay)
+        return 200, {}, chat_completion("done")
+
+    return handler
+
+
+@pytest.fixture
+def workflow_dir(tmp_path, stub_llm_server):
+    loader.clear_workflow_cache()
+    (tmp_path / "echo.yaml").write_text(
+        ECHO.format(version="1.0.0", base_url=stub_llm_server.base_url)
+    )
+    return tmp_path
+
+
+@pytest_asyncio.fixture
+async def start_server(workflow_dir):
+    servers = []
+
+    async def _start(**kwargs):
+        server = await WorkflowServer(workflow_dir, reload_interval=0, **kwargs).start(
+            port=0
+        )
+        servers.append(server)
+        return server, httpx.AsyncClient(base_url=f"http://127.0.0.1:{server.port}")
+
+    yield _start
+    for server in servers:
+        await server.drain(timeout=0)
+
+
+@pytest.mark.asyncio
+async def test_run_returns_output(start_server):
+    server, client = await start_server()
+    async with client:
+        listed = await client.get("/workflows")
+        response = await client.post(
+            "/workflows/echo/run", json={"inputs": {"topic": "hi"}}
+        )
+        missing = await client.post("/workflows/echo/run", json={"inputs": {}})
+        unknown = await client.post("/workflows/nope/run", json={})
+    assert listed.json()["workflows"] == [
+        {"name": "echo", "version": "1.0.0", "inputs": ["topic"]}
+    ]
+    assert response.status_code == 200
+    assert response.json()["output"] == "echo: Say hi"
+    assert missing.status_code == 400 and "topic" in missing.json()["error"]
+    assert unknown.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_run_streams_server_sent_events(start_server):
+    server, client = await start_server()
+    async with client:
+        async with client.stream(
+            "POST",
+            "/workflows/echo/run",
+            json={"inputs": {"topic": "hi"}, "stream": True},
+        ) as response:
+            events = [
+                json.loads(line[6:])
+                async for line in response.aiter_lines()
+                if line.startswith("data: ")
+            ]
+    assert response.headers["content-type"] == "text/event-stream"
+    assert "".join(e["text"] for e in events if e["type"] == "token") == "echo: Say hi"
+    assert (
+        events[-1]["type"] == "workflow_end" and events[-1]["output"] == "echo: Say hi"
+    )
+
+
+@pytest.mark.asyncio
+async def test_saturated_server_answers_503(start_server, stub_llm_server):
+    stub_llm_server.handler = slow_handler(0.2)
+    server, client = await start_server(max_concurrency=1, max_queue=1)
+    async with client:
+        responses = await asyncio.gather(
+            *[
+                client.post("/workflows/echo/run", json={"inputs": {"topic": str(i)}})
+                for i in range(3)
+            ]
+        )
+    assert sorted(r.status_code for r in responses) == [200, 200, 503]
+    assert [
+        r.headers.get("retry-after") for r in responses if r.status_code == 503
+    ] == ["1"]
+    assert (server.running, server.queued) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_reload_swaps_changed_workflows(
+    start_server, workflow_dir, stub_llm_server
+):
+    server, client = await start_server()
+    original = server.workflows["echo"]
+    path = workflow_dir / "echo.yaml"
+
+    path.write_text(ECHO.format(version="2.0.0", base_url=stub_llm_server.base_url))
+    assert await server.reload() == ["echo"]
+    assert server.workflows["echo"].compiled.spec.version == "2.0.0"
+
+    # A broken edit keeps serving the last good version
+    path.write_text("name: echo\nsteps: nope\n")
+    assert await server.reload() == []
+    assert server.workflows["echo"].compiled.spec.version == "2.0.0"
+    assert server.workflows["echo"] is not original
+
+    path.unlink()
+    assert await server.reload() == ["echo"]
+    assert server.workflows == {}
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_drain_finishes_running_requests(start_server, stub_llm_server):
+    stub_llm_server.handler = slow_handler(0.2)
+    server, client = await start_server()
+    async with client:
+        running = asyncio.create_task(
+            client.post("/workflows/echo/run", json={"inputs": {"topic": "x"}})
+        )
+        while not server.running:
+            await asyncio.sleep(0.01)
+        await server.drain(timeout=5)
+        response = await running
+        assert response.status_code == 200
+        assert response.json()["output"] == "done"
+        with pytest.raises(httpx.ConnectError):
+            await client.get("/health")
+
+
+@pytest.mark.asyncio
+async def test_timed_out_run_answers_504_with_partial_context(
+    start_server, stub_llm_server
+):
+    stub_llm_server.handler = slow_handler(2)
+    server, client = await start_server(request_timeout=5)
+    async with client:
+        response = await client.post(
+            "/workflows/echo/run", json={"inputs": {"topic": "hi"}, "timeout": 0.1}
+        )
+        invalid = await client.post(
+            "/workflows/echo/run", json={"inputs": {"topic": "hi"}, "timeout": "soon"}
+        )
+    assert response.status_code == 504
+    assert response.json()["step"] == "output"
+    assert response.json()["context"] == {"topic": "hi"}
+    assert invalid.status_code == 400
+    assert server.running == 0
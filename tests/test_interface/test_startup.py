@@ -0,0 +1,67 @@
+# tests/test_interface/test_startup.py
+"""Guard CLI start-up time: heavy dependencies load only when a command needs them."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# Cumulative import time of riil.interface.cli, in microseconds. It was about
+# 700ms while every command's dependencies loaded eagerly; now it is mostly typer.
+IMPORT_BUDGET_US = 250_000
+
+HEAVY_MODULES = ("openai", "httpx", "pydantic", "yaml", "sqlite3")
+
+
+def _import_times(code: str) -> dict:
+    """Cumulative microseconds per module from `python -X importtime -c code`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_import_stays_within_budget():
+    # Best of three, to keep a busy machine from failing the test
+    best = min(
+        _import_times("import riil.interface.cli")["riil.interface.cli"]
+        for _ in range(3)
+    )
+    assert best < IMPORT_BUDGET_US, f"importing the CLI took {best / 1000:.0f}ms"
+
+
+def test_cli_import_skips_heavy_dependencies():
+    loaded = _import_times("import riil.interface.cli")
+    assert [m for m in HEAVY_MODULES if m in loaded] == []
+
+
+def test_provider_module_is_imported_on_first_use():
+    code = (
+        "import sys\n"
+        "from riil.infrastructure.llms.resolver import get_step_factory\n"
+        "get_step_factory('fake')\n"
+        "print(' '.join(sorted(sys.modules)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = set(result.stdout.split())
+    assert "riil.infrastructure.llms.fake" in loaded
+    assert "riil.infrastructure.llms.openai" not in loaded
+    assert "openai" not in loaded
@@ -0,0 +1,35 @@
+# tests/test_usecases/test_benchmark.py
+"""Smoke test of the engine benchmarks."""
+
+import json
+import pytest
+from riil.usecases.benchmark import run_benchmarks
+
+
+@pytest.mark.asyncio
+async def test_quick_report_is_json():
+    report = await run_benchmarks(["load", "overhead", "ttft"], quick=True)
+    assert set(report["results"]) == {"load", "overhead", "ttft"}
+    assert (
+        report["results"]["load"]["cached_compile_us"]
+        < report["results"]["load"]["cold_compile_us"]
+    )
+    assert report["results"]["overhead"]["per_step_us"]["no_callbacks"] > 0
+    assert (
+        report["results"]["ttft"]["p50_s"]
+        >= report["results"]["ttft"]["configured_ttft_s"]
+    )
+    json.dumps(report)
+
+
+@pytest.mark.asyncio
+async def test_unknown_benchmark():
+    with pytest.raises(ValueError, match="nope"):
+        await run_benchmarks(["nope"])
+
+
+@pytest.mark.asyncio
+async def test_offload_report_compares_modes():
+    result = (await run_benchmarks(["offload"], quick=True))["results"]["offload"]
+    assert [row["mode"] for row in result["modes"]] == ["inline", "thread", "process"]
+    assert all(row["lag_max_ms"] >= 0 for row in result["modes"])
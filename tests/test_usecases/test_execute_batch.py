@@ -0,0 +1,122 @@
+# tests/test_usecases/test_execute_batch.py
+"""Test batch execution over many input records."""
+
+import asyncio
+import io
+import os
+import threading
+import pytest
+from riil.domain.step import Step
+from riil.domain.workflow import Workflow
+from riil.usecases.execute_batch import execute_batch, read_jsonl, stream_jsonl
+
+
+class EchoStep(Step):
+    """Echoes `n`, finishing later records first."""
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    async def run(self, inputs):
+        if inputs["n"] < 0:
+            raise ValueError("negative")
+        self.tracker["active"] += 1
+        self.tracker["peak"] = max(self.tracker["peak"], self.tracker["active"])
+        await asyncio.sleep(0.005 * (10 - inputs["n"] % 10))
+        self.tracker["active"] -= 1
+        return {"output": inputs["n"] * 2}
+
+
+def _workflow(tracker):
+    return Workflow("echo").add_step(EchoStep(tracker))
+
+
+@pytest.mark.asyncio
+async def test_batch_preserves_input_order_with_bounded_concurrency():
+    tracker = {"active": 0, "peak": 0}
+    results = []
+    stats = await execute_batch(
+        _workflow(tracker), ({"n": i} for i in range(50)), results.append, concurrency=4
+    )
+    assert [r["index"] for r in results] == list(range(50))
+    assert [r["output"]["output"] for r in results] == [i * 2 for i in range(50)]
+    assert tracker["peak"] <= 4
+    assert stats.succeeded == 50 and stats.failed == 0
+
+
+@pytest.mark.asyncio
+async def test_batch_unordered_emits_in_completion_order():
+    tracker = {"active": 0, "peak": 0}
+    results = []
+    await execute_batch(
+        _workflow(tracker),
+        ({"n": i} for i in range(10)),
+        results.append,
+        concurrency=10,
+        ordered=False,
+    )
+    assert sorted(r["index"] for r in results) == list(range(10))
+    assert results[0]["index"] == 9
+
+
+@pytest.mark.asyncio
+async def test_batch_captures_per_record_errors():
+    tracker = {"active": 0, "peak": 0}
+    lines = io.StringIO('{"n": 1}\nnot json\n\n{"n": -1}\n[1]\n{"n": 2}\n')
+    results = []
+    stats = await execute_batch(_workflow(tracker), read_jsonl(lines), results.append)
+    assert [r["ok"] for r in results] == [True, False, False, False, True]
+    assert results[2]["error_type"] == "ValueError"
+    assert results[2]["input"] == {"n": -1}
+    assert stats.failed == 3
+
+
+@pytest.mark.asyncio
+async def test_stream_jsonl_runs_records_while_waiting_for_input():
+    # A slow producer: the second line is only written once the first
+    # record's result is out, which needs the loop free while stdin blocks
+    read_fd, write_fd = os.pipe()
+    first_done = threading.Event()
+
+    def produce():
+        with os.fdopen(write_fd, "w") as w:
+            w.write('{"n": 1}\n')
+            w.flush()
+            first_done.wait(5)
+            w.write('{"n": 2}\n')
+
+    def on_result(result):
+        first_done.set()
+        results.append(result)
+
+    results = []
+    producer = threading.Thread(target=produce)
+    producer.start()
+    tracker = {"active": 0, "peak": 0}
+    with os.fdopen(read_fd) as src:
+        started = asyncio.get_running_loop().time()
+        await execute_batch(_workflow(tracker), stream_jsonl(src), on_result)
+    producer.join()
+    assert [r["output"]["output"] for r in results] == [2, 4]
+    assert asyncio.get_running_loop().time() - started < 4
+
+
+@pytest.mark.asyncio
+async def test_failing_result_handler_unwinds_in_flight_runs():
+    unwound = []
+
+    class SlowStep(Step):
+        async def run(self, inputs):
+            try:
+                await asyncio.sleep(0 if inputs["n"] == 0 else 10)
+            finally:
+                unwound.append(inputs["n"])
+            return {"output": inputs["n"]}
+
+    def explode(result):
+        raise RuntimeError("sink full")
+
+    wf = Workflow("slow").add_step(SlowStep())
+    with pytest.raises(RuntimeError, match="sink full"):
+        await execute_batch(wf, ({"n": i} for i in range(4)), explode, concurrency=4)
+    assert sorted(unwound) == [0, 1, 2, 3]
@@ -0,0 +1,136 @@
+# tests/test_usecases/test_execute_offline.py
+"""Test offline execution through batch files."""
+
+import asyncio
+import json
+import pytest
+from riil.domain.step import Step
+from riil.domain.workflow import Workflow
+from riil.infrastructure.llms.batch import DirectoryTransport, fulfil_directory_batches
+from riil.infrastructure.llms.openai import OpenAIStep
+from riil.usecases.execute_offline import execute_offline
+from tests.stub_server import chat_completion
+
+
+class ShoutStep(Step):
+    """A step without a batch API; runs locally."""
+
+    output_key = "loud"
+    input_keys = {"draft"}
+
+    async def run(self, inputs):
+        return {"output": inputs["draft"].upper()}
+
+
+async def echo(body):
+    content = body["messages"][-1]["content"]
+    if "fail" in content:
+        raise ValueError("provider refused")
+    return chat_completion(f"echo: {content}")
+
+
+class FulfillingTransport(DirectoryTransport):
+    """Answers batches as soon as they are polled; counts submissions."""
+
+    def __init__(self, root, fulfil=True):
+        super().__init__(root)
+        self.fulfil = fulfil
+        self.submitted = 0
+
+    async def submit(self, path):
+        self.submitted += 1
+        return await super().submit(path)
+
+    async def poll(self, batch_id):
+        if self.fulfil:
+            await fulfil_directory_batches(self.root, echo)
+        return await super().poll(batch_id)
+
+
+@pytest.fixture
+def workflow(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    return (
+        Workflow("offline")
+        .add_step(OpenAIStep("Draft {topic}", output_key="draft"))
+        .add_step(ShoutStep())
+        .add_step(OpenAIStep("Polish {draft}"))
+    )
+
+
+@pytest.mark.asyncio
+async def test_layers_advance_through_batch_files(workflow, tmp_path):
+    transport = FulfillingTransport(tmp_path / "provider")
+    results = []
+    records = [{"topic": "cats"}, {"topic": "fail"}, "not a dict", {"topic": "dogs"}]
+    stats = await execute_offline(
+        workflow,
+        iter(records),
+        results.append,
+        tmp_path / "job",
+        transport,
+        poll_interval=0,
+        max_requests_per_file=2,
+    )
+
+    assert (stats.succeeded, stats.failed) == (2, 2)
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert results[0]["output"]["draft"] == "echo: Draft cats"
+    assert results[0]["output"]["loud"] == "ECHO: DRAFT CATS"
+    assert results[0]["output"]["output"] == "echo: Polish echo: Draft cats"
+    assert results[1]["error"] == "provider refused"
+    assert results[2]["error_type"] == "ValueError"
+
+    # Three requests in layer 1 split into files of two; the failed record is
+    # not sent again
+    first = [
+        json.loads(line)
+        for line in (tmp_path / "job" / "requests-0-0.jsonl").read_text().splitlines()
+    ]
+    assert [r["custom_id"] for r in first] == ["0:0", "1:0"]
+    assert first[0]["body"] == {
+        "model": "gpt-3.5-turbo",
+        "messages": [{"role": "user", "content": "Draft cats"}],
+    }
+    assert transport.submitted == 3
+
+
+@pytest.mark.asyncio
+async def test_stopped_job_resumes_without_resubmitting(workflow, tmp_path):
+    job_dir, provider = tmp_path / "job", tmp_path / "provider"
+    stalled = FulfillingTransport(provider, fulfil=False)
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(
+            execute_offline(
+                workflow,
+                iter([{"topic": "cats"}]),
+                print,
+                job_dir,
+                stalled,
+                poll_interval=0.01,
+            ),
+            timeout=0.2,
+        )
+    assert stalled.submitted == 1
+
+    resumed = FulfillingTransport(provider)
+    results = []
+    # Inputs were stored by the first run and are not read again
+    await execute_offline(
+        workflow, iter([]), results.append, job_dir, resumed, poll_interval=0
+    )
+    assert (
+        resumed.submitted == 1
+    )  # the second layer; the first layer's batch was already sent
+    assert results[0]["output"]["output"] == "echo: Polish echo: Draft cats"
+
+
+@pytest.mark.asyncio
+async def test_work_dir_is_tied_to_its_workflow(workflow, tmp_path, monkeypatch):
+    transport = FulfillingTransport(tmp_path / "provider")
+    await execute_offline(
+        workflow, iter([]), print, tmp_path / "job", transport, poll_interval=0
+    )
+    other = Workflow("other").add_step(OpenAIStep("Something else {x}"))
+    with pytest.raises(ValueError, match="different workflow"):
+        await execute_offline(other, iter([]), print, tmp_path / "job", transport)